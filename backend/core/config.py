@@ -16,15 +16,107 @@ class Settings(BaseSettings):
     temperature: float = 0.7
     top_p: float = 0.9
 
+    # Startup: the model loads in the background while /livez already answers
+    background_load: bool = True        # false = block startup until the model is ready
+    warmup_tokens: int = 16             # greedy warm-up generation after load; 0 = skip
+    not_ready_retry_after_s: int = 10   # Retry-After on 503s while loading
+
+    # CPU inference profile (CPU-only nodes)
+    cpu_profile: bool = False
+    cpu_int8: bool = True               # dynamic int8 quantisation of linear layers (loads float32)
+    cpu_compile: bool = False           # torch.compile the forward pass
+    cpu_threads: int = 0                # intra-op threads; 0 = torch default (split across workers)
+    cpu_interop_threads: int = 0        # 0 = torch default
+
+    # LoRA adapters over the base model, chosen per request by "model" (see adapters.py)
+    adapters_dir: str = "adapters"          # one PEFT adapter directory per name
+    adapter_budget_mb: int = 512            # resident adapter weights, evicted LRU
+
+    # Continuous batching
+    continuous_batching: bool = True
+    max_batch_size: int = 16
+    kv_cache_budget_mb: int = 2048
+    prefix_cache: bool = True
+
+    # Per-session KV retention between turns (separate from the batch budget)
+    session_kv_cache: bool = True
+    session_kv_budget_mb: int = 512
+    session_kv_ttl_s: int = 900
+
+    # Section-aware generation control
+    stop_at_disclaimer: bool = True     # end generation once the disclaimer line is written
+    section_token_budgets: dict[str, int] = {}     # e.g. {"reasoning": 200}; over budget → next header
+
+    # Speculative decoding for greedy requests: standard | prompt_lookup | draft_model
+    generation_mode: str = "standard"
+    speculative_tokens: int = 8         # draft length per verification step
+    prompt_lookup_ngram: int = 3
+    draft_model_id: str = ""            # smaller checkpoint with the same tokenizer
+
+    # History compaction
+    prompt_token_budget: int = 2048
+    history_recent_pairs: int = 2
+    history_low_water: float = 0.75     # on overflow, compact down to this share of the budget
+
+    # Deterministic (greedy) mode and its response cache
+    deterministic: bool = False
+    response_cache_size: int = 1024
+    response_cache_ttl_s: int = 86400
+    response_cache_path: str = ""       # SQLite file for a persistent tier; empty = memory only
+
+    # Inference executor
+    inference_concurrency: int = 16
+    inference_queue_size: int = 64
+
+    # Offline batch jobs (/analyze/batch)
+    batch_jobs_dir: str = "batch_jobs"
+    batch_concurrency: int = 16             # cases in flight per job
+    batch_input_root: str = "data"          # server-side input paths must be inside this dir
+
+    # Per-request profiling (admin opt-in)
+    profiling_enabled: bool = False
+    profile_header: str = "X-Profile"       # requests carrying it are profiled
+    profile_token: str = ""                 # if set, the header value must match it
+    profile_sample_rate: float = 0.0        # fraction of other requests profiled
+    profile_torch: bool = True              # also record a torch profiler trace
+    profile_dir: str = "profiles"
+    profile_keep: int = 200
+
+    # Sessions
+    session_store: str = "memory"           # memory | sqlite | redis
+    session_max_sessions: int = 10_000      # memory store only
+    session_max_turns: int = 200
+    session_ttl_s: int = 86400
+    session_count_refresh_s: int = 15       # /metrics reuses a session count this recent
+    session_sqlite_path: str = "sessions.db"
+    session_flush_interval_ms: int = 200
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Local model artefact cache: exported once in the serving dtype, memory-mapped on later starts
+    model_cache: bool = True
+    model_cache_dir: str = ".cache/models"
+
+    # Multi-worker serving: every worker maps the same cached weights
+    workers: int = 1
+    shared_weights: bool = False            # implied when workers > 1 (CPU only)
+
     # Server
     api_host: str = "0.0.0.0"
     api_port: int = 8000
     gradio_port: int = 7860
     gradio_share: bool = False
+    gradio_concurrency: int = 0             # concurrent UI events; 0 = INFERENCE_CONCURRENCY
+    api_timeout_s: float = 120              # UI → backend read timeout
 
     # PDF
     pdf_font: str = "Helvetica"
     logo_path: str = ""
+    pdf_workers: int = 2                    # render processes, kept off the event loop
+    pdf_sync_max_turns: int = 20            # larger sessions export through a job
+    pdf_jobs_dir: str = "pdf_jobs"
+    pdf_job_ttl_s: int = 3600
+    pdf_bulk_max_sessions: int = 1000       # per /export-pdf/bulk request
+    pdf_turn_cache_size: int = 4096         # compiled turns kept per render process
 
 
 @lru_cache
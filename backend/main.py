@@ -1,23 +1,49 @@
 """
 FastAPI application entry point for LlamaTron CDS Agent.
 """
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from backend.core.config import get_settings
 from backend.core.logger import logger
+from backend.services.batch_jobs import batch_jobs
+from backend.services.executor import inference_executor
 from backend.services.inference import inference_service
-from backend.routers import analysis, session, export
+from backend.services.metrics import (
+    ACTIVE_SESSIONS, REQUESTS_IN_FLIGHT, REQUESTS_QUEUED, SESSION_BYTES, registry,
+)
+from backend.services.pdf_jobs import pdf_renderer
+from backend.services.session import session_service
+from backend.routers import analysis, session, export, profiles
 
 cfg = get_settings()
 
+# gauges read at scrape time
+REQUESTS_IN_FLIGHT.set_function(lambda: inference_executor.in_flight)
+REQUESTS_QUEUED.set_function(lambda: inference_executor.queued)
+ACTIVE_SESSIONS.set_function(lambda: session_service.active_sessions(cfg.session_count_refresh_s))
+SESSION_BYTES.set_function(lambda: (session_service.memory_stats() or {}).get("bytes"))
+# batch jobs, resumed at start-up too, wait for the model instead of failing every case
+batch_jobs.ready = lambda: inference_service.ready
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("🚀 Starting LlamaTron CDS Agent API...")
-    inference_service.load()          # warm up model on startup
+    if cfg.background_load:
+        inference_service.load_in_background()   # serve /livez and /readyz meanwhile
+    else:
+        inference_service.load()
+    batch_jobs.resume_pending(analysis.run_batch_case)
     yield
     logger.info("Shutting down...")
+    batch_jobs.shutdown()
+    pdf_renderer.shutdown()
+    inference_executor.shutdown()
+    inference_service.shutdown()
+    session_service.close()
 
 
 app = FastAPI(
@@ -41,6 +67,7 @@ app.add_middleware(
 app.include_router(analysis.router)
 app.include_router(session.router)
 app.include_router(export.router)
+app.include_router(profiles.router)
 
 
 @app.get("/health", tags=["Health"])
@@ -49,10 +76,43 @@ async def health():
         "status": "ok",
         "model": cfg.model_id,
         "model_loaded": inference_service._loaded,
+        "model_state": inference_service.state,
+        "inference_queue": inference_executor.stats(),
+        "speculative": inference_service.speculative.stats()
+        if inference_service.speculative else None,
+        # lists ADAPTERS_DIR — keep the directory scan off the event loop
+        "adapters": await asyncio.to_thread(inference_service.adapters.stats),
+        "sessions": session_service.memory_stats(),
     }
 
 
+@app.get("/livez", tags=["Health"])
+async def livez():
+    """Liveness: the process is up and serving, whether or not the model is loaded."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz", tags=["Health"])
+async def readyz():
+    """Readiness: 200 once the model is loaded and warmed up, 503 until then."""
+    body = {"status": inference_service.state}
+    if inference_service.ready:
+        return body
+    if inference_service.load_error:
+        body["error"] = inference_service.load_error
+    return JSONResponse(body, status_code=503,
+                        headers={"Retry-After": str(cfg.not_ready_retry_after_s)})
+
+
+@app.get("/metrics", tags=["Health"], response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus text exposition format; each worker process reports its own values."""
+    # scrape-time gauges may query the session store — keep that off the event loop
+    body = await asyncio.to_thread(registry.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run("backend.main:app", host=cfg.api_host,
-                port=cfg.api_port, reload=True)
+    uvicorn.run("backend.main:app", host=cfg.api_host, port=cfg.api_port,
+                reload=cfg.workers == 1, workers=cfg.workers)
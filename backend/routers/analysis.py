@@ -1,10 +1,23 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+from functools import partial
+from pathlib import Path
+from fastapi import APIRouter, File, Form, HTTPException, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import Optional
-from backend.services.inference import inference_service
+from typing import Literal, Optional
+from backend.core.config import get_settings
+from backend.services.batch_jobs import batch_jobs
+from backend.services.executor import QueueFullError, inference_executor
+from backend.services.history import history_compactor
+from backend.services.inference import SYSTEM_PROMPT, inference_service
+from backend.services.profiling import request_profiler
+from backend.services.sections import SectionParser
 from backend.services.session import session_service
 from backend.core.logger import logger
 
+cfg = get_settings()
+
 router = APIRouter(prefix="/analyze", tags=["Analysis"])
 
 
@@ -13,6 +26,19 @@ class AnalyzeRequest(BaseModel):
     symptoms: str = Field(..., min_length=5, description="Patient symptoms description")
     patient_age: Optional[int] = Field(None, ge=0, le=120)
     patient_sex: Optional[str] = Field(None, pattern="^(male|female|other)$")
+    deterministic: Optional[bool] = Field(
+        None, description="Greedy decoding with response caching; defaults to server setting")
+    generation_mode: Optional[str] = Field(
+        None, pattern="^(standard|prompt_lookup|draft_model)$",
+        description="Speculative decoding for greedy requests; defaults to server setting")
+    sections: Optional[list[Literal["reasoning", "differentials", "workup", "treatment",
+                                    "red_flags"]]] = Field(
+        None, min_length=1,
+        description="Generate only these sections (e.g. differentials, red_flags); default all")
+    model: Optional[str] = Field(
+        None, pattern=r"^[\w.-]+$",
+        description="LoRA adapter to answer with (listed under adapters in /health); "
+                    "default the base model")
 
 
 class AnalyzeResponse(BaseModel):
@@ -23,29 +49,280 @@ class AnalyzeResponse(BaseModel):
     workup: str
     treatment: str
     red_flags: str
+    cache: Optional[str] = Field(None, description="hit / miss / bypass")
+
+
+async def _prompt_history(req: AnalyzeRequest) -> list[dict]:
+    """Session history compacted to what fits the prompt-token budget."""
+    history = await session_service.offload(session_service.get_turns, req.session_id)
+    if not history:
+        return []
+    reserved = history_compactor.count(SYSTEM_PROMPT) + history_compactor.count(req.symptoms)
+    prompt = history_compactor.compact(history, reserved, key=req.session_id)
+    cold = history_compactor.cold(history, req.session_id)
+    if cold:
+        await session_service.offload(session_service.compress_cold, req.session_id, cold)
+    return prompt
+
+
+def _persist_turns(req: AnalyzeRequest, result: dict):
+    session_service.add_turn(req.session_id, "user", req.symptoms)
+    session_service.add_turn(req.session_id, "assistant", result["full_response"])
+
+
+def _profile_id(request: Request) -> Optional[str]:
+    """
+    A request id holding the profilers if this request is to be profiled,
+    else None; the caller releases it if the request never reaches ``run``.
+    """
+    return request_profiler.claim(request.headers.get(cfg.profile_header))
+
+
+def _require_ready(req: AnalyzeRequest):
+    """
+    Fail fast with 503 while the model is still loading instead of queueing
+    behind it, and with 400 for a model that is neither the base nor an adapter.
+    """
+    if not inference_service.ready:
+        raise HTTPException(status_code=503,
+                            detail=f"Model not ready ({inference_service.state})",
+                            headers={"Retry-After": str(cfg.not_ready_retry_after_s)})
+    if req.model is not None and not inference_service.has_model(req.model):
+        raise HTTPException(status_code=400, detail=f"Unknown model {req.model!r}")
+
+
+def _analyze_fn(profile_id: Optional[str]):
+    """``inference_service.analyze``, run under the profilers when ``profile_id`` is set."""
+    if profile_id is None:
+        return inference_service.analyze
+    return partial(request_profiler.run, profile_id, inference_service.analyze)
 
 
 @router.post("", response_model=AnalyzeResponse)
-async def analyze(req: AnalyzeRequest):
+async def analyze(req: AnalyzeRequest, request: Request, response: Response):
     """
     Run clinical reasoning on the provided symptoms.
     Returns structured output including chain-of-thought reasoning,
     differential diagnoses, recommended workup, and treatment plan.
+    A profiled request answers with an ``X-Profile-Id`` header; see /profiles.
+    Answers 503 with Retry-After until the model is loaded (see /readyz).
     """
+    _require_ready(req)
     logger.info(f"[{req.session_id}] Analyzing: {req.symptoms[:80]}...")
+    profile_id = _profile_id(request)
+    if profile_id is not None:
+        response.headers["X-Profile-Id"] = profile_id
     try:
-        history = session_service.get_chat_pairs(req.session_id)
-        result = inference_service.analyze(
+        history = await _prompt_history(req)
+        result = await inference_executor.run(
+            _analyze_fn(profile_id),
             symptoms=req.symptoms,
             patient_age=req.patient_age,
             patient_sex=req.patient_sex,
             history=history if history else None,
+            session_id=req.session_id,
+            deterministic=req.deterministic,
+            generation_mode=req.generation_mode,
+            sections=req.sections,
+            model=req.model,
         )
-        # Persist turn
-        session_service.add_turn(req.session_id, "user", req.symptoms)
-        session_service.add_turn(req.session_id, "assistant", result["full_response"])
+        await session_service.offload(_persist_turns, req, result)
 
         return AnalyzeResponse(session_id=req.session_id, **result)
+    except QueueFullError as e:
+        logger.warning(f"[{req.session_id}] Rejected — inference queue full")
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Inference error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        request_profiler.release(profile_id)
+
+
+@router.post("/stream")
+async def analyze_stream(req: AnalyzeRequest, request: Request):
+    """
+    Same analysis as POST /analyze, streamed as Server-Sent Events:
+      - ``token``   — {"text": ...} for every decoded chunk
+      - ``section`` — {"section": ..., "content": ...} as each section completes
+      - ``done``    — the full AnalyzeResponse; the turn is persisted just before
+      - ``error``   — {"detail": ...} if generation fails
+    """
+    _require_ready(req)
+    logger.info(f"[{req.session_id}] Streaming analysis: {req.symptoms[:80]}...")
+    loop = asyncio.get_running_loop()
+    chunks: asyncio.Queue = asyncio.Queue()
+    history = await _prompt_history(req)
+    profile_id = _profile_id(request)
+    try:
+        job = inference_executor.submit(
+            _analyze_fn(profile_id),
+            symptoms=req.symptoms,
+            patient_age=req.patient_age,
+            patient_sex=req.patient_sex,
+            history=history if history else None,
+            session_id=req.session_id,
+            deterministic=req.deterministic,
+            generation_mode=req.generation_mode,
+            sections=req.sections,
+            model=req.model,
+            on_text=lambda text: loop.call_soon_threadsafe(chunks.put_nowait, text),
+        )
+    except QueueFullError as e:
+        request_profiler.release(profile_id)
+        logger.warning(f"[{req.session_id}] Rejected — inference queue full")
+        raise HTTPException(status_code=503, detail=str(e),
+                            headers={"Retry-After": str(e.retry_after)})
+    job.add_done_callback(lambda _: request_profiler.release(profile_id))
+    job.add_done_callback(lambda _: chunks.put_nowait(None))
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if profile_id is not None:
+        headers["X-Profile-Id"] = profile_id
+    return StreamingResponse(
+        _stream_events(req, job, chunks),
+        media_type="text/event-stream",
+        headers=headers,
+    )
+
+
+async def _stream_events(req: AnalyzeRequest, job: asyncio.Future, chunks: asyncio.Queue):
+    sections = SectionParser()
+    while (text := await chunks.get()) is not None:
+        yield _sse("token", {"text": text})
+        for key, content in sections.feed(text):
+            yield _sse("section", {"section": key, "content": content})
+    try:
+        result = job.result()
+    except Exception as e:
+        logger.error(f"Inference error: {e}")
+        yield _sse("error", {"detail": str(e)})
+        return
+    for key, content in sections.close():
+        yield _sse("section", {"section": key, "content": content})
+
+    await session_service.offload(_persist_turns, req, result)
+    yield _sse("done", AnalyzeResponse(session_id=req.session_id, **result).model_dump())
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# ── offline batch jobs ────────────────────────────────────────────────────────
+
+class BatchJobStatus(BaseModel):
+    job_id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+    done: int
+    fraction: float
+    cases_per_s: float
+    eta_s: Optional[float] = None
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    error: Optional[str] = None
+    results_url: str
+
+
+def run_batch_case(index: int, case: dict) -> dict:
+    """
+    One batch line, validated as an AnalyzeRequest and answered as an
+    AnalyzeResponse.  Batch cases carry no history and are not stored as
+    sessions; ``session_id`` only labels the result (default ``case-<index>``).
+    """
+    case.setdefault("session_id", f"case-{index}")
+    req = AnalyzeRequest.model_validate(case)
+    result = inference_service.analyze(
+        symptoms=req.symptoms,
+        patient_age=req.patient_age,
+        patient_sex=req.patient_sex,
+        deterministic=req.deterministic,
+        generation_mode=req.generation_mode,
+        sections=req.sections,
+        model=req.model,
+    )
+    return AnalyzeResponse(session_id=req.session_id, **result).model_dump()
+
+
+def _job_status(job_id: str) -> BatchJobStatus:
+    job = batch_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown batch job")
+    return BatchJobStatus(**job.progress(), results_url=f"/analyze/batch/{job_id}/results")
+
+
+@router.post("/batch", response_model=BatchJobStatus, status_code=202)
+async def analyze_batch(
+    file: Optional[UploadFile] = File(None, description="JSONL, one AnalyzeRequest per line"),
+    path: Optional[str] = Form(None, description=f"Server-side JSONL file under {cfg.batch_input_root}"),
+):
+    """
+    Queue a JSONL file of cases for offline analysis and return its job id.
+    Cases run at full batch throughput in the background; poll
+    ``GET /analyze/batch/{job_id}`` for progress and read results from
+    ``GET /analyze/batch/{job_id}/results``.
+    """
+    if (file is None) == (path is None):
+        raise HTTPException(status_code=400, detail="Provide exactly one of file or path")
+    if path is not None:
+        root = Path(cfg.batch_input_root).resolve()
+        source = Path(path).resolve()
+        if not source.is_relative_to(root) or not source.is_file():
+            raise HTTPException(status_code=400,
+                                detail=f"path must be a file under {cfg.batch_input_root}")
+    else:
+        source = file.file
+    job = await asyncio.to_thread(batch_jobs.create, source)
+    batch_jobs.start(job.job_id, run_batch_case)
+    logger.info(f"Batch job {job.job_id} queued: {job.total} cases")
+    return _job_status(job.job_id)
+
+
+@router.get("/batch/{job_id}", response_model=BatchJobStatus)
+async def batch_status(job_id: str):
+    """Progress of a batch job: counts, throughput and ETA."""
+    return _job_status(job_id)
+
+
+@router.get("/batch/{job_id}/results")
+async def batch_results(job_id: str, follow: bool = True):
+    """
+    Results as NDJSON in completion order, one ``{"index", "result"|"error"}``
+    object per case; a failed case retried by a resume appears again, and its
+    last line counts.  With ``follow`` the response stays open until the job ends.
+    """
+    _job_status(job_id)
+    return StreamingResponse(_follow_results(job_id, follow), media_type="application/x-ndjson")
+
+
+@router.post("/batch/{job_id}/resume", response_model=BatchJobStatus)
+async def batch_resume(job_id: str):
+    """Restart a cancelled, failed or interrupted job from its checkpoint."""
+    status = _job_status(job_id)
+    if status.status != "completed":
+        batch_jobs.start(job_id, run_batch_case)
+    return _job_status(job_id)
+
+
+@router.delete("/batch/{job_id}", response_model=BatchJobStatus)
+async def batch_cancel(job_id: str):
+    """Stop submitting new cases; the job can be resumed later."""
+    _job_status(job_id)
+    batch_jobs.cancel(job_id)
+    return _job_status(job_id)
+
+
+async def _follow_results(job_id: str, follow: bool):
+    offset = 0
+    while True:
+        data, offset, over = await asyncio.to_thread(batch_jobs.follow, job_id, offset)
+        if data:
+            yield data
+        if over or not follow:
+            return
+        if not data:
+            await asyncio.sleep(0.5)
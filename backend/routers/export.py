@@ -1,11 +1,17 @@
+import json
+import re
+import time
+from datetime import datetime, timezone
 from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional
+from backend.core.config import get_settings
 from backend.services.session import session_service
-from backend.services.pdf_export import export_session_pdf
+from backend.services.pdf_jobs import pdf_renderer, stream_zip
 from backend.core.logger import logger
 
+cfg = get_settings()
 router = APIRouter(prefix="/export-pdf", tags=["Export"])
 
 
@@ -15,17 +21,58 @@ class ExportRequest(BaseModel):
     patient_sex: Optional[str] = None
 
 
-@router.post("")
-async def export_pdf(req: ExportRequest):
-    """Export the session conversation as a professional PDF report."""
-    history = session_service.get_history(req.session_id)
+class BulkExportRequest(BaseModel):
+    session_ids: Optional[list[str]] = Field(None, min_length=1)
+    since: Optional[datetime] = None    # sessions with a turn in [since, until); naive = UTC
+    until: Optional[datetime] = None
+
+
+class ExportJobStatus(BaseModel):
+    job_id: str
+    session_id: str
+    status: str                     # pending | done | failed
+    turns: int
+    created: float
+    finished: Optional[float] = None
+    bytes: Optional[int] = None
+    error: Optional[str] = None
+    status_url: str
+    download_url: str
+
+
+async def _session(req: ExportRequest) -> tuple[list[dict], dict]:
+    history = await session_service.offload(session_service.get_history, req.session_id)
     if not history:
         raise HTTPException(status_code=404, detail="No session data to export")
+    return history, {"age": req.patient_age, "sex": req.patient_sex}
+
+
+def _job_status(status: dict) -> ExportJobStatus:
+    job_id = status["job_id"]
+    return ExportJobStatus(**status, status_url=f"/export-pdf/jobs/{job_id}",
+                           download_url=f"/export-pdf/jobs/{job_id}/download")
+
+
+def _submit(req: ExportRequest, history: list[dict], patient_info: dict) -> ExportJobStatus:
+    status = pdf_renderer.submit(history, patient_info, session_id=req.session_id)
+    logger.info(f"PDF job {status['job_id']} queued for session {req.session_id} "
+                f"({len(history)} turns)")
+    return _job_status(status)
+
+
+@router.post("")
+async def export_pdf(req: ExportRequest):
+    """
+    Export the session conversation as a professional PDF report.  Sessions
+    longer than PDF_SYNC_MAX_TURNS are answered 202 with an export job to poll.
+    """
+    history, patient_info = await _session(req)
+    if len(history) > cfg.pdf_sync_max_turns:
+        job = _submit(req, history, patient_info)
+        return JSONResponse(job.model_dump(), status_code=202,
+                            headers={"Location": job.status_url})
     try:
-        pdf_bytes = export_session_pdf(
-            session_history=history,
-            patient_info={"age": req.patient_age, "sex": req.patient_sex},
-        )
+        pdf_bytes = await pdf_renderer.render(history, patient_info)
         logger.info(f"PDF exported for session {req.session_id} — {len(pdf_bytes)} bytes")
         return Response(
             content=pdf_bytes,
@@ -37,3 +84,113 @@ async def export_pdf(req: ExportRequest):
     except Exception as e:
         logger.error(f"PDF export error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ── export jobs ───────────────────────────────────────────────────────────────
+
+@router.post("/jobs", response_model=ExportJobStatus, status_code=202)
+async def submit_export(req: ExportRequest):
+    """Queue a PDF export regardless of session size."""
+    history, patient_info = await _session(req)
+    return _submit(req, history, patient_info)
+
+
+@router.get("/jobs/{job_id}", response_model=ExportJobStatus)
+async def export_status(job_id: str):
+    status = pdf_renderer.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown export job")
+    return _job_status(status)
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export(job_id: str):
+    status = pdf_renderer.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown export job")
+    if status["status"] == "failed":
+        raise HTTPException(status_code=500, detail=status["error"])
+    if status["status"] != "done":
+        raise HTTPException(status_code=409, detail="Export still rendering",
+                            headers={"Retry-After": "1"})
+    return FileResponse(pdf_renderer.pdf_path(job_id), media_type="application/pdf",
+                        filename=f"nemesis_{status['session_id']}.pdf")
+
+
+# ── bulk export ───────────────────────────────────────────────────────────────
+
+@router.post("/bulk")
+async def export_bulk(req: BulkExportRequest):
+    """
+    Stream a ZIP with one PDF per session, given ``session_ids`` or a
+    ``since``/``until`` range.  PDFs are rendered in the pool and written to
+    the archive as each completes; ``manifest.json`` closes it with the
+    outcome per session.
+    """
+    has_range = req.since is not None or req.until is not None
+    if (req.session_ids is None) == (not has_range):
+        raise HTTPException(status_code=400,
+                            detail="Provide either session_ids or a since/until range")
+    session_ids = list(dict.fromkeys(req.session_ids or await session_service.offload(
+        session_service.list_sessions, _epoch(req.since), _epoch(req.until))))
+    if not session_ids:
+        raise HTTPException(status_code=404, detail="No sessions to export")
+    if len(session_ids) > cfg.pdf_bulk_max_sessions:
+        raise HTTPException(status_code=400, detail=f"At most {cfg.pdf_bulk_max_sessions} "
+                                                    f"sessions per bulk export")
+    logger.info(f"Bulk PDF export of {len(session_ids)} sessions")
+    manifest: list[dict] = []
+    names: set[str] = set()
+
+    async def sources():
+        # histories are loaded lazily, as render slots free up
+        for session_id in session_ids:
+            history = await session_service.offload(session_service.get_history, session_id)
+            if history:
+                yield session_id, history, None
+            else:
+                manifest.append({"session_id": session_id, "status": "empty"})
+
+    async def entries():
+        async for session_id, pdf, error in pdf_renderer.render_many(sources()):
+            if error is not None:
+                manifest.append({"session_id": session_id, "status": "failed", "error": error})
+                continue
+            name = _unique_name(session_id, names)
+            manifest.append({"session_id": session_id, "status": "ok", "file": name,
+                             "bytes": len(pdf)})
+            yield name, pdf
+        yield "manifest.json", json.dumps(manifest, indent=2).encode()
+
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.gmtime())
+    return StreamingResponse(
+        stream_zip(entries()), media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="nemesis_sessions_{stamp}.zip"'},
+    )
+
+
+def _epoch(value: Optional[datetime]) -> Optional[float]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def _safe_name(session_id: str) -> str:
+    return re.sub(r"[^\w.-]", "_", session_id)[:100]
+
+
+def _unique_name(session_id: str, used: set[str]) -> str:
+    """
+    Archive file name for a session, suffixed with a counter when another
+    session already sanitised to it (``bulk/2`` and ``bulk_2``).  Compared
+    case-insensitively, as archives are often unpacked on such filesystems.
+    """
+    stem = f"nemesis_{_safe_name(session_id)}"
+    name, n = f"{stem}.pdf", 1
+    while name.lower() in used:
+        n += 1
+        name = f"{stem}_{n}.pdf"
+    used.add(name.lower())
+    return name
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+from backend.core.config import get_settings
+from backend.services.profiling import ARTEFACTS, request_profiler
+
+cfg = get_settings()
+
+router = APIRouter(prefix="/profiles", tags=["Profiling"])
+
+MEDIA_TYPES = {
+    "pstats": "application/octet-stream",
+    "summary": "text/plain",
+    "trace": "application/json",
+}
+
+
+def _authorize(request: Request):
+    """Profiles are served only while profiling is on, and with PROFILE_TOKEN if one is set."""
+    if not request_profiler.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not request_profiler.authorized(request.headers.get(cfg.profile_header)):
+        raise HTTPException(status_code=403, detail=f"Missing or wrong {cfg.profile_header} token")
+
+
+@router.get("/{request_id}")
+async def get_profile(request_id: str, request: Request):
+    """Artefacts recorded for a profiled request (its ``X-Profile-Id`` response header)."""
+    _authorize(request)
+    found = request_profiler.artefacts(request_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="No profile for this request id")
+    return {
+        "request_id": request_id,
+        "artefacts": {kind: f"/profiles/{request_id}/{kind}" for kind in found},
+    }
+
+
+@router.get("/{request_id}/{kind}")
+async def download_profile(request_id: str, kind: str, request: Request):
+    """Download one artefact: ``pstats``, ``summary`` or ``trace`` (Chrome trace JSON)."""
+    _authorize(request)
+    if kind not in ARTEFACTS:
+        raise HTTPException(status_code=404, detail=f"Unknown artefact {kind!r}")
+    path = request_profiler.artefacts(request_id).get(kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No such profile artefact")
+    return FileResponse(path, media_type=MEDIA_TYPES[kind], filename=path.name)
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, HTTPException
+from backend.services.inference import inference_service
 from backend.services.session import session_service
 
 router = APIRouter(prefix="/history", tags=["Session"])
@@ -6,7 +7,7 @@ router = APIRouter(prefix="/history", tags=["Session"])
 
 @router.get("/{session_id}")
 async def get_history(session_id: str):
-    history = session_service.get_history(session_id)
+    history = await session_service.offload(session_service.get_history, session_id)
     if not history:
         raise HTTPException(status_code=404, detail="Session not found or empty")
     return {"session_id": session_id, "turns": history}
@@ -14,5 +15,6 @@ async def get_history(session_id: str):
 
 @router.delete("/{session_id}")
 async def clear_history(session_id: str):
-    session_service.clear(session_id)
+    await session_service.offload(session_service.clear, session_id)
+    inference_service.forget_session(session_id)
     return {"message": f"Session {session_id} cleared"}
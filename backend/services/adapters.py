@@ -0,0 +1,172 @@
+"""
+LoRA adapter registry — department fine-tunes served over one resident base model.
+
+Every subdirectory of ADAPTERS_DIR holding a PEFT ``adapter_config.json`` and
+``adapter_model.safetensors`` is an adapter, selected per request by its
+directory name.  Adapters are loaded into the base model's target layers on
+first use (see ``lora.py``) and evicted least-recently-used to stay under
+ADAPTER_BUDGET_MB; an adapter pinned by a running request is never evicted.
+Which adapter applies to which batch row is a per-thread setting, so
+requests for different adapters still share one continuous batch.
+"""
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Union
+from backend.core.logger import logger
+
+CONFIG_FILE = "adapter_config.json"
+
+# one adapter name for every row, one entry per batch row, or None for the base model
+Rows = Union[str, tuple[Union[str, None], ...], None]
+
+_state = threading.local()
+
+
+def active_rows() -> Rows:
+    """The adapter selection for forwards on the current thread."""
+    return getattr(_state, "rows", None)
+
+
+def active_adapter() -> str | None:
+    """The adapter selected for the whole batch on this thread, if any."""
+    rows = active_rows()
+    return rows if isinstance(rows, str) else None
+
+
+@contextmanager
+def adapter_rows(rows: Rows) -> Iterator[None]:
+    """Select adapters for forwards run on this thread inside the block."""
+    previous = active_rows()
+    _state.rows = rows
+    try:
+        yield
+    finally:
+        _state.rows = previous
+
+
+@dataclass
+class _Resident:
+    nbytes: int
+    modules: list           # the wrapped layers holding this adapter's weights
+    users: int = 0
+
+
+class AdapterRegistry:
+    def __init__(self, directory: str, budget_bytes: int):
+        self.directory = Path(directory)
+        self.budget_bytes = budget_bytes
+        self.model = None
+        self._resident: OrderedDict[str, _Resident] = OrderedDict()   # LRU order
+        self._lock = threading.Lock()
+        self._loading: dict[str, threading.Event] = {}   # set once that load settles
+        self._load_lock = threading.Lock()      # loads wrap layers — one at a time
+        self.loads = 0
+        self.evictions = 0
+
+    def attach(self, model):
+        """Serve adapters over ``model``; whatever was loaded into a previous model is dropped."""
+        with self._lock:
+            self.model = model
+            self._resident.clear()
+
+    def available(self) -> list[str]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(p.name for p in self.directory.iterdir() if (p / CONFIG_FILE).is_file())
+
+    def exists(self, name: str) -> bool:
+        return name not in ("", ".", "..") and "/" not in name and "\\" not in name \
+            and (self.directory / name / CONFIG_FILE).is_file()
+
+    @contextmanager
+    def use(self, name: str | None) -> Iterator[None]:
+        """Pin adapter ``name`` — loading it if needed — and select it for this thread."""
+        if name is None:
+            with adapter_rows(None):
+                yield
+            return
+        self._acquire(name)
+        try:
+            with adapter_rows(name):
+                yield
+        finally:
+            with self._lock:
+                entry = self._resident.get(name)
+                if entry is not None:
+                    entry.users -= 1
+                self._evict()
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshot = {
+                "loaded": list(self._resident),
+                "bytes": sum(e.nbytes for e in self._resident.values()),
+                "budget_bytes": self.budget_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+        return {"available": self.available(), **snapshot}
+
+    # ── internals ────────────────────────────────────────────────────────────
+    def _acquire(self, name: str):
+        """Pin ``name``, reading it from disk outside ``_lock`` if it is not resident."""
+        while True:
+            with self._lock:
+                entry = self._resident.get(name)
+                if entry is not None:
+                    entry.users += 1
+                    self._resident.move_to_end(name)
+                    self._evict()
+                    return
+                loading = self._loading.get(name)
+                if loading is None:
+                    if self.model is None:
+                        raise RuntimeError("No base model attached")
+                    if not self.exists(name):
+                        raise ValueError(f"Unknown model {name!r}")
+                    model = self.model
+                    loading = self._loading[name] = threading.Event()
+                    break
+            loading.wait()          # another request is loading it; then look again
+
+        from backend.services.lora import load_adapter
+
+        try:
+            with self._load_lock:
+                nbytes, modules = load_adapter(model, name, self.directory / name)
+            with self._lock:
+                if self.model is not model:         # re-attached while loading
+                    raise RuntimeError("Base model changed while loading adapter")
+                # registered before waiters wake, so they find it resident
+                self._resident[name] = _Resident(nbytes, modules, users=1)
+                self.loads += 1
+                self._evict()
+        finally:
+            with self._lock:
+                del self._loading[name]
+            loading.set()
+        logger.info(f"Adapter {name} loaded: {len(modules)} layers, "
+                    f"{nbytes / 2 ** 20:.1f} MiB")
+
+    def _evict(self):
+        """Unload idle adapters, oldest first, until the resident set fits the budget."""
+        total = sum(e.nbytes for e in self._resident.values())
+        for name, entry in list(self._resident.items()):
+            if total <= self.budget_bytes:
+                return
+            if entry.users:
+                continue
+            from backend.services.lora import unload_adapter
+
+            unload_adapter(entry.modules, name)
+            del self._resident[name]
+            total -= entry.nbytes
+            self.evictions += 1
+            logger.info(f"Adapter {name} evicted")
+        if total > self.budget_bytes:
+            logger.warning("Adapters in use exceed ADAPTER_BUDGET_MB")
@@ -0,0 +1,271 @@
+"""
+Offline batch jobs — run a JSONL file of cases through a handler with checkpointed, resumable progress.
+
+Each job lives in its own directory: ``input.jsonl``, ``results.ndjson``
+(one line per finished case, in completion order, each tagged with its input
+``index``) and ``job.json`` (status and counters).  The results file is the
+checkpoint: a resumed job skips every index that succeeded and runs failed
+cases again, so a retried case's new line follows its old error.  A
+``cancel`` marker file asks whichever process runs the job to stop.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable
+from backend.core.config import get_settings
+from backend.core.logger import logger
+
+cfg = get_settings()
+
+INPUT = "input.jsonl"
+RESULTS = "results.ndjson"
+META = "job.json"
+CANCEL = "cancel"
+ACTIVE = ("queued", "running")
+READY_POLL_S = 0.5
+
+
+@dataclass
+class BatchJob:
+    job_id: str
+    total: int
+    status: str = "queued"          # queued | running | completed | cancelled | failed
+    completed: int = 0
+    failed: int = 0
+    created: float = 0.0
+    started: float | None = None
+    finished: float | None = None
+    error: str | None = None
+
+    def progress(self) -> dict:
+        done = self.completed + self.failed
+        elapsed = ((self.finished or time.time()) - self.started) if self.started else 0.0
+        rate = done / elapsed if elapsed > 0 else 0.0
+        return {
+            **asdict(self),
+            "done": done,
+            "fraction": round(done / self.total, 4) if self.total else 1.0,
+            "cases_per_s": round(rate, 3),
+            "eta_s": round((self.total - done) / rate, 1) if rate and self.status == "running"
+            else None,
+        }
+
+
+class BatchJobManager:
+    """
+    Creates jobs on disk and runs each on a background thread that keeps up
+    to ``concurrency`` cases in flight, so the batch scheduler sees a full
+    batch.  A per-job lock file makes sure only one process runs a job, so
+    every worker may call ``resume_pending`` at start-up.  A job stays
+    queued until ``ready()`` is true, so cases never run against a model
+    that is still loading.
+    """
+
+    def __init__(self, root: str, concurrency: int, ready: Callable[[], bool] = lambda: True):
+        self.root = Path(root)
+        self.concurrency = concurrency
+        self.ready = ready
+        self._runners: dict[str, threading.Thread] = {}
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def create(self, source: BinaryIO | Path) -> BatchJob:
+        """Copy an uploaded stream or a server-side file into a new job directory."""
+        job_id = uuid.uuid4().hex[:16]
+        directory = self.root / job_id
+        directory.mkdir(parents=True)
+        with open(directory / INPUT, "wb") as dst:
+            if isinstance(source, Path):
+                with open(source, "rb") as src:
+                    shutil.copyfileobj(src, dst)
+            else:
+                shutil.copyfileobj(source, dst)
+        with open(directory / INPUT, "rb") as f:
+            total = sum(1 for line in f if line.strip())
+        job = BatchJob(job_id, total=total, created=time.time())
+        self._save(job)
+        return job
+
+    def get(self, job_id: str) -> BatchJob | None:
+        path = self.root / job_id / META
+        if not _valid_id(job_id) or not path.exists():
+            return None
+        return BatchJob(**json.loads(path.read_text()))
+
+    def results_path(self, job_id: str) -> Path:
+        return self.root / job_id / RESULTS
+
+    def start(self, job_id: str, handler: Callable[[int, dict], dict]) -> bool:
+        """
+        Run (or resume) a job in the background; ``handler(index, case)``
+        answers one input line.  False if this process is already running it.
+        """
+        with self._lock:
+            runner = self._runners.get(job_id)
+            if runner is not None and runner.is_alive():
+                return False
+            (self.root / job_id / CANCEL).unlink(missing_ok=True)
+            runner = threading.Thread(target=self._run, args=(job_id, handler),
+                                      name=f"batch-{job_id}", daemon=True)
+            self._runners[job_id] = runner
+        runner.start()
+        return True
+
+    def resume_pending(self, handler: Callable[[int, dict], dict]):
+        """Restart every job left queued or running by a previous process."""
+        if not self.root.exists():
+            return
+        for directory in self.root.iterdir():
+            job = self.get(directory.name)
+            if job is not None and job.status in ACTIVE:
+                logger.info(f"Resuming batch job {job.job_id} ({job.completed + job.failed}"
+                            f"/{job.total} done)")
+                self.start(job.job_id, handler)
+
+    def cancel(self, job_id: str):
+        """Ask the job to stop; a file, so it reaches the runner in any worker process."""
+        (self.root / job_id / CANCEL).touch()
+
+    def shutdown(self):
+        """Stop submitting new cases; unfinished jobs stay queued and resume on the next start."""
+        with self._lock:
+            self._stopping = True
+            runners = list(self._runners.values())
+        for runner in runners:
+            runner.join(timeout=30)
+
+    def follow(self, job_id: str, offset: int = 0) -> tuple[bytes, int, bool]:
+        """Complete result lines written after ``offset``, the new offset, and whether the job is over."""
+        job = self.get(job_id)
+        over = job is None or job.status not in ACTIVE
+        path = self.results_path(job_id)
+        if not path.exists():
+            return b"", offset, over
+        with open(path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        data = data[:data.rfind(b"\n") + 1]         # never hand out a half-written line
+        return data, offset + len(data), over
+
+    # ── runner ───────────────────────────────────────────────────────────────
+    def _run(self, job_id: str, handler: Callable[[int, dict], dict]):
+        directory = self.root / job_id
+        with open(directory / "runner.lock", "w") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info(f"Batch job {job_id} is running in another process")
+                return
+            job = self.get(job_id)
+            if not self._wait_ready(job, directory):
+                return
+            done = self._checkpoint(directory)
+            job.completed, job.failed = len(done), 0
+            job.status, job.started, job.finished = "running", job.started or time.time(), None
+            self._save(job)
+            try:
+                self._execute(job, directory, done, handler)
+                if job.completed + job.failed >= job.total:
+                    job.status = "completed"
+                else:
+                    job.status = "queued" if self._stopping else "cancelled"
+            except Exception as e:
+                logger.error(f"Batch job {job_id} failed: {e}")
+                job.status, job.error = "failed", str(e)
+            job.finished = time.time()
+            self._save(job)
+            logger.info(f"Batch job {job_id} {job.status}: {job.completed} ok, {job.failed} failed")
+
+    def _wait_ready(self, job: BatchJob, directory: Path) -> bool:
+        """Block until ``ready()``; False (job saved as queued or cancelled) if stopped first."""
+        while not self.ready():
+            if self._stopping or (directory / CANCEL).exists():
+                job.status = "queued" if self._stopping else "cancelled"
+                self._save(job)
+                return False
+            time.sleep(READY_POLL_S)
+        return True
+
+    def _execute(self, job: BatchJob, directory: Path, done: set[int],
+                 handler: Callable[[int, dict], dict]):
+        slots = threading.Semaphore(self.concurrency)
+        write_lock = threading.Lock()
+        last_save = time.monotonic()
+
+        def finish(index: int, record: dict):
+            nonlocal last_save
+            line = json.dumps({"index": index, **record}, ensure_ascii=False) + "\n"
+            with write_lock:
+                out.write(line)
+                out.flush()
+                if "error" in record:
+                    job.failed += 1
+                else:
+                    job.completed += 1
+                if time.monotonic() - last_save > 1:
+                    last_save = time.monotonic()
+                    self._save(job)
+            slots.release()
+
+        def run_case(index: int, line: str):
+            try:
+                finish(index, {"result": handler(index, json.loads(line))})
+            except Exception as e:
+                finish(index, {"error": str(e)})
+
+        with open(directory / RESULTS, "a", encoding="utf-8") as out, \
+                ThreadPoolExecutor(self.concurrency, thread_name_prefix="batch") as pool, \
+                open(directory / INPUT, encoding="utf-8") as cases:
+            index = -1
+            for line in cases:
+                if not line.strip():
+                    continue
+                index += 1
+                if index in done:
+                    continue
+                slots.acquire()
+                if self._stopping or (directory / CANCEL).exists():
+                    slots.release()
+                    break
+                pool.submit(run_case, index, line)
+
+    def _checkpoint(self, directory: Path) -> set[int]:
+        """Indices that succeeded in the results file; drops a torn last line."""
+        path = directory / RESULTS
+        if not path.exists():
+            return set()
+        done: set[int] = set()
+        with open(path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end < len(data):
+                f.truncate(end)
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            if "error" not in record:
+                done.add(record["index"])
+        return done
+
+    def _save(self, job: BatchJob):
+        path = self.root / job.job_id / META
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(asdict(job)))
+        os.replace(tmp, path)
+
+
+def _valid_id(job_id: str) -> bool:
+    return job_id.isalnum()
+
+
+# Singleton
+batch_jobs = BatchJobManager(cfg.batch_jobs_dir, cfg.batch_concurrency)
@@ -0,0 +1,65 @@
+"""
+CPU inference profile — thread tuning, dynamic int8 quantisation and an optional compiled forward.
+"""
+from __future__ import annotations
+
+import os
+import warnings
+
+import torch
+from backend.core.logger import logger
+
+
+def configure_threads(intra_op: int, inter_op: int = 0, workers: int = 1):
+    """
+    Set torch's thread pools.  ``intra_op=0`` keeps torch's default, except
+    with several workers, where the cores are divided between them instead of
+    every worker oversubscribing all of them.
+    """
+    if not intra_op and workers > 1:
+        intra_op = max(1, (os.cpu_count() or 1) // workers)
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op:
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError:        # only settable before the first inter-op work
+            logger.warning("Inter-op thread count already fixed for this process")
+    logger.info(f"Torch threads: intra-op {torch.get_num_threads()}, "
+                f"inter-op {torch.get_num_interop_threads()}")
+
+
+def quantize_int8(model):
+    """
+    Dynamic int8 quantisation of the decoder's ``nn.Linear`` layers: int8
+    weights, activations quantised per batch at run time.  The LM head is
+    left in float, where int8 error costs the most accuracy for little speed.
+    Requires float32 weights; returns the model unchanged if unsupported.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+    except ImportError:
+        logger.warning("torch.ao.quantization unavailable; int8 quantisation skipped")
+        return model
+    spec = {name: default_dynamic_qconfig for name, module in model.named_modules()
+            if isinstance(module, torch.nn.Linear) and name != "lm_head"}
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return quantize_dynamic(model, spec, dtype=torch.qint8, inplace=True)
+
+
+def compile_forward(model):
+    """Compile ``model.forward`` in place; dynamic shapes avoid a recompile per prompt length."""
+    model.forward = torch.compile(model.forward, dynamic=True)
+    return model
+
+
+def apply_cpu_profile(model, cfg):
+    """Apply the profile's quantisation and compilation settings to a loaded float32 model."""
+    if cfg.cpu_int8:
+        model = quantize_int8(model)
+    if cfg.cpu_compile:
+        model = compile_forward(model)
+    return model
@@ -0,0 +1,83 @@
+"""
+InferenceExecutor — runs blocking inference off the event loop with bounded admission.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from backend.core.config import get_settings
+
+cfg = get_settings()
+
+
+class QueueFullError(Exception):
+    """Raised when the admission queue is full; carries a Retry-After hint."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceExecutor:
+    """
+    Dedicated thread pool for model calls.  At most ``max_concurrency`` calls
+    run at once and at most ``max_queue`` more wait for a slot; anything beyond
+    that is rejected immediately instead of piling up.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency,
+                                        thread_name_prefix="inference")
+        self._pending = 0               # only touched from the event loop
+        self._avg_seconds = 0.0         # EMA of call duration, for Retry-After
+
+    @property
+    def in_flight(self) -> int:
+        return min(self._pending, self.max_concurrency)
+
+    @property
+    def queued(self) -> int:
+        return max(0, self._pending - self.max_concurrency)
+
+    def retry_after(self) -> int:
+        waves = (self.queued + 1) / self.max_concurrency
+        return max(1, math.ceil(self._avg_seconds * waves))
+
+    def submit(self, fn, *args, **kwargs) -> asyncio.Future:
+        """Admit a call or raise ``QueueFullError``; must be called on the event loop."""
+        if self._pending >= self.max_concurrency + self.max_queue:
+            raise QueueFullError(self.retry_after())
+        self._pending += 1
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, partial(fn, *args, **kwargs))
+        future.add_done_callback(lambda _: self._finished(start))
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        return await self.submit(fn, *args, **kwargs)
+
+    def _finished(self, start: float):
+        self._pending -= 1
+        elapsed = time.perf_counter() - start
+        self._avg_seconds = elapsed if not self._avg_seconds else (
+            0.8 * self._avg_seconds + 0.2 * elapsed)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+inference_executor = InferenceExecutor(cfg.inference_concurrency, cfg.inference_queue_size)
@@ -0,0 +1,203 @@
+"""
+History compaction — fits multi-turn history into a fixed prompt-token budget.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable, Optional
+from backend.core.config import get_settings
+from backend.services.inference import inference_service
+from backend.services.sections import SECTIONS, parse_sections
+from backend.services.turns import Turn
+
+cfg = get_settings()
+
+TURN_OVERHEAD = 5           # role header + end-of-turn tokens added by the chat template
+SUMMARY_SECTIONS = ("Differential Diagnosis", "Red Flags")
+
+# the pair just before a window boundary: its index and its leading turn's timestamp
+Mark = Optional[tuple[int, object]]
+
+
+class HistoryCompactor:
+    """
+    Fits the history into the token budget without disturbing the prompt
+    prefix more often than it must.  The last ``recent_pairs`` exchanges are
+    kept verbatim; older assistant answers are reduced to their differential
+    and red-flag sections as they leave that window, which only rewrites the
+    end of the previous prompt.  The oldest kept pair moves only when the
+    history overflows the budget, and then in one block: pairs are dropped
+    oldest-first until the history fits ``low_water`` of the budget.  Between
+    overflows the summaries at the front of the prompt stay as they were, so
+    the session KV cache keeps matching past the system prompt.
+
+    Token counts and summaries are memoised per turn text; a ``Turn`` also
+    keeps its own count and, once cold, its summary (see ``cold``), so stored
+    history is tokenised once and never decompressed for the prompt.  The
+    window is remembered by turn timestamp as well as position, so it stays
+    put when the store trims the oldest turns of a session.
+    """
+
+    def __init__(
+        self,
+        count_tokens: Callable[[str], int],
+        budget: int,
+        recent_pairs: int = 2,
+        low_water: float = 0.75,
+        cache_size: int = 10_000,
+    ):
+        self.count_tokens = count_tokens
+        self.budget = budget
+        self.recent_pairs = recent_pairs
+        self.low_water = low_water
+        self.cache_size = cache_size
+        self._counts: OrderedDict[tuple[int, int], int] = OrderedDict()
+        self._summaries: OrderedDict[tuple[int, int], str] = OrderedDict()
+        # session → marks ending the dropped and the summarised pairs, carried between turns
+        self._windows: OrderedDict[str, tuple[Mark, Mark]] = OrderedDict()
+
+    def count(self, text: str) -> int:
+        key = (len(text), hash(text))
+        n = self._counts.get(key)
+        if n is None:
+            n = self._counts[key] = self.count_tokens(text)
+            if len(self._counts) > self.cache_size:
+                self._counts.popitem(last=False)
+        return n
+
+    def count_turn(self, turn: Turn | dict) -> int:
+        if not isinstance(turn, Turn):
+            return self.count(turn["content"])
+        if turn.tokens < 0:
+            turn.tokens = self.count_tokens(turn.content)
+        return turn.tokens
+
+    def summarise(self, response: str) -> str:
+        key = (len(response), hash(response))
+        summary = self._summaries.get(key)
+        if summary is None:
+            sections = parse_sections(response)
+            parts = [f"## {header}\n{sections[SECTIONS[header]]}"
+                     for header in SUMMARY_SECTIONS if sections[SECTIONS[header]]]
+            summary = self._summaries[key] = "\n\n".join(parts) or response
+            if len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return summary
+
+    def compact(self, history: list[Turn | dict], reserved: int = 0,
+                key: str | None = None) -> list[dict]:
+        """
+        Return the subset/summary of ``history`` that fits ``budget - reserved``
+        tokens, as role/content dicts.  ``key`` (the session id) carries the
+        window over from the previous call; without it the window starts afresh.
+        """
+        available = self.budget - reserved
+        pairs = _pairs(history)
+        n = len(pairs)
+        start, verbatim = self._window(pairs, key)
+        verbatim = max(verbatim, n - self.recent_pairs, start)
+        cost = sum(self._cost(p, summary=True) for p in pairs[start:verbatim]) \
+            + sum(self._cost(p, summary=False) for p in pairs[verbatim:])
+        if cost > available:
+            # drop summaries down to the low-water mark, recent pairs only as far as needed
+            low = available * self.low_water
+            while start < n and cost > (low if start < verbatim else available):
+                cost -= self._cost(pairs[start], summary=start < verbatim)
+                start += 1
+                verbatim = max(verbatim, start)
+        if key is not None:
+            self._windows[key] = (_mark(pairs, start), _mark(pairs, verbatim))
+            self._windows.move_to_end(key)
+            if len(self._windows) > self.cache_size:
+                self._windows.popitem(last=False)
+        return [turn for i in range(start, n)
+                for turn in self._render(pairs[i], summary=i < verbatim)]
+
+    def cold(self, history: list[Turn | dict], key: str) -> list[tuple[Turn, str | None]]:
+        """
+        The ``Turn`` records of ``history`` that the session's last prompt no
+        longer quoted verbatim — summarised answers and dropped turns — not yet
+        stored that way, each with the summary the prompt quotes instead (None
+        once dropped), for the store to compress.
+        """
+        pairs = _pairs(history)
+        start, verbatim = self._window(pairs, key)
+        cold: list[tuple[Turn, str | None]] = []
+        for i, pair in enumerate(pairs[:verbatim]):
+            for t in pair:
+                if not isinstance(t, Turn):
+                    continue
+                if i < start:
+                    if not t.compressed or t.summary is not None:
+                        cold.append((t, None))
+                elif t.role == "assistant" and not t.compressed:
+                    cold.append((t, self._summary(t)))
+        return cold
+
+    def _window(self, pairs: list[list[Turn | dict]], key: str | None) -> tuple[int, int]:
+        """(first pair kept, first pair kept verbatim) from the session's last call."""
+        marks = self._windows.get(key) if key is not None else None
+        if marks is None:
+            return 0, 0
+        start, verbatim = (_boundary(pairs, mark) for mark in marks)
+        return start, max(start, verbatim)
+
+    def _summary(self, turn: Turn | dict) -> str:
+        if isinstance(turn, Turn) and turn.summary is not None:
+            return turn.summary
+        return self.summarise(turn["content"])
+
+    def _render(self, pair: list[Turn | dict], summary: bool) -> list[dict]:
+        return [{"role": t["role"],
+                 "content": self._summary(t) if summary and t["role"] == "assistant"
+                 else t["content"]}
+                for t in pair]
+
+    def _cost(self, pair: list[Turn | dict], summary: bool) -> int:
+        return sum((self.count(self._summary(t)) if summary and t["role"] == "assistant"
+                    else self.count_turn(t)) + TURN_OVERHEAD
+                   for t in pair)
+
+
+def _pairs(history: list[Turn | dict]) -> list[list[Turn | dict]]:
+    """Group turns into user-led exchanges so a window never splits a question from its answer."""
+    pairs: list[list[Turn | dict]] = []
+    for turn in history:
+        if turn["role"] == "user" or not pairs:
+            pairs.append([turn])
+        else:
+            pairs[-1].append(turn)
+    return pairs
+
+
+def _stamp(turn: Turn | dict) -> object:
+    return turn.created if isinstance(turn, Turn) else turn.get("timestamp")
+
+
+def _mark(pairs: list[list[Turn | dict]], boundary: int) -> Mark:
+    return (boundary - 1, _stamp(pairs[boundary - 1][0])) if boundary else None
+
+
+def _boundary(pairs: list[list[Turn | dict]], mark: Mark) -> int:
+    """
+    The pair index just after ``mark``: where it was if that pair is still
+    there, else where its timestamp now is (trimming only moves pairs
+    earlier), else 0 — trimmed away or the session was cleared.
+    """
+    if mark is None:
+        return 0
+    i, stamp = mark
+    if i < len(pairs) and _stamp(pairs[i][0]) == stamp:
+        return i + 1
+    for j in range(min(i, len(pairs)) - 1, -1, -1):
+        if _stamp(pairs[j][0]) == stamp:
+            return j + 1
+    return 0
+
+
+history_compactor = HistoryCompactor(
+    inference_service.count_tokens,
+    budget=cfg.prompt_token_budget,
+    recent_pairs=cfg.history_recent_pairs,
+    low_water=cfg.history_low_water,
+)
@@ -1,16 +1,43 @@
 """
 InferenceService — loads LlamaTron RS1 Nemesis and runs clinical reasoning.
+
+torch, transformers and the modules built on them are imported on first use
+(``load()``), so importing the app stays fast and the server can accept
+connections — and answer /livez and /readyz — while the model loads.
 """
 from __future__ import annotations
 
-import re
-import torch
-from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+import threading
+import time
+from dataclasses import replace
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable
 from backend.core.config import get_settings
 from backend.core.logger import logger
+from backend.services.adapters import AdapterRegistry, active_adapter
+from backend.services.kv_cache import (
+    KVPrefix, PrefixCache, SessionKVCache, cache_layers, is_proper_prefix, make_cache,
+)
+from backend.services.metrics import (
+    ANALYSES, GENERATED_TOKENS, PROMPT_TOKENS, STAGE_SECONDS, record_decode,
+)
+from backend.services.profiling import profiling_active
+from backend.services.response_cache import ResponseCache, make_key
+from backend.services.sections import HEADERS, SectionController, Steer, parse_sections
+
+if TYPE_CHECKING:
+    from backend.services.scheduler import GenerationParams
 
 cfg = get_settings()
 
+DTYPES = ("bfloat16", "float16", "float32")
+
+
+def torch_dtype(name: str):
+    """The torch dtype for a TORCH_DTYPE setting; unknown names fall back to bfloat16."""
+    import torch
+    return getattr(torch, name if name in DTYPES else "bfloat16")
+
 SYSTEM_PROMPT = """You are LlamaTron RS1 Nemesis, a clinical decision support AI.
 When a clinician or researcher describes patient symptoms, you MUST respond in this
 exact structured format:
@@ -37,7 +64,6 @@ Always end with:
 Not a substitute for professional medical judgement.*
 """
 
-
 class InferenceService:
     _instance: InferenceService | None = None
 
@@ -45,32 +71,177 @@ class InferenceService:
         if cls._instance is None:
             cls._instance = super().__new__(cls)
             cls._instance._loaded = False
+            cls._instance.state = "starting"      # loading → warming → ready, or failed
+            cls._instance.load_error = None
+            cls._instance._load_lock = threading.Lock()
+            cls._instance.scheduler = None
+            cls._instance.speculative = None
+            cls._instance.prefix_cache = PrefixCache(max_entries=8)   # per adapter too
+            cls._instance.adapters = AdapterRegistry(
+                cfg.adapters_dir, cfg.adapter_budget_mb * 2 ** 20)
+            cls._instance.session_kv = SessionKVCache(
+                cfg.session_kv_budget_mb * 2 ** 20, cfg.session_kv_ttl_s)
+            cls._instance.response_cache = ResponseCache(
+                cfg.response_cache_size, cfg.response_cache_ttl_s, cfg.response_cache_path)
+            cls._instance._prefix_lock = threading.Lock()
         return cls._instance
 
+    @property
+    def ready(self) -> bool:
+        """Model loaded and warmed up; until then /analyze answers 503."""
+        return self.state == "ready"
+
+    def load_in_background(self) -> threading.Thread:
+        """Start ``load()`` on a daemon thread; progress is reported through ``state``."""
+        thread = threading.Thread(target=self._background_load, name="model-load", daemon=True)
+        thread.start()
+        return thread
+
+    def _background_load(self):
+        try:
+            self.load()
+        except Exception as e:
+            logger.exception(f"Model load failed: {e}")
+
     def load(self):
         if self._loaded:
             return
+        with self._load_lock:           # the background load and a direct caller may race
+            if self._loaded:
+                return
+            self.state, self.load_error = "loading", None
+            start = time.perf_counter()
+            try:
+                self._load()
+            except Exception as e:
+                self.state, self.load_error = "failed", str(e)
+                raise
+            self._loaded = True
+            self.state = "ready"
+        logger.info(f"Model loaded ✓ ({time.perf_counter() - start:.1f}s)")
+
+    def _load(self):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
+        from backend.services.cpu_profile import apply_cpu_profile, configure_threads
+        from backend.services.scheduler import BatchScheduler
+        from backend.services.speculative import SpeculativeDecoder
+        from backend.services.weights import ensure_exported, load_shared_model
+
         logger.info(f"Loading model: {cfg.model_id}")
-        dtype_map = {
-            "bfloat16": torch.bfloat16,
-            "float16": torch.float16,
-            "float32": torch.float32,
-        }
-        dtype = dtype_map.get(cfg.torch_dtype, torch.bfloat16)
-
-        self.tokenizer = AutoTokenizer.from_pretrained(cfg.model_id)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            cfg.model_id,
-            torch_dtype=dtype,
-            device_map=cfg.device,
-        )
+        dtype = torch_dtype(cfg.torch_dtype)
+        int8 = cfg.cpu_profile and cfg.cpu_int8
+        if cfg.cpu_profile:
+            configure_threads(cfg.cpu_threads, cfg.cpu_interop_threads, cfg.workers)
+        if int8:
+            dtype = torch.float32           # dynamic quantisation starts from float weights
+
+        shared = self._share_weights()
+        directory = ensure_exported(cfg.model_id, dtype, cfg.model_cache_dir) \
+            if cfg.model_cache or shared else None
+        self.tokenizer = AutoTokenizer.from_pretrained(directory or cfg.model_id)
+        if directory is not None and self._on_cpu():
+            self.model = load_shared_model(directory)
+            logger.info(f"Weights memory-mapped from {directory}")
+        else:
+            self.model = AutoModelForCausalLM.from_pretrained(
+                directory or cfg.model_id,
+                torch_dtype=dtype,
+                device_map="cpu" if cfg.cpu_profile else cfg.device,
+            )
+        if cfg.cpu_profile:
+            if int8 and shared:
+                logger.warning("int8 weights are private to each worker (a quarter of float32)")
+            self.model = apply_cpu_profile(self.model, cfg)
+        self.adapters.attach(self.model)
         self.pipe = pipeline(
             "text-generation",
             model=self.model,
             tokenizer=self.tokenizer,
         )
-        self._loaded = True
-        logger.info("Model loaded ✓")
+        self._fingerprint = f"{cfg.model_id}|{dtype}" + ("|int8" if int8 else "")
+        self.prefix_cache.reset(self._fingerprint)
+        self.session_kv.clear()
+        if cfg.prefix_cache:
+            self._encode_prefix([{"role": "system", "content": SYSTEM_PROMPT}])
+        self.speculative = SpeculativeDecoder(
+            self.model,
+            eos_token_ids=self._eos_token_ids(),
+            num_draft_tokens=cfg.speculative_tokens,
+            max_ngram=cfg.prompt_lookup_ngram,
+            draft_model=self._load_draft_model(dtype) if cfg.draft_model_id else None,
+        )
+        if cfg.continuous_batching:
+            self.scheduler = BatchScheduler(
+                self.model,
+                eos_token_ids=self._eos_token_ids(),
+                max_batch_size=cfg.max_batch_size,
+                kv_cache_budget_bytes=cfg.kv_cache_budget_mb * 2 ** 20,
+            )
+            self.scheduler.start()
+        if cfg.warmup_tokens:
+            self.state = "warming"
+            self._warmup()
+
+    def _load_draft_model(self, dtype):
+        from transformers import AutoModelForCausalLM
+
+        logger.info(f"Loading draft model: {cfg.draft_model_id}")
+        draft = AutoModelForCausalLM.from_pretrained(
+            cfg.draft_model_id, torch_dtype=dtype, device_map=self.model.device).eval()
+        if draft.config.vocab_size != self.model.config.vocab_size:
+            raise ValueError(f"Draft model {cfg.draft_model_id} does not share the "
+                             f"model's vocabulary")
+        return draft
+
+    def _warmup(self):
+        """One short greedy generation so kernels, allocators and compiled graphs are ready."""
+        from backend.services.scheduler import GenerationParams
+
+        start = time.perf_counter()
+        messages = [{"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": "Symptoms: fever and cough for 3 days"}]
+        self._generate(messages, GenerationParams(max_new_tokens=cfg.warmup_tokens,
+                                                  do_sample=False))
+        logger.info(f"Warm-up done in {time.perf_counter() - start:.2f}s")
+
+    def _on_cpu(self) -> bool:
+        import torch
+
+        return cfg.cpu_profile or (cfg.device in ("cpu", "auto") and not torch.cuda.is_available())
+
+    def _share_weights(self) -> bool:
+        if not (cfg.shared_weights or cfg.workers > 1):
+            return False
+        if not self._on_cpu():
+            # each process needs its own device copy anyway
+            logger.warning("Shared weights apply to CPU serving only; loading normally")
+            return False
+        return True
+
+    def count_tokens(self, text: str) -> int:
+        if not self._loaded:
+            return len(text) // 4 + 1          # rough estimate until a tokenizer exists
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def has_model(self, name: str) -> bool:
+        """Whether ``name`` is the base model id or an available adapter."""
+        return name == cfg.model_id or self.adapters.exists(name)
+
+    def forget_session(self, session_id: str):
+        self.session_kv.discard(session_id)
+
+    def shutdown(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+            self.scheduler = None
+
+    def _eos_token_ids(self) -> set[int]:
+        eos = self.model.generation_config.eos_token_id
+        ids = set(eos if isinstance(eos, list) else [eos] if eos is not None else [])
+        if self.tokenizer.eos_token_id is not None:
+            ids.add(self.tokenizer.eos_token_id)
+        return ids
 
     def analyze(
         self,
@@ -78,6 +249,12 @@ class InferenceService:
         patient_age: int | None = None,
         patient_sex: str | None = None,
         history: list[dict] | None = None,
+        on_text: Callable[[str], None] | None = None,
+        session_id: str | None = None,
+        deterministic: bool | None = None,
+        generation_mode: str | None = None,
+        sections: list[str] | None = None,
+        model: str | None = None,
     ) -> dict:
         """
         Run clinical analysis. Returns dict with:
@@ -85,9 +262,23 @@ class InferenceService:
           - reasoning: extracted chain-of-thought section
           - differentials: extracted differential diagnosis section
           - treatment: extracted treatment section
+          - cache: "hit" / "miss" in deterministic (greedy) mode, else "bypass"
+        If ``on_text`` is given it receives decoded text chunks as they are
+        generated (called from the generating thread).  With ``session_id``
+        the turn's KV cache is kept so the next turn only prefills new tokens.
+        ``generation_mode`` (default ``cfg.generation_mode``) selects speculative
+        decoding for greedy requests; the output is the same as standard mode.
+        ``sections`` restricts the response to those section keys: the prompt
+        asks for them only and generation stops once they are written.
+        ``model`` names a LoRA adapter to answer with (default: the base model).
         """
+        from backend.services.scheduler import GenerationParams
+
         if not self._loaded:
             self.load()
+        adapter = None if model in (None, cfg.model_id) else model
+        if adapter is not None and not self.adapters.exists(adapter):
+            raise ValueError(f"Unknown model {model!r}")
 
         # Build patient context string
         context_parts = []
@@ -97,6 +288,13 @@ class InferenceService:
             context_parts.append(f"Sex: {patient_sex}")
         context = ", ".join(context_parts)
         user_content = f"{context + chr(10) if context else ''}Symptoms: {symptoms}"
+        if sections:
+            unknown = set(sections) - set(HEADERS)
+            if unknown:
+                raise ValueError(f"Unknown sections: {sorted(unknown)}")
+            # in the user turn, so the cached system-prompt prefix still matches
+            wanted = [HEADERS[key] for key in HEADERS if key in sections]
+            user_content += f"\n\nRespond with only these sections, in order: {', '.join(wanted)}."
 
         # Build messages with optional multi-turn history
         messages = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -104,30 +302,286 @@ class InferenceService:
             messages.extend(history)
         messages.append({"role": "user", "content": user_content})
 
-        output = self.pipe(
-            messages,
+        sample = not (cfg.deterministic if deterministic is None else deterministic)
+        params = GenerationParams(
             max_new_tokens=cfg.max_new_tokens,
-            do_sample=True,
+            do_sample=sample,
             temperature=cfg.temperature,
             top_p=cfg.top_p,
         )
-        full_response: str = output[0]["generated_text"][-1]["content"]
-
-        return {
-            "full_response": full_response,
-            "reasoning": _extract(full_response, "Clinical Reasoning"),
-            "differentials": _extract(full_response, "Differential Diagnosis"),
-            "workup": _extract(full_response, "Recommended Workup"),
-            "treatment": _extract(full_response, "Treatment Plan"),
-            "red_flags": _extract(full_response, "Red Flags"),
-        }
-
-
-def _extract(text: str, section: str) -> str:
-    """Pull text between a section header and the next ## header."""
-    pattern = rf"##[^#]*{re.escape(section)}.*?\n(.*?)(?=\n##|$)"
-    m = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
-    return m.group(1).strip() if m else ""
+        if sample:
+            cache_status, key = "bypass", None
+        else:
+            key = make_key(messages, self._variant(adapter), {
+                "max_new_tokens": params.max_new_tokens,
+                "section_token_budgets": cfg.section_token_budgets,
+                "stop_at_disclaimer": cfg.stop_at_disclaimer,
+            })
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                if on_text:
+                    on_text(cached["full_response"])
+                ANALYSES.labels("hit").inc()
+                return {**cached, "cache": "hit"}
+            cache_status = "miss"
+
+        mode = generation_mode or cfg.generation_mode
+        with self.adapters.use(adapter):
+            full_response = self._generate(messages, params, session_id, on_text, mode, sections)
+        with STAGE_SECONDS.labels("sections").time():
+            result = {"full_response": full_response, **parse_sections(full_response)}
+        if key is not None:
+            self.response_cache.put(key, result)
+        ANALYSES.labels(cache_status).inc()
+        return {**result, "cache": cache_status}
+
+    def _generate(
+        self,
+        messages: list[dict],
+        params: GenerationParams,
+        session_id: str | None = None,
+        on_text: Callable[[str], None] | None = None,
+        mode: str = "standard",
+        sections: list[str] | None = None,
+    ) -> str:
+        """
+        Decode under a ``SectionController``.  When it redirects — a section
+        over budget or an unwanted header — generation restarts as a
+        continuation: the kept tokens plus the injected header, prefilled on
+        top of the KV cache the previous segment left behind.  Runs with the
+        adapter selected on this thread (``AdapterRegistry.use``); KV caches
+        are kept per adapter.
+        """
+        fingerprint = self._variant(active_adapter())
+        prompt_ids = self._prompt_ids(messages)
+        prefix = self._lookup_prefix(messages, prompt_ids, fingerprint)
+        retain = cfg.session_kv_cache and session_id is not None
+        if retain:
+            session_prefix = self.session_kv.get(session_id, fingerprint, prompt_ids)
+            if session_prefix is not None and len(session_prefix) > len(prefix or ()):
+                prefix = session_prefix
+
+        control = SectionController(sections, cfg.section_token_budgets, cfg.stop_at_disclaimer)
+        stream = _TokenStream(self.tokenizer, control, on_text)
+        want_kv = retain or control.subset or bool(cfg.section_token_budgets)
+        ids, generated, kv = list(prompt_ids), [], None
+        opening = control.opening()
+        if opening:
+            stream.emit(opening)
+            generated = self._encode_text(opening)
+            ids += generated
+        while len(generated) < params.max_new_tokens:
+            captured: list[KVPrefix] = []
+            out = self._decode(ids, replace(params, max_new_tokens=params.max_new_tokens -
+                                            len(generated)),
+                               mode, prefix, stream.on_token,
+                               captured.append if want_kv else None)
+            steer = stream.finish()
+            keep = out[:len(out) - steer.rewind]
+            ids += keep
+            generated += keep
+            kv = captured[0] if captured else None
+            if not steer.inject:
+                break
+            injected = self._encode_text(steer.inject)
+            prefix = kv.truncated(len(ids)) if kv is not None else None
+            ids += injected
+            generated += injected
+        if retain and kv is not None:
+            self.session_kv.put(session_id, fingerprint, kv.truncated(len(ids)))
+        return self.tokenizer.decode(generated, skip_special_tokens=True).strip()
+
+    def _decode(
+        self,
+        prompt_ids: list[int],
+        params: GenerationParams,
+        mode: str,
+        prefix: KVPrefix | None = None,
+        on_token: Callable[[int], bool] | None = None,
+        on_cache: Callable[[KVPrefix], None] | None = None,
+    ) -> list[int]:
+        """
+        Generated ids from the speculative decoder, the batch scheduler or
+        ``model.generate``.  Time to the first token is recorded as prefill,
+        the rest as decode.
+        """
+        start = time.perf_counter()
+        first: list[float] = []
+
+        def timed_token(token: int) -> bool:
+            if not first:
+                first.append(time.perf_counter())
+            return bool(on_token(token)) if on_token is not None else False
+
+        generated = self._run_decoder(prompt_ids, params, mode, prefix, timed_token, on_cache)
+        end = time.perf_counter()
+        PROMPT_TOKENS.inc(len(prompt_ids))
+        GENERATED_TOKENS.inc(len(generated))
+        if first:
+            STAGE_SECONDS.labels("prefill").observe(first[0] - start)
+            STAGE_SECONDS.labels("decode").observe(end - first[0])
+            record_decode(len(generated) - 1, end - first[0])
+        return generated
+
+    def _run_decoder(
+        self,
+        prompt_ids: list[int],
+        params: GenerationParams,
+        mode: str,
+        prefix: KVPrefix | None,
+        on_token: Callable[[int], bool],
+        on_cache: Callable[[KVPrefix], None] | None,
+    ) -> list[int]:
+        import torch
+        from transformers import StoppingCriteriaList
+        from backend.services.speculative import MODES
+
+        if mode in MODES and not params.do_sample:
+            # drafts are verified against the argmax, so only greedy requests qualify
+            return self.speculative.generate(
+                prompt_ids, params.max_new_tokens, mode, on_token, prefix, on_cache)
+        if self.scheduler is not None and not profiling_active():
+            # a profiled request decodes here, where the profilers can see it
+            return self.scheduler.generate(prompt_ids, params, on_token, prefix, on_cache,
+                                           adapter=active_adapter())
+
+        input_ids = torch.tensor([prompt_ids], device=self.model.device)
+        cache = make_cache(prefix.clone_layers() if prefix else [])
+        sampling = {"temperature": params.temperature, "top_p": params.top_p} \
+            if params.do_sample else {}
+        eos = self._eos_token_ids()
+        with torch.inference_mode():
+            output = self.model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=params.max_new_tokens,
+                do_sample=params.do_sample,
+                past_key_values=cache,
+                stopping_criteria=StoppingCriteriaList([_token_callback_class()(on_token, eos)]),
+                **sampling,
+            )
+        generated = output[0, len(prompt_ids):].tolist()
+        while generated and generated[-1] in eos:
+            generated.pop()
+        if on_cache:
+            layers = cache_layers(cache)
+            n = min(len(prompt_ids) + len(generated), layers[0][0].shape[2])
+            on_cache(KVPrefix((prompt_ids + generated)[:n],
+                              [(k[:, :, :n].clone(), v[:, :, :n].clone()) for k, v in layers]))
+        return generated
+
+    def _encode_text(self, text: str) -> list[int]:
+        with STAGE_SECONDS.labels("tokenize").time():
+            return self.tokenizer(text, add_special_tokens=False)["input_ids"]
+
+    def _prompt_ids(self, messages: list[dict], add_generation_prompt: bool = True) -> list[int]:
+        with STAGE_SECONDS.labels("template").time():
+            prompt = self.tokenizer.apply_chat_template(
+                messages, tokenize=False, add_generation_prompt=add_generation_prompt)
+        return self._encode_text(prompt)
+
+    def _variant(self, adapter: str | None) -> str:
+        """Fingerprint of the base model with ``adapter`` applied, for cache scoping."""
+        return self._fingerprint if adapter is None else f"{self._fingerprint}|lora:{adapter}"
+
+    def _lookup_prefix(
+        self, messages: list[dict], prompt_ids: list[int], fingerprint: str,
+    ) -> KVPrefix | None:
+        """
+        Cached KV for the system-prompt prefix of ``prompt_ids``.  On a miss —
+        the prompt or the chat template output changed — the current system
+        prefix is re-encoded once and cached in place of the stale one.
+        """
+        if not cfg.prefix_cache:
+            return None
+        prefix = self.prefix_cache.match(fingerprint, prompt_ids)
+        if prefix is None and messages and messages[0]["role"] == "system":
+            with self._prefix_lock:
+                prefix = self.prefix_cache.match(fingerprint, prompt_ids) \
+                    or self._encode_prefix(messages[:1], prompt_ids, fingerprint)
+        return prefix
+
+    def _encode_prefix(
+        self, messages: list[dict], prompt_ids: list[int] | None = None,
+        fingerprint: str | None = None,
+    ) -> KVPrefix | None:
+        ids = self._prompt_ids(messages, add_generation_prompt=False)
+        if prompt_ids is not None and not is_proper_prefix(ids, prompt_ids):
+            return None
+        import torch
+
+        with torch.inference_mode():
+            out = self.model(input_ids=torch.tensor([ids], device=self.model.device),
+                             use_cache=True)
+        prefix = KVPrefix(ids, cache_layers(out.past_key_values))
+        self.prefix_cache.put(fingerprint or self._fingerprint, prefix)
+        logger.info(f"Encoded prompt prefix: {len(ids)} tokens, {prefix.nbytes() // 1024} KiB")
+        return prefix
+
+
+class _TokenStream:
+    """
+    Decodes generated token ids incrementally and feeds the text through a
+    ``SectionController``.  ``on_token`` returns True once the controller
+    wants the current segment to end; ``finish`` hands over its decision.
+    """
+
+    def __init__(self, tokenizer, control: SectionController,
+                 on_text: Callable[[str], None] | None = None):
+        self.tokenizer = tokenizer
+        self.control = control
+        self.on_text = on_text
+        self._steer = Steer()
+        self._tokens: list[int] = []        # ids of the current line being decoded
+        self._printed = 0
+
+    def on_token(self, token: int) -> bool:
+        self._tokens.append(token)
+        text = self.tokenizer.decode(self._tokens, skip_special_tokens=True)
+        if text.endswith("\ufffd"):        # incomplete UTF-8 sequence, wait for more
+            delta = ""
+        else:
+            delta, self._printed = text[self._printed:], len(text)
+            if text.endswith("\n"):        # decode line by line to stay linear
+                self._tokens, self._printed = [], 0
+        steer = self.control.step(delta)
+        self.emit(steer.emit)
+        if steer.stop or steer.inject:
+            self._steer = steer
+            return True
+        return False
+
+    def emit(self, text: str):
+        if text and self.on_text:
+            self.on_text(text)
+
+    def finish(self) -> Steer:
+        """The decision that ended the segment (default: ran to EOS or the limit); resets state."""
+        steer, self._steer = self._steer, Steer()
+        self._tokens, self._printed = [], 0
+        return steer
+
+
+@lru_cache(maxsize=1)
+def _token_callback_class():
+    """Defined on first use so that importing this module does not import transformers."""
+    import torch
+    from transformers import StoppingCriteria
+
+    class _TokenCallback(StoppingCriteria):
+        """Feeds each new token of a single-sequence ``generate`` call to a stop callback."""
+
+        def __init__(self, on_token: Callable[[int], bool], eos_token_ids: set[int]):
+            self.on_token = on_token
+            self.eos_token_ids = eos_token_ids
+
+        def __call__(self, input_ids, scores, **kwargs):
+            token = int(input_ids[0, -1])
+            stop = token not in self.eos_token_ids and bool(self.on_token(token))
+            return torch.full((input_ids.shape[0],), stop, dtype=torch.bool,
+                              device=input_ids.device)
+
+    return _TokenCallback
 
 
 # Singleton
@@ -0,0 +1,220 @@
+"""
+Reusable KV-cache prefixes — encode a token prefix once, reuse it for every prompt that starts with it.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import torch
+
+
+@dataclass
+class KVPrefix:
+    token_ids: list[int]
+    layers: list[tuple[torch.Tensor, torch.Tensor]]     # per layer (key, value), batch of 1
+
+    def __len__(self) -> int:
+        return len(self.token_ids)
+
+    def nbytes(self) -> int:
+        return sum(k.nbytes + v.nbytes for k, v in self.layers)
+
+    def clone_layers(self) -> list[tuple[torch.Tensor, torch.Tensor]]:
+        """Copy-on-use: generation appends to the cache it is given."""
+        return [(k.clone(), v.clone()) for k, v in self.layers]
+
+    def truncated(self, n: int) -> KVPrefix:
+        if n >= len(self.token_ids):
+            return self
+        return KVPrefix(self.token_ids[:n], [(k[:, :, :n], v[:, :, :n]) for k, v in self.layers])
+
+
+def cache_layers(cache) -> list[tuple[torch.Tensor, torch.Tensor]]:
+    """Per-layer (key, value) tensors of a transformers cache object."""
+    if hasattr(cache, "layers"):                        # transformers >= 4.56
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    return list(zip(cache.key_cache, cache.value_cache))
+
+
+def make_cache(layers: list[tuple[torch.Tensor, torch.Tensor]]):
+    """Wrap per-layer (key, value) tensors in a DynamicCache."""
+    from transformers import DynamicCache
+
+    cache = DynamicCache()
+    for idx, (k, v) in enumerate(layers):
+        cache.update(k, v, idx)
+    return cache
+
+
+def common_prefix_len(a: list[int], b: list[int]) -> int:
+    n = min(len(a), len(b))
+    if a[:n] == b[:n]:
+        return n
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def is_proper_prefix(prefix: list[int], ids: list[int]) -> bool:
+    """True if ``prefix`` starts ``ids`` and leaves at least one token to prefill."""
+    return len(prefix) < len(ids) and ids[:len(prefix)] == prefix
+
+
+class PrefixCache:
+    """
+    Small LRU of encoded prefixes, scoped to a model fingerprint.  Prompt or
+    template changes invalidate themselves — a stale entry simply stops being
+    a token prefix of incoming prompts; a model change must call ``reset``.
+    Variants of the model (``"<fingerprint>|..."``, e.g. with a LoRA adapter)
+    share the cache, each matching only its own entries.
+    """
+
+    def __init__(self, max_entries: int = 4):
+        self.max_entries = max_entries
+        self.fingerprint: str | None = None
+        self._entries: OrderedDict[tuple[str, tuple[int, ...]], KVPrefix] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def reset(self, fingerprint: str):
+        with self._lock:
+            self.fingerprint = fingerprint
+            self._entries.clear()
+
+    def put(self, fingerprint: str, prefix: KVPrefix):
+        with self._lock:
+            if not self._in_scope(fingerprint):
+                return
+            key = (fingerprint, tuple(prefix.token_ids))
+            self._entries[key] = prefix
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def match(self, fingerprint: str, prompt_ids: list[int]) -> KVPrefix | None:
+        """Longest cached prefix of ``prompt_ids``, or None."""
+        with self._lock:
+            best = None
+            if self._in_scope(fingerprint):
+                for (variant, _), entry in self._entries.items():
+                    if variant == fingerprint and (best is None or len(entry) > len(best)) \
+                            and is_proper_prefix(entry.token_ids, prompt_ids):
+                        best = entry
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end((fingerprint, tuple(best.token_ids)))
+            return best
+
+    def _in_scope(self, fingerprint: str) -> bool:
+        return self.fingerprint is not None and (
+            fingerprint == self.fingerprint or fingerprint.startswith(self.fingerprint + "|"))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(e.nbytes() for e in self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+@dataclass
+class _SessionEntry:
+    fingerprint: str
+    prefix: KVPrefix
+    nbytes: int
+    last_used: float
+
+
+class SessionKVCache:
+    """
+    KV cache retained per session between turns, so a follow-up only prefills
+    the tokens that differ from what the session already encoded.  Entries are
+    evicted least-recently-used to stay under ``budget_bytes`` and dropped once
+    idle for ``ttl_seconds``; an evicted session simply re-prefills in full.
+    """
+
+    def __init__(self, budget_bytes: int, ttl_seconds: float):
+        self.budget_bytes = budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, _SessionEntry] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, session_id: str, fingerprint: str, prompt_ids: list[int]) -> KVPrefix | None:
+        """The retained KV truncated to its longest common prefix with ``prompt_ids``."""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(session_id)
+            n = 0
+            if entry is not None and entry.fingerprint == fingerprint:
+                n = min(common_prefix_len(entry.prefix.token_ids, prompt_ids),
+                        len(prompt_ids) - 1)
+            if n <= 0:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(session_id)
+            return entry.prefix.truncated(n)
+
+    def put(self, session_id: str, fingerprint: str, prefix: KVPrefix):
+        nbytes = prefix.nbytes()
+        with self._lock:
+            self._drop(session_id)
+            if nbytes > self.budget_bytes:
+                return
+            self._entries[session_id] = _SessionEntry(
+                fingerprint, prefix, nbytes, time.monotonic())
+            self._bytes += nbytes
+            self._expire(time.monotonic())
+            while self._bytes > self.budget_bytes:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def discard(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "bytes": self._bytes,
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    def _drop(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+    def _expire(self, now: float):
+        # entries are in LRU order, so idle ones sit at the front
+        while self._entries:
+            session_id, entry = next(iter(self._entries.items()))
+            if now - entry.last_used <= self.ttl_seconds:
+                break
+            self._drop(session_id)
+            self.evictions += 1
@@ -0,0 +1,123 @@
+"""
+LoRA layers — per-row low-rank updates over a shared base linear layer.
+
+A target layer is wrapped once in ``LoRALinear``; each resident adapter adds
+its (A, B, scale) under its name.  The forward adds ``scale · B(A x)`` for the
+rows whose adapter holds weights there, so one batched forward serves base
+and adapter rows together, and the base weights are never modified.
+"""
+from __future__ import annotations
+
+import json
+import re
+from pathlib import Path
+
+import torch
+from torch import nn
+from torch.nn import functional as F
+from backend.services.adapters import CONFIG_FILE, active_rows
+
+WEIGHTS_FILE = "adapter_model.safetensors"
+
+# base_model.model.<module>.lora_A[.<adapter>].weight, as written by PEFT
+_KEY = re.compile(r"^(?:base_model\.model\.)?(?P<module>.+)\.lora_(?P<ab>[AB])(?:\.[^.]+)?\.weight$")
+
+
+class LoRALinear(nn.Module):
+    """``base(x)`` plus, row by row, the update of the adapter selected for that row."""
+
+    def __init__(self, base: nn.Module):
+        super().__init__()
+        self.base = base
+        self.loras: dict[str, tuple[torch.Tensor, torch.Tensor, float]] = {}
+
+    @property
+    def weight(self):
+        return self.base.weight
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        out = self.base(x)
+        rows = active_rows()
+        if rows is None or not self.loras:
+            return out
+        if isinstance(rows, str):
+            lora = self.loras.get(rows)
+            return out if lora is None else out + _delta(x, lora)
+        for name in set(rows):
+            lora = self.loras.get(name) if name is not None else None
+            if lora is None:
+                continue
+            idx = torch.tensor([i for i, r in enumerate(rows) if r == name], device=x.device)
+            out = out.index_add(0, idx, _delta(x.index_select(0, idx), lora))
+        return out
+
+
+def _delta(x: torch.Tensor, lora: tuple[torch.Tensor, torch.Tensor, float]) -> torch.Tensor:
+    a, b, scale = lora
+    return F.linear(F.linear(x.to(a.dtype), a), b) * scale
+
+
+def load_adapter(model: nn.Module, name: str, directory: str | Path) -> tuple[int, list[LoRALinear]]:
+    """
+    Add a PEFT LoRA adapter to ``model`` under ``name``; returns its size in
+    bytes and the layers now holding it.  Only plain LoRA on linear layers is
+    supported — no ``modules_to_save``, DoRA or added tokens.
+    """
+    from safetensors.torch import load_file
+
+    directory = Path(directory)
+    config = json.loads((directory / CONFIG_FILE).read_text())
+    r = config["r"]
+    alpha = config.get("lora_alpha", r)
+    scale = alpha / (r ** 0.5 if config.get("use_rslora") else r)
+
+    pairs: dict[str, dict[str, torch.Tensor]] = {}
+    for key, tensor in load_file(directory / WEIGHTS_FILE).items():
+        match = _KEY.match(key)
+        if match is None:
+            raise ValueError(f"Adapter {name}: unsupported tensor {key}")
+        pairs.setdefault(match["module"], {})[match["ab"]] = tensor
+
+    # validate and move every pair before touching the model, so a bad file changes nothing
+    reference = model.get_input_embeddings().weight
+    weights: dict[str, tuple[torch.Tensor, torch.Tensor]] = {}
+    for path, ab in pairs.items():
+        if set(ab) != {"A", "B"}:
+            raise ValueError(f"Adapter {name}: {path} lacks lora_A or lora_B")
+        try:
+            module = model.get_submodule(path)
+        except AttributeError:
+            raise ValueError(f"Adapter {name}: the model has no module {path}") from None
+        linear = module.base if isinstance(module, LoRALinear) else module
+        if not isinstance(linear, nn.Linear):
+            raise ValueError(f"Adapter {name}: {path} is not a linear layer")
+        expected = {"A": (r, linear.in_features), "B": (linear.out_features, r)}
+        for ab_name, shape in expected.items():
+            if tuple(ab[ab_name].shape) != shape:
+                raise ValueError(f"Adapter {name}: {path} lora_{ab_name} has shape "
+                                 f"{tuple(ab[ab_name].shape)}, expected {shape}")
+        weights[path] = (ab["A"].to(reference.device, reference.dtype),
+                         ab["B"].to(reference.device, reference.dtype))
+
+    layers, nbytes = [], 0
+    for path, (a, b) in weights.items():
+        layer = _wrap(model, path)
+        layer.loras[name] = (a, b, scale)
+        layers.append(layer)
+        nbytes += a.nbytes + b.nbytes
+    return nbytes, layers
+
+
+def unload_adapter(layers: list[LoRALinear], name: str):
+    for layer in layers:
+        layer.loras.pop(name, None)
+
+
+def _wrap(model: nn.Module, path: str) -> LoRALinear:
+    module = model.get_submodule(path)
+    if isinstance(module, LoRALinear):
+        return module
+    parent_path, _, attr = path.rpartition(".")
+    wrapped = LoRALinear(module)
+    setattr(model.get_submodule(parent_path) if parent_path else model, attr, wrapped)
+    return wrapped
@@ -0,0 +1,273 @@
+"""
+Prometheus metrics — counters, gauges and histograms served as text exposition format.
+
+Deliberately tiny instead of a client library: an observation is a bisect
+and two additions under an uncontended lock, cheap enough for the request
+path.  Gauges may be backed by a callback, evaluated only at scrape time.
+Each worker process keeps and serves its own values.
+"""
+from __future__ import annotations
+
+import bisect
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Seconds; spans a tokenizer call (~100 µs) up to a long CPU generation
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not labelnames:
+            self._children[()] = self._new_child()
+
+    def labels(self, *values: str):
+        """Child for one label combination; created on first use and cached."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(list(self._children.items())):   # list(): atomic copy
+            lines.extend(self._samples(values, child))
+        return lines
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self, values: tuple[str, ...], child) -> list[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0):
+        self._children[()].inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _samples(self, values, child) -> list[str]:
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class _GaugeChild:
+    __slots__ = ("value", "fn")
+
+    def __init__(self):
+        self.value = 0.0
+        self.fn: Callable[[], float | None] | None = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, fn: Callable[[], float | None]):
+        """Read the value from ``fn`` at scrape time; None omits the sample."""
+        self.fn = fn
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float):
+        self._children[()].set(value)
+
+    def set_function(self, fn: Callable[[], float | None]):
+        self._children[()].set_function(fn)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _samples(self, values, child) -> list[str]:
+        value = child.value
+        if child.fn is not None:
+            try:
+                value = child.fn()
+            except Exception:           # a failing source must not break the scrape
+                value = None
+        if value is None:
+            return []
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(value)}"]
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)     # last slot: above the largest bound
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, values, child) -> list[str]:
+        with child._lock:
+            counts, total = list(child.counts), child.sum
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {cumulative}")
+        labels = _labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_number(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                  buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes() -> float:
+    """Current resident set size; peak RSS where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Singleton
+registry = Registry()
+
+# ── application metrics ───────────────────────────────────────────────────────
+STAGE_SECONDS = registry.histogram(
+    "nemesis_stage_seconds",
+    "Latency of request stages: template, tokenize, prefill (to first token, including "
+    "any wait for a batch slot), decode, sections, pdf_render",
+    ("stage",))
+SESSION_STORE_SECONDS = registry.histogram(
+    "nemesis_session_store_seconds", "Session store operation latency", ("op",))
+PROMPT_TOKENS = registry.counter(
+    "nemesis_prompt_tokens_total", "Prompt tokens per decode call (cached prefixes included)")
+GENERATED_TOKENS = registry.counter(
+    "nemesis_generated_tokens_total", "Tokens generated")
+ANALYSES = registry.counter(
+    "nemesis_analyses_total", "Analyses served, by response-cache outcome", ("cache",))
+DECODE_TOKENS_PER_SECOND = registry.gauge(
+    "nemesis_decode_tokens_per_second",
+    "Decode throughput of recent requests (moving average of per-request tokens/s)")
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "nemesis_requests_in_flight", "Inference calls running on the executor")
+REQUESTS_QUEUED = registry.gauge(
+    "nemesis_requests_queued", "Inference calls waiting for an executor slot")
+ACTIVE_SESSIONS = registry.gauge(
+    "nemesis_active_sessions", "Live sessions in the session store")
+SESSION_BYTES = registry.gauge(
+    "nemesis_session_bytes", "Memory held by in-process session turns (memory store only)")
+PROCESS_RSS = registry.gauge(
+    "process_resident_memory_bytes", "Resident memory size in bytes")
+PROCESS_RSS.set_function(process_rss_bytes)
+
+_ema_lock = threading.Lock()
+
+
+def record_decode(generated: int, seconds: float):
+    """Fold one request's decode rate into the tokens/s moving average."""
+    if generated <= 0 or seconds <= 0:
+        return
+    rate = generated / seconds
+    gauge = DECODE_TOKENS_PER_SECOND.labels()
+    with _ema_lock:
+        gauge.set(rate if not gauge.value else 0.8 * gauge.value + 0.2 * rate)
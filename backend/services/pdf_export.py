@@ -1,19 +1,25 @@
 """
 PDF export service — generates a professional clinical report.
+
+Styles are built once per process and each turn's flowables are cached by
+content, so re-exporting a growing session only compiles the new turns.
 """
 from __future__ import annotations
+import copy
 import io
 from datetime import datetime
+from functools import lru_cache
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.lib import colors
 from reportlab.platypus import (
-    SimpleDocTemplate, Paragraph, Spacer, HRFlowable,
-    Table, TableStyle, KeepTogether,
+    Flowable, SimpleDocTemplate, Paragraph, Spacer, HRFlowable,
+    Table, TableStyle,
 )
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.enums import TA_CENTER
 from backend.core.config import get_settings
+from backend.services.pdf_markdown import MarkdownCompiler, inline
 
 cfg = get_settings()
 
@@ -49,6 +55,12 @@ def build_styles():
         "red_flag", fontName="Helvetica-Bold", fontSize=10,
         textColor=RED_FLAG, leading=15, spaceAfter=4,
     )
+    styles["bullet"] = ParagraphStyle(
+        "bullet", parent=styles["body"], leftIndent=14, bulletIndent=4, spaceAfter=2,
+    )
+    styles["red_bullet"] = ParagraphStyle(
+        "red_bullet", parent=styles["red_flag"], leftIndent=14, bulletIndent=4, spaceAfter=2,
+    )
     styles["disclaimer"] = ParagraphStyle(
         "disclaimer", fontName="Helvetica-Oblique", fontSize=8,
         textColor=MUTED, leading=12, alignment=TA_CENTER,
@@ -56,6 +68,35 @@ def build_styles():
     return styles
 
 
+STYLES = build_styles()
+_compiler = MarkdownCompiler(STYLES)
+TURN_HEADERS = {
+    "user": "🧑 Patient / Clinician Query",
+    "assistant": "🤖 LlamaTron Analysis",
+}
+
+
+@lru_cache(maxsize=cfg.pdf_turn_cache_size)
+def compiled_turn(role: str, content: str, timestamp: str = "") -> tuple[Flowable, ...]:
+    """One turn compiled to flowables, cached by its content; use ``turn_flowables`` to build."""
+    if role not in TURN_HEADERS:
+        return ()
+    story: list[Flowable] = [Paragraph(TURN_HEADERS[role], STYLES["section_header"])]
+    if role == "user" and timestamp:
+        story.append(Paragraph(inline(timestamp), STYLES["disclaimer"]))
+    story.extend(_compiler.compile(content))
+    return tuple(story)
+
+
+def turn_flowables(role: str, content: str, timestamp: str = "") -> list[Flowable]:
+    """
+    Shallow copies of the cached flowables: layout stores wrap and split
+    state on each flowable, so a document must not reuse another's objects,
+    but the parsed paragraph fragments are shared.
+    """
+    return [copy.copy(f) for f in compiled_turn(role, content, timestamp)]
+
+
 def export_session_pdf(
     session_history: list[dict],
     patient_info: dict | None = None,
@@ -70,12 +111,11 @@ def export_session_pdf(
         leftMargin=2*cm, rightMargin=2*cm,
         topMargin=2.5*cm, bottomMargin=2*cm,
     )
-    styles = build_styles()
     story = []
 
     # ── Header ───────────────────────────────────────────────────────────────
-    story.append(Paragraph("LlamaTron RS1 Nemesis", styles["title"]))
-    story.append(Paragraph("Clinical Decision Support — Session Report", styles["subtitle"]))
+    story.append(Paragraph("LlamaTron RS1 Nemesis", STYLES["title"]))
+    story.append(Paragraph("Clinical Decision Support — Session Report", STYLES["subtitle"]))
     story.append(Spacer(1, 0.3*cm))
     story.append(HRFlowable(width="100%", thickness=2, color=TEAL))
     story.append(Spacer(1, 0.4*cm))
@@ -105,32 +145,8 @@ def export_session_pdf(
 
     # ── Conversation turns ────────────────────────────────────────────────────
     for i, turn in enumerate(session_history):
-        role = turn.get("role", "")
-        content = turn.get("content", "")
-        ts = turn.get("timestamp", "")
-
-        if role == "user":
-            story.append(Paragraph(f"🧑 Patient / Clinician Query", styles["section_header"]))
-            if ts:
-                story.append(Paragraph(ts, styles["disclaimer"]))
-            story.append(Paragraph(content.replace("\n", "<br/>"), styles["body"]))
-
-        elif role == "assistant":
-            story.append(Paragraph(f"🤖 LlamaTron Analysis", styles["section_header"]))
-            # Render markdown-style bold headers inside content
-            lines = content.split("\n")
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    story.append(Spacer(1, 0.15*cm))
-                    continue
-                if line.startswith("## "):
-                    story.append(Paragraph(line[3:], styles["section_header"]))
-                elif "Red Flag" in line or "⚠️" in line:
-                    story.append(Paragraph(line, styles["red_flag"]))
-                else:
-                    story.append(Paragraph(line, styles["body"]))
-
+        story.extend(turn_flowables(turn.get("role", ""), turn.get("content", ""),
+                                    turn.get("timestamp", "")))
         story.append(Spacer(1, 0.2*cm))
         if i < len(session_history) - 1:
             story.append(HRFlowable(width="100%", thickness=0.5,
@@ -146,7 +162,7 @@ def export_session_pdf(
         "and educational purposes only. It is NOT a substitute for professional "
         "medical advice, diagnosis, or treatment. Always consult a qualified "
         "healthcare provider for clinical decisions.",
-        styles["disclaimer"],
+        STYLES["disclaimer"],
     ))
 
     doc.build(story)
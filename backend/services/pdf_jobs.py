@@ -0,0 +1,211 @@
+"""
+PDF rendering off the event loop — a process pool for ReportLab, plus disk-backed export jobs.
+
+Small sessions are rendered in the pool and awaited by the request.  Large
+ones become jobs: the worker process writes ``<job_id>.pdf`` next to a
+``<job_id>.json`` status file, so any API worker can answer a poll or a
+download, whichever process started the render.  Bulk exports render many
+sessions through the same pool and stream them out as one ZIP.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterable, AsyncIterator
+from backend.core.config import get_settings
+from backend.core.logger import logger
+from backend.services.metrics import STAGE_SECONDS
+from backend.services.pdf_export import export_session_pdf
+
+cfg = get_settings()
+
+
+def _render_to_file(history: list[dict], patient_info: dict | None, path: str) -> int:
+    """Runs in a pool process: render and write atomically, returning the size in bytes."""
+    pdf = export_session_pdf(history, patient_info)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(pdf)
+    os.replace(tmp, path)
+    return len(pdf)
+
+
+class PdfRenderer:
+    """
+    Owns the render pool.  Workers are spawned rather than forked so they
+    never inherit the model or the inference threads, and are started on the
+    first export.  Finished and failed jobs are pruned after ``ttl_s``.
+    """
+
+    def __init__(self, workers: int, jobs_dir: str, ttl_s: int):
+        self.workers = workers
+        self.jobs_dir = Path(jobs_dir)
+        self.ttl_s = ttl_s
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    # ── synchronous fast path ────────────────────────────────────────────────
+    async def render(self, history: list[dict], patient_info: dict | None = None) -> bytes:
+        """Render in the pool and wait for the bytes without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        with STAGE_SECONDS.labels("pdf_render").time():
+            return await loop.run_in_executor(self._executor(), export_session_pdf,
+                                              history, patient_info)
+
+    async def render_many(
+        self, sources: AsyncIterable[tuple[str, list[dict], dict | None]],
+    ) -> AsyncIterator[tuple[str, bytes | None, str | None]]:
+        """
+        Render ``(name, history, patient_info)`` sources with at most two per
+        worker in flight, yielding ``(name, pdf, error)`` in completion order.
+        ``sources`` is consumed lazily, so histories are loaded as slots free up.
+        """
+        loop = asyncio.get_running_loop()
+        sources = sources.__aiter__()
+        window = 2 * self.workers
+        pending: dict[asyncio.Future, tuple[str, float]] = {}
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                while not exhausted and len(pending) < window:
+                    try:
+                        source = await sources.__anext__()
+                    except StopAsyncIteration:
+                        exhausted = True
+                        break
+                    name, history, patient_info = source
+                    future = loop.run_in_executor(self._executor(), export_session_pdf,
+                                                  history, patient_info)
+                    pending[future] = name, time.perf_counter()
+                if not pending:
+                    break
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    name, start = pending.pop(future)
+                    STAGE_SECONDS.labels("pdf_render").observe(time.perf_counter() - start)
+                    if future.exception() is not None:
+                        yield name, None, str(future.exception())
+                    else:
+                        yield name, future.result(), None
+        finally:
+            for future in pending:          # client went away: drop renders not yet started
+                future.cancel()
+
+    # ── jobs ─────────────────────────────────────────────────────────────────
+    def submit(self, history: list[dict], patient_info: dict | None = None,
+               session_id: str = "") -> dict:
+        """Queue a render and return the job's initial status."""
+        self.prune()
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        job_id = uuid.uuid4().hex[:16]
+        status = {"job_id": job_id, "session_id": session_id, "status": "pending",
+                  "turns": len(history), "created": time.time(), "finished": None,
+                  "bytes": None, "error": None}
+        self._save(status)
+        future = self._executor().submit(_render_to_file, history, patient_info,
+                                         str(self.pdf_path(job_id)))
+        future.add_done_callback(lambda f: self._finished(status, f))
+        return status
+
+    def status(self, job_id: str) -> dict | None:
+        path = self.jobs_dir / f"{job_id}.json"
+        if not job_id.isalnum() or not path.exists():
+            return None
+        return json.loads(path.read_text())
+
+    def pdf_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.pdf"
+
+    def prune(self):
+        """Delete jobs that finished more than ``ttl_s`` ago, and their PDFs."""
+        if not self.jobs_dir.exists():
+            return
+        cutoff = time.time() - self.ttl_s
+        for path in self.jobs_dir.glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    self.pdf_path(path.stem).unlink(missing_ok=True)
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:       # pruned by another worker
+                pass
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    # ── internals ────────────────────────────────────────────────────────────
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _finished(self, status: dict, future: Future):
+        status["finished"] = time.time()
+        if future.cancelled():
+            status["status"], status["error"] = "failed", "cancelled at shutdown"
+        elif future.exception() is not None:
+            status["status"], status["error"] = "failed", str(future.exception())
+            logger.error(f"PDF job {status['job_id']} failed: {future.exception()}")
+        else:
+            status["status"], status["bytes"] = "done", future.result()
+            STAGE_SECONDS.labels("pdf_render").observe(status["finished"] - status["created"])
+            logger.info(f"PDF job {status['job_id']} done — {status['bytes']} bytes, "
+                        f"{status['finished'] - status['created']:.2f}s")
+        self._save(status)
+
+    def _save(self, status: dict):
+        path = self.jobs_dir / f"{status['job_id']}.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(status))
+        os.replace(tmp, path)
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, unseekable sink; ``zipfile`` then streams entries with data descriptors."""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def take(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+async def stream_zip(entries: AsyncIterator[tuple[str, bytes]]) -> AsyncIterator[bytes]:
+    """
+    Zip ``(name, data)`` entries as they arrive, yielding archive bytes after
+    each one.  Entries are stored, not deflated: PDFs are compressed already.
+    """
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+        async for name, data in entries:
+            info = zipfile.ZipInfo(name, datetime.utcnow().timetuple()[:6])
+            archive.writestr(info, data)
+            yield sink.take()
+    yield sink.take()
+
+
+# Singleton
+pdf_renderer = PdfRenderer(cfg.pdf_workers, cfg.pdf_jobs_dir, cfg.pdf_job_ttl_s)
@@ -0,0 +1,94 @@
+"""
+Markdown → ReportLab flowables for the model's responses.
+
+Handles the subset the model writes: ``#`` headers, ``-``/``*``/numbered
+list items, ``---`` rules, ``**bold**``, ``*italic*`` and ``code`` spans.
+Text is XML-escaped before markup is added, so ``<``/``&`` in clinical text
+cannot break the paragraph parser.  Consecutive plain lines become one
+paragraph (line breaks kept) instead of one flowable per line.
+"""
+from __future__ import annotations
+
+import re
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import Flowable, HRFlowable, Paragraph, Spacer
+from backend.services.sections import section_key
+
+_HEADER = re.compile(r"^#{1,6}\s+(.*)$")
+_BULLET = re.compile(r"^(?:[-*•]|(\d+)[.)])\s+(.*)$")
+_RULE = re.compile(r"^(?:-{3,}|\*{3,}|_{3,})$")
+_INLINE = [
+    (re.compile(r"`([^`]+)`"), r'<font face="Courier">\1</font>'),
+    (re.compile(r"\*\*(.+?)\*\*|__(.+?)__"), lambda m: f"<b>{m.group(1) or m.group(2)}</b>"),
+    (re.compile(r"(?<![\w*])\*(?!\s)(.+?)(?<!\s)\*(?![\w*])"), r"<i>\1</i>"),
+]
+_WARNING = "⚠️"
+
+
+def inline(text: str) -> str:
+    """Escape ``text`` and turn inline markdown into ReportLab paragraph markup."""
+    text = escape(text)
+    for pattern, repl in _INLINE:
+        text = pattern.sub(repl, text)
+    return text
+
+
+class MarkdownCompiler:
+    """
+    Compiles markdown with a fixed style sheet.  Needs ``section_header``,
+    ``body``, ``bullet``, ``red_flag`` and ``red_bullet`` styles; text under a
+    Red Flags header, and any line carrying ⚠️, is set in the red styles.
+    """
+
+    def __init__(self, styles: dict[str, ParagraphStyle]):
+        self.styles = styles
+
+    def compile(self, text: str) -> list[Flowable]:
+        story: list[Flowable] = []
+        lines: list[str] = []           # plain lines of the paragraph being built
+        alarm = False                   # inside the Red Flags section
+
+        def flush():
+            if lines:
+                style = self.styles["red_flag" if alarm else "body"]
+                story.append(Paragraph("<br/>".join(lines), style))
+                lines.clear()
+
+        for raw in text.split("\n"):
+            line = raw.strip()
+            if not line:
+                flush()
+                if story and not isinstance(story[-1], Spacer):
+                    story.append(Spacer(1, 0.15*cm))
+                continue
+            header = _HEADER.match(line)
+            if header:
+                flush()
+                alarm = section_key(line) == "red_flags"
+                story.append(Paragraph(inline(header.group(1)), self.styles["section_header"]))
+                continue
+            if _RULE.match(line):
+                flush()
+                story.append(HRFlowable(width="100%", thickness=0.5,
+                                        color=colors.HexColor("#E2E8F0")))
+                continue
+            bullet = _BULLET.match(line)
+            if bullet:
+                flush()
+                number, item = bullet.groups()
+                red = alarm or _WARNING in line
+                story.append(Paragraph(
+                    inline(item), self.styles["red_bullet" if red else "bullet"],
+                    bulletText=f"{number}." if number else "•"))
+                continue
+            if _WARNING in line and not alarm:
+                flush()
+                story.append(Paragraph(inline(line), self.styles["red_flag"]))
+                continue
+            lines.append(inline(line))
+        flush()
+        return story
@@ -0,0 +1,177 @@
+"""
+Opt-in request profiling — cProfile for the Python side, the torch profiler for model forwards.
+
+Only active when PROFILING_ENABLED is set, and then only for requests that
+ask for it (the PROFILE_HEADER) or are sampled at PROFILE_SAMPLE_RATE.  A
+profiled request decodes on its own thread instead of joining the batch, so
+both profilers see the whole request and nothing of anyone else's.  Each
+profile leaves ``<request_id>.pstats``, ``<request_id>.txt`` (top functions
+by cumulative time) and ``<request_id>.trace.json`` (Chrome trace, open in
+Perfetto or chrome://tracing) in PROFILE_DIR.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import pstats
+import random
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Callable
+from backend.core.config import get_settings
+from backend.core.logger import logger
+
+cfg = get_settings()
+
+ARTEFACTS = {
+    "pstats": ".pstats",
+    "summary": ".txt",
+    "trace": ".trace.json",
+}
+
+_active = threading.local()
+
+
+def profiling_active() -> bool:
+    """True on a thread that is running a profiled request."""
+    return getattr(_active, "on", False)
+
+
+class RequestProfiler:
+    """
+    Runs one call under both profilers and writes its artefacts.  The torch
+    profiler is process-wide, so one request is profiled at a time; a request
+    asking while another is profiled runs unprofiled.  ``claim`` takes the
+    slot before the response starts, so only a request that will really be
+    profiled is told its id.
+    """
+
+    def __init__(self, enabled: bool, directory: str, sample_rate: float = 0.0,
+                 torch_trace: bool = True, keep: int = 200):
+        self.enabled = enabled
+        self.directory = Path(directory)
+        self.sample_rate = sample_rate
+        self.torch_trace = torch_trace
+        self.keep = keep
+        self._claimed: str | None = None        # the request holding the profilers
+        self._guard = threading.Lock()
+
+    def authorized(self, header_value: str | None) -> bool:
+        """Profiling is on and the profile-header value passes PROFILE_TOKEN, if one is set."""
+        return self.enabled and (not cfg.profile_token or header_value == cfg.profile_token)
+
+    def wants(self, header_value: str | None) -> bool:
+        """Whether a request with this profile-header value should be profiled."""
+        if not self.enabled:
+            return False
+        if header_value is not None and self.authorized(header_value):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def new_id(self) -> str:
+        return uuid.uuid4().hex[:16]
+
+    def claim(self, header_value: str | None) -> str | None:
+        """
+        A fresh request id holding the profilers if this request is to be
+        profiled and no other is, else None.  ``run`` or ``release`` frees it.
+        """
+        if not self.wants(header_value):
+            return None
+        request_id = self.new_id()
+        if not self._claim(request_id):
+            logger.warning("Profile skipped: another request is being profiled")
+            return None
+        return request_id
+
+    def release(self, request_id: str | None):
+        """Free the profilers if ``request_id`` still holds them; safe to repeat."""
+        with self._guard:
+            if request_id is not None and self._claimed == request_id:
+                self._claimed = None
+
+    def run(self, request_id: str, fn: Callable, *args, **kwargs):
+        """Call ``fn`` under the profilers on the current thread and save the results."""
+        if not self._claim(request_id):
+            logger.warning(f"Profile {request_id} skipped: another request is being profiled")
+            return fn(*args, **kwargs)
+        try:
+            return self._run(request_id, fn, args, kwargs)
+        finally:
+            self.release(request_id)
+
+    def artefacts(self, request_id: str) -> dict[str, Path]:
+        if not request_id.isalnum():
+            return {}
+        paths = {kind: self.directory / f"{request_id}{suffix}"
+                 for kind, suffix in ARTEFACTS.items()}
+        return {kind: path for kind, path in paths.items() if path.exists()}
+
+    # ── internals ────────────────────────────────────────────────────────────
+    def _claim(self, request_id: str) -> bool:
+        with self._guard:
+            if self._claimed not in (None, request_id):
+                return False
+            self._claimed = request_id
+            return True
+
+    def _run(self, request_id: str, fn: Callable, args: tuple, kwargs: dict):
+        torch_prof = self._torch_profiler()
+        cpu = cProfile.Profile()
+        start = time.perf_counter()
+        _active.on = True
+        if torch_prof is not None:
+            torch_prof.__enter__()
+        cpu.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            cpu.disable()
+            if torch_prof is not None:
+                torch_prof.__exit__(None, None, None)
+            _active.on = False
+            elapsed = time.perf_counter() - start
+            try:
+                self._save(request_id, cpu, torch_prof, elapsed)
+            except Exception as e:      # never fail the request over its profile
+                logger.error(f"Saving profile {request_id} failed: {e}")
+
+    def _torch_profiler(self):
+        if not self.torch_trace:
+            return None
+        try:
+            from torch.profiler import ProfilerActivity, profile
+        except ImportError:
+            return None
+        return profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+
+    def _save(self, request_id: str, cpu: cProfile.Profile, torch_prof, elapsed: float):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        base = self.directory / request_id
+        cpu.dump_stats(f"{base}.pstats")
+        summary = io.StringIO()
+        summary.write(f"request {request_id}: {elapsed:.3f}s wall\n\n")
+        pstats.Stats(cpu, stream=summary).sort_stats("cumulative").print_stats(40)
+        if torch_prof is not None:
+            torch_prof.export_chrome_trace(f"{base}.trace.json")
+            summary.write("\ntorch operators by self CPU time\n")
+            summary.write(torch_prof.key_averages().table(sort_by="self_cpu_time_total",
+                                                          row_limit=25))
+        Path(f"{base}.txt").write_text(summary.getvalue())
+        logger.info(f"Profile {request_id} saved ({elapsed:.3f}s) in {self.directory}")
+        self._prune()
+
+    def _prune(self):
+        """Keep the newest ``keep`` profiles."""
+        profiles = sorted(self.directory.glob("*.pstats"), key=lambda p: p.stat().st_mtime)
+        for old in profiles[:max(0, len(profiles) - self.keep)]:
+            request_id = old.name.removesuffix(".pstats")
+            for suffix in ARTEFACTS.values():
+                (self.directory / f"{request_id}{suffix}").unlink(missing_ok=True)
+
+
+# Singleton
+request_profiler = RequestProfiler(cfg.profiling_enabled, cfg.profile_dir,
+                                   cfg.profile_sample_rate, cfg.profile_torch, cfg.profile_keep)
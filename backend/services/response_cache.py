@@ -0,0 +1,88 @@
+"""
+Exact-match response cache for deterministic (greedy) generation.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_key(messages: list[dict], model: str, params: dict) -> str:
+    """Hash of the whitespace-normalised conversation, model and generation params."""
+    normalised = [[m["role"], " ".join(m["content"].split())] for m in messages]
+    blob = json.dumps([normalised, model, params], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    In-memory LRU with TTL, optionally backed by a SQLite file so cached
+    responses survive restarts.  Disk hits are promoted to memory.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, path: str = ""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, created REAL, value TEXT)")
+            self._db.execute("DELETE FROM responses WHERE created < ?",
+                             (time.time() - ttl_seconds,))
+            self._db.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None and now - item[0] > self.ttl_seconds:
+                del self._memory[key]
+                item = None
+            if item is None and self._db is not None:
+                row = self._db.execute(
+                    "SELECT created, value FROM responses WHERE key = ? AND created >= ?",
+                    (key, now - self.ttl_seconds)).fetchone()
+                if row is not None:
+                    item = (row[0], json.loads(row[1]))
+                    self._remember(key, item)
+            if item is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._memory.move_to_end(key)
+            return dict(item[1])
+
+    def put(self, key: str, value: dict):
+        item = (time.time(), dict(value))
+        with self._lock:
+            self._remember(key, item)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                                 (key, item[0], json.dumps(value)))
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._memory),
+                "hits": self.hits,
+                "misses": self.misses,
+                "persistent": self._db is not None,
+            }
+
+    def _remember(self, key: str, item: tuple[float, dict]):
+        self._memory[key] = item
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
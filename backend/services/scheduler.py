@@ -0,0 +1,339 @@
+"""
+Continuous batching scheduler — one shared decode loop for all in-flight requests.
+
+Requests are prefilled as soon as there is batch and KV-cache room for them,
+join the running batch at the next decode step, and leave it the moment they
+hit EOS or their token limit, so short answers never wait for long ones.
+"""
+from __future__ import annotations
+
+import threading
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Callable
+
+import torch
+from backend.core.logger import logger
+from backend.services.adapters import adapter_rows
+from backend.services.kv_cache import KVPrefix, cache_layers, make_cache
+
+
+@dataclass
+class GenerationParams:
+    max_new_tokens: int = 600
+    do_sample: bool = True
+    temperature: float = 0.7
+    top_p: float = 0.9
+
+
+@dataclass
+class _Sequence:
+    prompt_ids: list[int]
+    params: GenerationParams
+    future: Future
+    reserved_tokens: int
+    on_token: Callable[[int], bool | None] | None = None
+    prefix: KVPrefix | None = None
+    on_cache: Callable[[KVPrefix], None] | None = None
+    adapter: str | None = None      # LoRA adapter applied to this row
+    generated: list[int] = field(default_factory=list)
+    length: int = 0                 # real (unpadded) tokens held in the KV cache
+
+
+# ── batch KV helpers ──────────────────────────────────────────────────────────
+# The running batch is kept as plain per-layer (key, value) tensors, left-padded
+# to a common length, and wrapped in a fresh DynamicCache for every forward.
+
+def _left_pad(t: torch.Tensor, length: int) -> torch.Tensor:
+    pad = length - t.shape[2]
+    if pad <= 0:
+        return t
+    zeros = t.new_zeros(t.shape[0], t.shape[1], pad, t.shape[3])
+    return torch.cat([zeros, t], dim=2)
+
+
+def kv_bytes_per_token(model) -> int:
+    """Bytes of KV cache one token occupies across all layers."""
+    c = model.config
+    head_dim = getattr(c, "head_dim", None) or c.hidden_size // c.num_attention_heads
+    kv_heads = getattr(c, "num_key_value_heads", None) or c.num_attention_heads
+    itemsize = next(model.parameters()).element_size()
+    return 2 * c.num_hidden_layers * kv_heads * head_dim * itemsize
+
+
+def sample_next(logits: torch.Tensor, params: GenerationParams) -> int:
+    """Greedy or temperature/top-p sampling for a single row of logits."""
+    if not params.do_sample or params.temperature <= 0:
+        return int(torch.argmax(logits))
+    probs = torch.softmax(logits.float() / params.temperature, dim=-1)
+    if params.top_p < 1.0:
+        sorted_probs, sorted_idx = torch.sort(probs, descending=True)
+        keep = torch.cumsum(sorted_probs, dim=-1) - sorted_probs < params.top_p
+        sorted_probs = sorted_probs * keep
+        choice = torch.multinomial(sorted_probs / sorted_probs.sum(), 1)
+        return int(sorted_idx[choice])
+    return int(torch.multinomial(probs, 1))
+
+
+class BatchScheduler:
+    """
+    Runs a background decode loop over a dynamic batch of sequences.
+
+    Admission is gated on ``max_batch_size`` and on a KV-cache budget: each
+    sequence reserves room for its prompt plus ``max_new_tokens`` up front, so
+    an admitted request can never be pre-empted for lack of memory.
+    """
+
+    def __init__(
+        self,
+        model,
+        eos_token_ids: set[int],
+        max_batch_size: int = 16,
+        kv_cache_budget_bytes: int = 2 * 1024 ** 3,
+    ):
+        self.model = model
+        self.eos_token_ids = eos_token_ids
+        self.max_batch_size = max_batch_size
+        self.kv_cache_budget_bytes = kv_cache_budget_bytes
+        self.bytes_per_token = kv_bytes_per_token(model)
+
+        self._waiting: deque[_Sequence] = deque()
+        self._active: list[_Sequence] = []
+        self._layers: list[tuple[torch.Tensor, torch.Tensor]] = []
+        self._mask: torch.Tensor | None = None          # [batch, padded_len]
+        self._reserved_tokens = 0
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._running = False
+
+    # ── public API ───────────────────────────────────────────────────────────
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._loop, name="batch-scheduler", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"Batch scheduler started (max_batch_size={self.max_batch_size}, "
+            f"kv_budget={self.kv_cache_budget_bytes // 2 ** 20} MB)")
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+    def submit(
+        self,
+        prompt_ids: list[int],
+        params: GenerationParams,
+        on_token: Callable[[int], bool | None] | None = None,
+        prefix: KVPrefix | None = None,
+        on_cache: Callable[[KVPrefix], None] | None = None,
+        adapter: str | None = None,
+    ) -> Future:
+        """
+        Queue a prompt for generation.  ``on_token`` is called from the
+        scheduler thread with each new token id as soon as it is decoded;
+        returning True ends the sequence after that token.
+        ``prefix``, if given, must be a proper token prefix of ``prompt_ids``;
+        only the remainder is prefilled.  ``on_cache`` receives the sequence's
+        final KV cache (prompt + generated tokens) when it finishes.
+        ``adapter`` names a resident LoRA adapter to decode this sequence with.
+        """
+        future: Future = Future()
+        need = len(prompt_ids) + params.max_new_tokens
+        if need * self.bytes_per_token > self.kv_cache_budget_bytes:
+            future.set_exception(ValueError(
+                f"Request needs {need} tokens of KV cache, more than the "
+                f"configured budget allows"))
+            return future
+        seq = _Sequence(list(prompt_ids), params, future, reserved_tokens=need,
+                        on_token=on_token, prefix=prefix, on_cache=on_cache, adapter=adapter)
+        with self._cond:
+            self._waiting.append(seq)
+            self._cond.notify()
+        return future
+
+    def generate(
+        self,
+        prompt_ids: list[int],
+        params: GenerationParams,
+        on_token: Callable[[int], bool | None] | None = None,
+        prefix: KVPrefix | None = None,
+        on_cache: Callable[[KVPrefix], None] | None = None,
+        adapter: str | None = None,
+    ) -> list[int]:
+        """Blocking helper — returns the generated token ids (EOS stripped)."""
+        return self.submit(prompt_ids, params, on_token, prefix, on_cache, adapter).result()
+
+    def stats(self) -> dict:
+        with self._cond:
+            padded = self._mask.shape[1] if self._mask is not None else 0
+            return {
+                "active": len(self._active),
+                "waiting": len(self._waiting),
+                "kv_reserved_bytes": self._reserved_tokens * self.bytes_per_token,
+                "kv_allocated_bytes": len(self._active) * padded * self.bytes_per_token,
+                "kv_budget_bytes": self.kv_cache_budget_bytes,
+            }
+
+    # ── decode loop ──────────────────────────────────────────────────────────
+    def _loop(self):
+        with torch.inference_mode():
+            while True:
+                with self._cond:
+                    while self._running and not self._waiting and not self._active:
+                        self._cond.wait()
+                    if not self._running:
+                        break
+                    admitted = self._pop_admissible()
+                try:
+                    for seq in admitted:
+                        self._prefill(seq)      # a failed prefill fails only its own request
+                    if self._active:
+                        self._decode_step()
+                except Exception as e:          # fail everything in flight, keep serving
+                    logger.error(f"Batch scheduler step failed: {e}")
+                    self._fail_in_flight(e, admitted)
+        with self._cond:
+            waiting, self._waiting = list(self._waiting), deque()
+        self._fail_in_flight(RuntimeError("Batch scheduler stopped"), waiting)
+
+    def _pop_admissible(self) -> list[_Sequence]:
+        admitted = []
+        budget_tokens = self.kv_cache_budget_bytes // self.bytes_per_token
+        while self._waiting and len(self._active) + len(admitted) < self.max_batch_size:
+            seq = self._waiting[0]
+            if self._reserved_tokens + seq.reserved_tokens > budget_tokens:
+                break
+            self._waiting.popleft()
+            self._reserved_tokens += seq.reserved_tokens
+            admitted.append(seq)
+        return admitted
+
+    def _prefill(self, seq: _Sequence):
+        try:
+            start, cache = 0, None
+            if seq.prefix is not None:
+                start, cache = len(seq.prefix), make_cache(seq.prefix.clone_layers())
+            input_ids = torch.tensor([seq.prompt_ids[start:]], device=self.model.device)
+            with adapter_rows(seq.adapter):
+                out = self.model(input_ids=input_ids, past_key_values=cache, use_cache=True)
+            seq.length = len(seq.prompt_ids)
+            layers = cache_layers(out.past_key_values)
+            finished = self._emit(seq, sample_next(out.logits[0, -1], seq.params))
+        except Exception as e:              # the running batch is untouched so far
+            logger.error(f"Prefill failed: {e}")
+            with self._cond:
+                self._reserved_tokens -= seq.reserved_tokens
+            seq.future.set_exception(e)
+            return
+        if finished:
+            self._release(seq, layers)
+            return
+        self._join(seq, layers)
+
+    def _join(self, seq: _Sequence, layers):
+        """Merge a freshly prefilled sequence into the running batch."""
+        mask = torch.ones(1, seq.length, dtype=torch.long, device=self.model.device)
+        if not self._active:
+            self._layers, self._mask = layers, mask
+        else:
+            length = max(self._mask.shape[1], seq.length)
+            self._layers = [
+                (torch.cat([_left_pad(bk, length), _left_pad(k, length)]),
+                 torch.cat([_left_pad(bv, length), _left_pad(v, length)]))
+                for (bk, bv), (k, v) in zip(self._layers, layers)
+            ]
+            self._mask = torch.cat([
+                torch.nn.functional.pad(self._mask, (length - self._mask.shape[1], 0)),
+                torch.nn.functional.pad(mask, (length - seq.length, 0)),
+            ])
+        self._active.append(seq)
+
+    def _decode_step(self):
+        device = self.model.device
+        input_ids = torch.tensor([[s.generated[-1]] for s in self._active], device=device)
+        position_ids = torch.tensor([[s.length] for s in self._active], device=device)
+        mask = torch.cat([self._mask, self._mask.new_ones(len(self._active), 1)], dim=1)
+        rows = tuple(s.adapter for s in self._active)
+        with adapter_rows(rows if any(rows) else None):
+            out = self.model(
+                input_ids=input_ids,
+                attention_mask=mask,
+                position_ids=position_ids,
+                past_key_values=make_cache(self._layers),
+                use_cache=True,
+            )
+        self._layers = cache_layers(out.past_key_values)
+        self._mask = mask
+
+        keep = []
+        for row, seq in enumerate(self._active):
+            seq.length += 1
+            if self._emit(seq, sample_next(out.logits[row, -1], seq.params)):
+                self._release(seq, self._row_layers(row, seq.length) if seq.on_cache else None)
+            else:
+                keep.append(row)
+        if len(keep) < len(self._active):
+            self._evict_rows(keep)
+
+    def _emit(self, seq: _Sequence, token: int) -> bool:
+        """Record a sampled token; returns True when the sequence is finished."""
+        if token in self.eos_token_ids:
+            return True
+        seq.generated.append(token)
+        if seq.on_token is not None:
+            try:
+                if seq.on_token(token):
+                    return True
+            except Exception as e:          # a bad listener must not sink the batch
+                logger.warning(f"Token callback failed, detaching it: {e}")
+                seq.on_token = None
+        return len(seq.generated) >= seq.params.max_new_tokens
+
+    def _row_layers(self, row: int, length: int):
+        """A contiguous copy of one row's unpadded KV, detached from the batch."""
+        return [(k[row:row + 1, :, -length:].clone(), v[row:row + 1, :, -length:].clone())
+                for k, v in self._layers]
+
+    def _release(self, seq: _Sequence, layers=None):
+        with self._cond:
+            self._reserved_tokens -= seq.reserved_tokens
+        if seq.on_cache is not None and layers is not None:
+            # the cache holds every prompt token and every generated token fed back
+            ids = (seq.prompt_ids + seq.generated)[:seq.length]
+            try:
+                seq.on_cache(KVPrefix(ids, layers))
+            except Exception as e:
+                logger.warning(f"KV cache callback failed: {e}")
+        seq.future.set_result(seq.generated)
+
+    def _evict_rows(self, keep: list[int]):
+        self._active = [self._active[i] for i in keep]
+        if not keep:
+            self._layers, self._mask = [], None
+            return
+        idx = torch.tensor(keep, device=self._mask.device)
+        mask = self._mask.index_select(0, idx)
+        # drop leading columns that are now padding for every remaining row
+        start = int((mask.sum(dim=0) > 0).nonzero()[0])
+        self._mask = mask[:, start:]
+        self._layers = [
+            (k.index_select(0, idx)[:, :, start:], v.index_select(0, idx)[:, :, start:])
+            for k, v in self._layers
+        ]
+
+    def _fail_in_flight(self, error: Exception, extra: list[_Sequence]):
+        with self._cond:
+            failed = self._active + [s for s in extra if s not in self._active]
+            self._active, self._layers, self._mask = [], [], None
+            self._reserved_tokens = 0           # every reserving sequence is in `failed`
+            for seq in failed:
+                if not seq.future.done():
+                    seq.future.set_exception(error)
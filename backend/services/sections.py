@@ -0,0 +1,279 @@
+"""
+Structured section parser — splits the model's markdown into its five sections in one pass.
+
+Works on a finished response (``parse_sections``) or incrementally on a growing
+token stream (``SectionParser``), where each section is reported as soon as the
+next ``##`` header starts.  Missing, reordered or unknown headers are tolerated;
+if a section appears twice the first occurrence wins.  ``SectionController``
+steers generation itself: stopping at the disclaimer, skipping unrequested
+sections and capping each section's length.
+"""
+from __future__ import annotations
+
+import re
+from typing import NamedTuple
+
+# Section header keyword → result / response field name
+SECTIONS = {
+    "Clinical Reasoning": "reasoning",
+    "Differential Diagnosis": "differentials",
+    "Recommended Workup": "workup",
+    "Treatment Plan": "treatment",
+    "Red Flags": "red_flags",
+}
+# Header lines exactly as the system prompt writes them, used when injecting a header
+HEADERS = {
+    "reasoning": "## 🔍 Clinical Reasoning",
+    "differentials": "## 📋 Differential Diagnosis",
+    "workup": "## 🩺 Recommended Workup",
+    "treatment": "## 💊 Treatment Plan",
+    "red_flags": "## ⚠️ Red Flags / Escalation",
+}
+# the closing sentence of the disclaimer mandated by the system prompt
+_DISCLAIMER_END = re.compile(r"not a substitute for professional medical judge?ment", re.IGNORECASE)
+_KEYWORD = re.compile("|".join(map(re.escape, SECTIONS)), re.IGNORECASE)
+_BY_KEYWORD = {section.lower(): key for section, key in SECTIONS.items()}
+
+
+def section_key(header: str) -> str | None:
+    """Field name for a ``## ...`` header line, or None if it is not a known section."""
+    m = _KEYWORD.search(header)
+    return _BY_KEYWORD[m.group(0).lower()] if m else None
+
+
+class SectionParser:
+    """
+    Incremental parser.  ``feed`` returns the sections completed by the new
+    text as ``(key, content)`` pairs; ``close`` flushes the last one.  Only the
+    open section's lines are buffered, so cost is linear in the text length
+    however finely the stream is chunked.
+    """
+
+    def __init__(self):
+        self._partial: list[str] = []       # chunks of the current, unterminated line
+        self._lines: list[str] = []         # body lines of the open section
+        self._current: str | None = None    # key of the open section, if known
+        self._seen: set[str] = set()
+
+    @property
+    def finished(self) -> bool:
+        """Every section has been reported; later text cannot change the result."""
+        return self._current is None and len(self._seen) == len(SECTIONS)
+
+    def feed(self, delta: str) -> list[tuple[str, str]]:
+        completed: list[tuple[str, str]] = []
+        if self.finished:
+            return completed
+        if "\n" not in delta:
+            self._partial.append(delta)
+        else:
+            lines = delta.split("\n")
+            self._line("".join(self._partial) + lines[0], completed)
+            for line in lines[1:-1]:
+                if self.finished:
+                    break
+                self._line(line, completed)
+            self._partial = [lines[-1]]
+        # a header that has only just started already closes the previous section
+        if self._current is not None and self._partial_starts_header():
+            self._close(completed)
+        return completed
+
+    def close(self) -> list[tuple[str, str]]:
+        completed: list[tuple[str, str]] = []
+        if self.finished:
+            return completed
+        tail = "".join(self._partial)
+        self._partial = []
+        if tail.startswith("##"):
+            self._close(completed)
+            self._open(tail, has_body=False, completed=completed)
+        else:
+            if self._current is not None:
+                self._lines.append(tail)
+        self._close(completed)
+        return completed
+
+    def _partial_starts_header(self) -> bool:
+        head = ""
+        for chunk in self._partial:
+            head += chunk
+            if len(head) >= 2:
+                break
+        return head.startswith("##")
+
+    def _line(self, line: str, completed: list[tuple[str, str]]):
+        if line.startswith("##"):
+            self._close(completed)
+            self._open(line, has_body=True, completed=completed)
+        elif self._current is not None:
+            self._lines.append(line)
+
+    def _open(self, header: str, has_body: bool, completed: list[tuple[str, str]]):
+        key = section_key(header)
+        if key is None or key in self._seen:
+            return
+        self._seen.add(key)
+        if has_body:
+            self._current = key
+        else:                               # header on the final line: empty section
+            completed.append((key, ""))
+
+    def _close(self, completed: list[tuple[str, str]]):
+        if self._current is not None:
+            completed.append((self._current, "\n".join(self._lines).strip()))
+        self._current, self._lines = None, []
+
+
+def _header_lines(text: str):
+    """(start, end) of every line beginning with ``##``, found with ``str.find``."""
+    start = 0 if text.startswith("##") else text.find("\n##")
+    while start >= 0:
+        if text[start] == "\n":
+            start += 1
+        end = text.find("\n", start)
+        if end < 0:
+            end = len(text)
+        yield start, end
+        start = text.find("\n##", end)
+
+
+def parse_sections(text: str) -> dict[str, str]:
+    """
+    All sections of a complete response; absent ones map to an empty string.
+    Header lines are located with one scan and the bodies sliced between them.
+    """
+    result = dict.fromkeys(SECTIONS.values(), "")
+    seen: set[str] = set()
+    open_key, body_start = None, 0
+    for start, end in _header_lines(text):
+        if open_key is not None:
+            result[open_key] = text[body_start:start].strip()
+            open_key = None
+        if len(seen) == len(SECTIONS):
+            break
+        key = section_key(text[start:end])
+        if key is not None and key not in seen:
+            seen.add(key)
+            if end < len(text):             # a header on the final line has no body
+                open_key, body_start = key, end + 1
+    if open_key is not None:
+        result[open_key] = text[body_start:].strip()
+    return result
+
+
+# ── generation control ────────────────────────────────────────────────────────
+
+class Steer(NamedTuple):
+    """What to do after a token: text now safe to show, and whether to stop or redirect."""
+    emit: str = ""
+    stop: bool = False
+    rewind: int = 0         # trailing generated tokens to discard
+    inject: str = ""        # text to append before generation resumes
+
+
+class SectionController:
+    """
+    Per-token steering from decoded text.  Generation stops once the
+    disclaimer line is complete — recognised only by its full closing
+    sentence, and only once the last wanted section is open or written, so
+    a body line quoting "medical judgement" never cuts the response.  With
+    a subset of ``wanted`` sections, the response opens on the first wanted
+    header; an unwanted or repeated header line is rewound and replaced by
+    the next wanted header, or ends the response once every wanted section
+    is written.  A section that exceeds its ``budgets`` token count is cut
+    off by injecting the next header.
+
+    Lines starting with ``#`` are held back until complete, so text that may
+    be rewound is never emitted.
+    """
+
+    def __init__(self, wanted: list[str] | None = None, budgets: dict[str, int] | None = None,
+                 stop_at_disclaimer: bool = True):
+        order = list(SECTIONS.values())
+        self.subset = bool(wanted) and set(wanted) != set(order)
+        self.wanted = [key for key in order if key in wanted] if self.subset else order
+        self.budgets = budgets or {}
+        self.stop_at_disclaimer = stop_at_disclaimer
+        self._texts: list[str] = []         # decoded text per generated/injected piece
+        self._emitted = 0                   # pieces of _texts already emitted
+        self._line = ""                     # text of the current, unterminated line
+        self._line_start = 0                # index in _texts of its first piece
+        self._current: str | None = None
+        self._section_tokens = 0
+        self._done: set[str] = set()
+
+    def opening(self) -> str:
+        """Text to seed the response with: the first wanted header for a subset."""
+        if not self.subset:
+            return ""
+        return self._enter(self.wanted[0], "")
+
+    def step(self, text: str) -> Steer:
+        self._texts.append(text)
+        if self._current is not None:
+            self._section_tokens += 1
+        *complete, tail = (self._line + text).split("\n")
+        for line in complete:
+            steer = self._end_line(line)
+            if steer is not None:
+                return steer
+            # lines after the first in this piece all start inside it
+            self._line_start = len(self._texts) - 1
+        if complete:
+            self._line_start = len(self._texts) - 1 if tail else len(self._texts)
+        self._line = tail
+        budget = self.budgets.get(self._current)
+        if budget and self._section_tokens > budget:
+            return self._next_or_stop(rewind=0)
+        return Steer(emit=self._flush(len(self._texts) if not tail.startswith("#")
+                                      else self._line_start))
+
+    def _end_line(self, line: str) -> Steer | None:
+        if line.startswith("##"):
+            key = section_key(line)
+            if self._current is not None:
+                self._done.add(self._current)
+                self._current = None
+            if key is not None and key in self.wanted and key not in self._done:
+                self._current, self._section_tokens = key, 0
+            elif self.subset or len(self._done) == len(self.wanted):
+                return self._next_or_stop(rewind=len(self._texts) - self._line_start)
+        elif self.stop_at_disclaimer and self._in_last_section() and _DISCLAIMER_END.search(line):
+            return Steer(emit=self._flush(len(self._texts)), stop=True)
+        return None
+
+    def _in_last_section(self) -> bool:
+        last = self.wanted[-1]
+        return self._current == last or last in self._done
+
+    def _next_or_stop(self, rewind: int) -> Steer:
+        """Move on to the next unwritten wanted section, or stop if there is none."""
+        if self._current is not None:
+            self._done.add(self._current)
+        remaining = [key for key in self.wanted if key not in self._done]
+        if rewind:
+            del self._texts[len(self._texts) - rewind:]
+        emit = self._flush(len(self._texts))
+        if not remaining:
+            return Steer(emit=emit, stop=True, rewind=rewind)
+        kept = "".join(self._texts)
+        inject = self._enter(remaining[0], kept)
+        return Steer(emit=emit + inject, rewind=rewind, inject=inject)
+
+    def _enter(self, key: str, kept: str) -> str:
+        """Header text (preceded by a blank line if needed) that opens ``key``."""
+        newlines = len(kept) - len(kept.rstrip("\n"))
+        inject = ("\n" * (2 - newlines) if kept and newlines < 2 else "") + HEADERS[key] + "\n"
+        self._texts.append(inject)
+        self._emitted = len(self._texts)
+        self._line, self._line_start = "", len(self._texts)
+        self._current, self._section_tokens = key, 0
+        return inject
+
+    def _flush(self, upto: int) -> str:
+        if upto <= self._emitted:
+            return ""
+        text = "".join(self._texts[self._emitted:upto])
+        self._emitted = upto
+        return text
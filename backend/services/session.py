@@ -1,34 +1,90 @@
 """
-In-memory session store.  For production swap with Redis.
+Session service — conversation turns on a pluggable, bounded store.
+Backend is chosen by SESSION_STORE (memory / sqlite / redis).
 """
 from __future__ import annotations
-from collections import defaultdict
-from datetime import datetime
+import asyncio
+import time
+from typing import Callable, TypeVar
+from backend.core.config import get_settings
+from backend.services.metrics import SESSION_STORE_SECONDS
+from backend.services.session_stores import MemorySessionStore, SessionStore, build_store
+from backend.services.turns import Turn
+
+cfg = get_settings()
+_timed = SESSION_STORE_SECONDS.labels
+T = TypeVar("T")
 
 
 class SessionService:
-    def __init__(self):
-        self._sessions: dict[str, list[dict]] = defaultdict(list)
+    def __init__(self, store: SessionStore | None = None):
+        self.store = store or build_store(cfg)
+        self._count, self._counted_at = 0, float("-inf")
+
+    async def offload(self, fn: Callable[..., T], *args) -> T:
+        """
+        Call ``fn(*args)`` from async code: inline on the in-process memory
+        store, in a worker thread on SQLite and Redis, which wait on disk or
+        the network and must not stall the event loop.
+        """
+        if isinstance(self.store, MemorySessionStore):
+            return fn(*args)
+        return await asyncio.to_thread(fn, *args)
 
     def add_turn(self, session_id: str, role: str, content: str):
-        self._sessions[session_id].append({
-            "role": role,
-            "content": content,
-            "timestamp": datetime.utcnow().isoformat(),
-        })
+        with _timed("append").time():
+            self.store.append(session_id, Turn(role, content, time.time()))
 
     def get_history(self, session_id: str) -> list[dict]:
-        return self._sessions.get(session_id, [])
+        with _timed("get").time():
+            return self.store.get(session_id)
+
+    def get_turns(self, session_id: str) -> list[Turn | dict]:
+        """History for the prompt: ``Turn`` records (decompressed on read) or plain dicts."""
+        with _timed("get").time():
+            return self.store.turns(session_id)
 
     def clear(self, session_id: str):
-        self._sessions.pop(session_id, None)
+        with _timed("clear").time():
+            self.store.clear(session_id)
 
     def get_chat_pairs(self, session_id: str) -> list[dict]:
         """Return only role/content dicts suitable for the model."""
         return [
-            {"role": t["role"], "content": t["content"]}
-            for t in self._sessions.get(session_id, [])
+            {"role": t.role, "content": t.content} if isinstance(t, Turn)
+            else {"role": t["role"], "content": t["content"]}
+            for t in self.get_turns(session_id)
         ]
 
+    def active_sessions(self, max_age: float = 0) -> int:
+        """
+        Live sessions.  A count is a full scan on the SQLite and Redis stores,
+        so with ``max_age`` one taken that recently is returned instead.
+        """
+        now = time.monotonic()
+        if max_age and now - self._counted_at < max_age:
+            return self._count
+        with _timed("count").time():
+            self._count = self.store.count()
+        self._counted_at = now
+        return self._count
+
+    def compress_cold(self, session_id: str, cold: list[tuple[Turn, str | None]]):
+        """Compress turns the prompt no longer quotes verbatim (see ``HistoryCompactor.cold``)."""
+        with _timed("compress").time():
+            self.store.compress(session_id, cold)
+
+    def memory_stats(self) -> dict | None:
+        """Sessions, turns and bytes held in this process (None for out-of-process stores)."""
+        return self.store.memory()
+
+    def list_sessions(self, since: float | None = None, until: float | None = None) -> list[str]:
+        """Sessions with a turn between ``since`` and ``until`` (epoch seconds)."""
+        with _timed("list").time():
+            return self.store.list_sessions(since, until)
+
+    def close(self):
+        self.store.close()
+
 
 session_service = SessionService()
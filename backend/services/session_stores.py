@@ -0,0 +1,386 @@
+"""
+Session storage backends — in-memory (bounded), SQLite (WAL) and Redis.
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from backend.core.logger import logger
+from backend.services.turns import Turn, epoch_seconds
+
+
+class SessionStore(ABC):
+    """
+    Append-only turn log per session.  ``append`` takes a ``Turn`` (or a
+    {role, content, timestamp} dict); ``get`` returns such dicts.
+    """
+
+    @abstractmethod
+    def append(self, session_id: str, turn: Turn | dict): ...
+
+    @abstractmethod
+    def get(self, session_id: str) -> list[dict]: ...
+
+    @abstractmethod
+    def clear(self, session_id: str): ...
+
+    @abstractmethod
+    def count(self) -> int:
+        """Number of live sessions."""
+
+    @abstractmethod
+    def list_sessions(self, since: float | None = None, until: float | None = None) -> list[str]:
+        """Live sessions with a turn in ``[since, until)`` (epoch seconds; None = open)."""
+
+    def turns(self, session_id: str) -> list[Turn | dict]:
+        """
+        The session's turns without the ISO timestamps ``get`` adds — ``Turn``
+        records where the store keeps them, else the stored dicts.  Both read
+        as ``turn["role"]`` / ``turn["content"]``.
+        """
+        return self.get(session_id)
+
+    def compress(self, session_id: str, cold: list[tuple[Turn, str | None]]):
+        """
+        Compress turns the prompt no longer quotes verbatim, keeping the
+        summary it quotes instead (if any) on the turn.  Only the memory store
+        holds ``Turn`` records; other stores keep their turns as they are.
+        """
+
+    def memory(self) -> dict | None:
+        """Memory held by the store in this process; None when it lives elsewhere."""
+        return None
+
+    def close(self):
+        pass
+
+
+def _as_dict(turn: Turn | dict) -> dict:
+    return turn.to_dict() if isinstance(turn, Turn) else turn
+
+
+def _in_range(turns: list[Turn | dict], since: float | None, until: float | None) -> bool:
+    for turn in turns:
+        t = turn.created if isinstance(turn, Turn) else epoch_seconds(turn.get("timestamp"))
+        if t is not None and (since is None or t >= since) and (until is None or t < until):
+            return True
+    return False
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Process-local store with hard caps: at most ``max_sessions`` sessions
+    (least recently used evicted first), ``max_turns`` turns per session
+    (oldest dropped) and ``ttl_seconds`` of idle time.  Turns are kept as
+    compact ``Turn`` records, zlib-compressed once history compaction
+    reports that the prompt no longer quotes them verbatim (``compress``).
+    """
+
+    def __init__(self, max_sessions: int, max_turns: int, ttl_seconds: float,
+                 compress_level: int = 6):
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.compress_level = compress_level
+        self._sessions: OrderedDict[str, list[Turn]] = OrderedDict()
+        self._touched: dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._turns = 0
+        self._compressed = 0
+        self._bytes = 0
+
+    def append(self, session_id: str, turn: Turn | dict):
+        turn = Turn.of(turn)
+        with self._lock:
+            self._expire(time.monotonic())
+            turns = self._sessions.setdefault(session_id, [])
+            turns.append(turn)
+            self._account([turn], 1)
+            if len(turns) > self.max_turns:
+                self._account(turns[:len(turns) - self.max_turns], -1)
+                del turns[:len(turns) - self.max_turns]
+            self._touch(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._drop(next(iter(self._sessions)))
+
+    def get(self, session_id: str) -> list[dict]:
+        return [turn.to_dict() for turn in self.turns(session_id)]
+
+    def turns(self, session_id: str) -> list[Turn]:
+        with self._lock:
+            self._expire(time.monotonic())
+            turns = self._sessions.get(session_id)
+            if turns is None:
+                return []
+            self._touch(session_id)
+            return list(turns)
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._drop(session_id)
+
+    def compress(self, session_id: str, cold: list[tuple[Turn, str | None]]):
+        with self._lock:
+            held = {id(t) for t in self._sessions.get(session_id, ())}
+            for turn, summary in cold:
+                if id(turn) not in held:
+                    continue
+                before = turn.nbytes()
+                turn.summary = summary
+                if turn.compress(self.compress_level):
+                    self._compressed += 1
+                self._bytes += turn.nbytes() - before
+
+    def memory(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "turns": self._turns,
+                "compressed_turns": self._compressed,
+                "bytes": self._bytes,
+            }
+
+    def count(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._sessions)
+
+    def list_sessions(self, since: float | None = None, until: float | None = None) -> list[str]:
+        with self._lock:
+            self._expire(time.monotonic())
+            sessions = [(sid, list(turns)) for sid, turns in self._sessions.items()]
+        return [sid for sid, turns in sessions if _in_range(turns, since, until)]
+
+    def _touch(self, session_id: str):
+        self._touched[session_id] = time.monotonic()
+        self._sessions.move_to_end(session_id)
+
+    def _account(self, turns: list[Turn], sign: int):
+        compressed = nbytes = 0
+        for turn in turns:              # runs on every append — no generator overhead
+            compressed += turn.compressed
+            nbytes += turn.nbytes()
+        self._turns += sign * len(turns)
+        self._compressed += sign * compressed
+        self._bytes += sign * nbytes
+
+    def _drop(self, session_id: str):
+        turns = self._sessions.pop(session_id, None)
+        self._touched.pop(session_id, None)
+        if turns:
+            self._account(turns, -1)
+
+    def _expire(self, now: float):
+        # LRU order means idle sessions sit at the front
+        while self._sessions:
+            oldest = next(iter(self._sessions))
+            if now - self._touched[oldest] <= self.ttl_seconds:
+                break
+            self._drop(oldest)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Durable store on a SQLite file in WAL mode.  Appends are buffered and
+    written in one transaction every ``flush_interval`` seconds by a
+    background thread; reads merge the unflushed buffer, so callers always
+    see their own writes.  Sessions idle for ``ttl_seconds`` are purged on a
+    second connection, without holding up reads.  A clear is recorded in the
+    file, so turns another worker queued before it are dropped at its flush.
+    """
+
+    def __init__(self, path: str, max_turns: int, ttl_seconds: float,
+                 flush_interval: float = 0.2):
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS turns (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "session_id TEXT NOT NULL, role TEXT, content TEXT, timestamp TEXT, "
+            "created REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS turns_session ON turns (session_id, id)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS clears (session_id TEXT PRIMARY KEY, cleared REAL)")
+        self._db.commit()
+        self._purge_db = sqlite3.connect(path, check_same_thread=False)
+        self._pending: list[tuple[str, Turn | dict, float]] = []
+        self._lock = threading.Lock()           # guards _pending and _db
+        self._write_lock = threading.Lock()     # one writer at a time; taken before _lock
+        self._stop = threading.Event()
+        self._last_purge = 0.0
+        self._thread = threading.Thread(target=self._flush_loop, name="session-flush",
+                                        daemon=True)
+        self._thread.start()
+
+    def append(self, session_id: str, turn: Turn | dict):
+        with self._lock:
+            self._pending.append((session_id, turn, time.time()))
+
+    def get(self, session_id: str) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT role, content, timestamp, created FROM turns WHERE session_id = ? "
+                "ORDER BY id", (session_id,)).fetchall()
+            (cleared,) = self._db.execute(
+                "SELECT MAX(cleared) FROM clears WHERE session_id = ?", (session_id,)).fetchone()
+            cleared = cleared if cleared is not None else float("-inf")
+            pending = [_as_dict(t) for sid, t, created in self._pending
+                       if sid == session_id and created > cleared]
+        if rows and rows[-1][3] < time.time() - self.ttl_seconds:
+            rows = []                           # idle past the TTL, awaiting purge
+        turns = [{"role": r, "content": c, "timestamp": t} for r, c, t, _ in rows]
+        return (turns + pending)[-self.max_turns:]
+
+    def clear(self, session_id: str):
+        with self._write_lock, self._lock:
+            self._pending = [p for p in self._pending if p[0] != session_id]
+            self._db.execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+            self._db.execute("INSERT OR REPLACE INTO clears (session_id, cleared) VALUES (?, ?)",
+                             (session_id, time.time()))
+            self._db.commit()
+
+    def count(self) -> int:
+        self.flush()
+        with self._lock:
+            (n,) = self._db.execute(
+                "SELECT COUNT(*) FROM (SELECT session_id FROM turns GROUP BY session_id "
+                "HAVING MAX(created) >= ?)", (time.time() - self.ttl_seconds,)).fetchone()
+            return n
+
+    def list_sessions(self, since: float | None = None, until: float | None = None) -> list[str]:
+        self.flush()
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT session_id FROM turns GROUP BY session_id HAVING MAX(created) >= ? "
+                "AND SUM(created >= ? AND created < ?) > 0 ORDER BY MIN(created)",
+                (time.time() - self.ttl_seconds,
+                 since if since is not None else float("-inf"),
+                 until if until is not None else float("inf"))).fetchall()
+        return [sid for (sid,) in rows]
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                if pending:
+                    # sessions cleared (by any worker) after their turns were queued
+                    cleared = dict(self._db.execute(
+                        "SELECT session_id, cleared FROM clears WHERE cleared >= ?",
+                        (min(created for _, _, created in pending),)))
+                    pending = [(sid, t, created) for sid, t, created in pending
+                               if created > cleared.get(sid, float("-inf"))]
+                    self._db.executemany(
+                        "INSERT INTO turns (session_id, role, content, timestamp, created) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [(sid, t["role"], t["content"], t["timestamp"], created)
+                         for sid, t, created in pending])
+                    for sid in {sid for sid, _, _ in pending}:
+                        self._db.execute(
+                            "DELETE FROM turns WHERE session_id = ? AND id NOT IN (SELECT id "
+                            "FROM turns WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                            (sid, sid, self.max_turns))
+                    self._db.commit()
+            now = time.time()
+            if now - self._last_purge > 60:
+                self._last_purge = now
+                self._purge(now - self.ttl_seconds)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+        self._db.close()
+        self._purge_db.close()
+
+    def _purge(self, cutoff: float):
+        """Delete sessions idle since ``cutoff`` — a full scan, so reads are not locked out."""
+        self._purge_db.execute(
+            "DELETE FROM turns WHERE session_id IN (SELECT session_id FROM turns "
+            "GROUP BY session_id HAVING MAX(created) < ?)", (cutoff,))
+        self._purge_db.execute("DELETE FROM clears WHERE cleared < ?", (cutoff,))
+        self._purge_db.commit()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Session flush failed: {e}")
+
+
+class RedisSessionStore(SessionStore):
+    """
+    One Redis list per session (JSON turns), trimmed to ``max_turns`` and
+    expiring after ``ttl_seconds`` idle.  Works with any server speaking the
+    Redis protocol; ``client`` may be injected (e.g. a fake in tests).
+    """
+
+    PREFIX = "nemesis:session:"
+
+    def __init__(self, url: str = "", max_turns: int = 200, ttl_seconds: float = 86400,
+                 client=None):
+        if client is None:
+            import redis        # optional dependency, only needed for this backend
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.max_turns = max_turns
+        self.ttl_seconds = int(ttl_seconds)
+
+    def append(self, session_id: str, turn: Turn | dict):
+        key = self.PREFIX + session_id
+        pipe = self.client.pipeline()
+        pipe.rpush(key, json.dumps(_as_dict(turn)))
+        pipe.ltrim(key, -self.max_turns, -1)
+        pipe.expire(key, self.ttl_seconds)
+        pipe.execute()
+
+    def get(self, session_id: str) -> list[dict]:
+        key = self.PREFIX + session_id
+        pipe = self.client.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.expire(key, self.ttl_seconds)
+        raw, _ = pipe.execute()
+        return [json.loads(item) for item in raw]
+
+    def clear(self, session_id: str):
+        self.client.delete(self.PREFIX + session_id)
+
+    def count(self) -> int:
+        return sum(1 for _ in self.client.scan_iter(match=self.PREFIX + "*"))
+
+    def list_sessions(self, since: float | None = None, until: float | None = None) -> list[str]:
+        sessions = []
+        for key in self.client.scan_iter(match=self.PREFIX + "*"):
+            key = key.decode() if isinstance(key, bytes) else key
+            raw = self.client.lrange(key, 0, -1)
+            if _in_range([json.loads(item) for item in raw], since, until):
+                sessions.append(key[len(self.PREFIX):])
+        return sessions
+
+    def close(self):
+        self.client.close()
+
+
+def build_store(cfg) -> SessionStore:
+    """Instantiate the backend selected by ``cfg.session_store``."""
+    if cfg.session_store == "sqlite":
+        return SQLiteSessionStore(cfg.session_sqlite_path, cfg.session_max_turns,
+                                  cfg.session_ttl_s, cfg.session_flush_interval_ms / 1000)
+    if cfg.session_store == "redis":
+        return RedisSessionStore(cfg.redis_url, cfg.session_max_turns, cfg.session_ttl_s)
+    if cfg.session_store != "memory":
+        raise ValueError(f"Unknown session_store: {cfg.session_store!r}")
+    if cfg.workers > 1:
+        # a process-local store would give every worker its own view of a session
+        logger.warning("session_store=memory is per process; using sqlite for multiple workers")
+        return SQLiteSessionStore(cfg.session_sqlite_path, cfg.session_max_turns,
+                                  cfg.session_ttl_s, cfg.session_flush_interval_ms / 1000)
+    return MemorySessionStore(cfg.session_max_sessions, cfg.session_max_turns,
+                              cfg.session_ttl_s)
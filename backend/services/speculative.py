@@ -0,0 +1,187 @@
+"""
+Speculative decoding — draft several tokens cheaply, verify them in one forward of the model.
+
+Drafts come either from the text itself (prompt lookup: the continuation of
+the latest earlier occurrence of the trailing n-gram, which suits section
+headers, the fixed disclaimer and phrases copied from the symptoms) or from a
+smaller draft model sharing the tokenizer.  Verification is greedy: a draft
+token is kept only while it equals the model's own argmax, so the output is
+identical to plain greedy decoding.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+import torch
+from backend.services.kv_cache import KVPrefix, cache_layers, make_cache
+
+MODES = ("prompt_lookup", "draft_model")
+
+
+class PromptLookupDrafter:
+    """
+    Proposes the tokens that followed the most recent earlier occurrence of
+    the sequence's last ``max_ngram`` (down to 1) tokens.  An index from
+    n-gram to its latest end position is extended as tokens arrive, so each
+    draft costs O(max_ngram) rather than a scan of the whole sequence.
+    """
+
+    def __init__(self, max_ngram: int = 3):
+        self.max_ngram = max_ngram
+        self._last_end: dict[tuple[int, ...], int] = {}
+        self._indexed = 0           # n-grams ending before this position are indexed
+
+    def draft(self, ids: list[int], k: int) -> list[int]:
+        # index every n-gram that now has at least one following token
+        for end in range(self._indexed, len(ids) - 1):
+            for n in range(1, min(self.max_ngram, end + 1) + 1):
+                self._last_end[tuple(ids[end - n + 1:end + 1])] = end
+        self._indexed = max(self._indexed, len(ids) - 1)
+        for n in range(min(self.max_ngram, len(ids)), 0, -1):
+            end = self._last_end.get(tuple(ids[-n:]))
+            if end is not None:
+                return ids[end + 1:end + 1 + k]
+        return []
+
+    def accepted(self, ids: list[int]):
+        pass
+
+
+class DraftModelDrafter:
+    """Greedy drafts from a smaller model with the same vocabulary; keeps its own KV cache."""
+
+    def __init__(self, model):
+        self.model = model
+        self._layers: list[tuple[torch.Tensor, torch.Tensor]] = []
+        self._cached = 0            # leading tokens of the sequence held in the draft cache
+
+    def draft(self, ids: list[int], k: int) -> list[int]:
+        drafted: list[int] = []
+        feed = ids[self._cached:]
+        for _ in range(k):
+            out = self.model(input_ids=torch.tensor([feed], device=self.model.device),
+                             past_key_values=make_cache(self._layers), use_cache=True)
+            self._layers = cache_layers(out.past_key_values)
+            self._cached += len(feed)
+            token = int(torch.argmax(out.logits[0, -1]))
+            drafted.append(token)
+            feed = [token]
+        return drafted
+
+    def accepted(self, ids: list[int]):
+        # drop draft KV past the verified sequence; the last token is fed next round
+        keep = min(self._cached, len(ids) - 1)
+        if keep < self._cached:
+            self._layers = [(k[:, :, :keep], v[:, :, :keep]) for k, v in self._layers]
+            self._cached = keep
+
+
+class SpeculativeDecoder:
+    """
+    Single-sequence greedy generation with draft-and-verify.  Each step feeds
+    the last token plus ``num_draft_tokens`` drafted ones, keeps the longest
+    draft prefix that matches the model's argmax plus the model's next token,
+    and crops the KV cache back to the accepted length.  Acceptance and
+    throughput are accumulated per drafting mode for ``stats``.
+    """
+
+    def __init__(self, model, eos_token_ids: set[int], num_draft_tokens: int = 8,
+                 max_ngram: int = 3, draft_model=None):
+        self.model = model
+        self.eos_token_ids = eos_token_ids
+        self.num_draft_tokens = num_draft_tokens
+        self.max_ngram = max_ngram
+        self.draft_model = draft_model
+        self._lock = threading.Lock()
+        self._totals = {mode: {"requests": 0, "tokens": 0, "drafted": 0, "accepted": 0,
+                               "forwards": 0, "seconds": 0.0} for mode in MODES}
+
+    def generate(
+        self,
+        prompt_ids: list[int],
+        max_new_tokens: int,
+        mode: str = "prompt_lookup",
+        on_token: Callable[[int], bool | None] | None = None,
+        prefix: KVPrefix | None = None,
+        on_cache: Callable[[KVPrefix], None] | None = None,
+    ) -> list[int]:
+        """
+        Generated token ids (EOS stripped), exactly as greedy decoding would
+        produce them.  ``on_token`` returning True ends generation there.
+        """
+        if mode == "draft_model" and self.draft_model is None:
+            raise ValueError("draft_model mode needs DRAFT_MODEL_ID to be configured")
+        drafter = DraftModelDrafter(self.draft_model) if mode == "draft_model" \
+            else PromptLookupDrafter(self.max_ngram)
+        start = time.perf_counter()
+        drafted = accepted = 0
+        with torch.inference_mode():
+            # prefill; afterwards the cache always holds every token but the last
+            cached = len(prefix) if prefix is not None else 0
+            layers, logits = self._forward(prompt_ids[cached:],
+                                           prefix.clone_layers() if prefix else [])
+            ids = list(prompt_ids) + [int(torch.argmax(logits[-1]))]
+            forwards = 1
+            generated: list[int] = []
+            done = self._take(ids[-1:], generated, max_new_tokens, on_token)
+            while not done:
+                budget = max_new_tokens - len(generated)
+                draft = drafter.draft(ids, min(self.num_draft_tokens, budget - 1))
+                layers, logits = self._forward([ids[-1]] + draft, layers)
+                forwards += 1
+                predicted = torch.argmax(logits, dim=-1).tolist()
+                n = 0
+                while n < len(draft) and draft[n] == predicted[n]:
+                    n += 1
+                drafted += len(draft)
+                accepted += n
+                new = draft[:n] + [predicted[n]]
+                keep = len(ids) + n                     # old tokens + accepted drafts
+                layers = [(k[:, :, :keep], v[:, :, :keep]) for k, v in layers]
+                ids.extend(new)
+                drafter.accepted(ids)
+                done = self._take(new, generated, max_new_tokens, on_token)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            totals = self._totals[mode]
+            totals["requests"] += 1
+            totals["tokens"] += len(generated)
+            totals["drafted"] += drafted
+            totals["accepted"] += accepted
+            totals["forwards"] += forwards
+            totals["seconds"] += elapsed
+        if on_cache is not None:
+            length = min(len(prompt_ids) + len(generated), layers[0][0].shape[2])
+            on_cache(KVPrefix((list(prompt_ids) + generated)[:length],
+                              [(k[:, :, :length].clone(), v[:, :, :length].clone())
+                               for k, v in layers]))
+        return generated
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {mode: {
+                "requests": t["requests"],
+                "acceptance_rate": round(t["accepted"] / t["drafted"], 3) if t["drafted"] else None,
+                "tokens_per_forward": round(t["tokens"] / t["forwards"], 2) if t["forwards"] else None,
+                "tokens_per_s": round(t["tokens"] / t["seconds"], 1) if t["seconds"] else None,
+            } for mode, t in self._totals.items()}
+
+    def _forward(self, input_ids: list[int], layers):
+        out = self.model(input_ids=torch.tensor([input_ids], device=self.model.device),
+                         past_key_values=make_cache(layers), use_cache=True)
+        return cache_layers(out.past_key_values), out.logits[0]
+
+    def _take(self, tokens: list[int], generated: list[int], max_new_tokens: int,
+              on_token: Callable[[int], bool | None] | None) -> bool:
+        """Append verified tokens up to EOS or the limit; returns True when finished."""
+        for token in tokens:
+            if token in self.eos_token_ids:
+                return True
+            generated.append(token)
+            if on_token is not None and on_token(token):
+                return True
+            if len(generated) >= max_new_tokens:
+                return True
+        return False
@@ -0,0 +1,101 @@
+"""
+Compact conversation turns — slotted records with interned roles, epoch timestamps and
+zlib-compressed content once the prompt no longer quotes a turn verbatim.
+"""
+from __future__ import annotations
+
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+COMPRESS_MIN_CHARS = 256        # below this zlib's header outweighs the saving
+_EPOCH = datetime(1970, 1, 1)   # naive UTC; plain arithmetic beats tz-aware conversion
+
+
+class Turn:
+    """
+    One conversation turn.  Reads like the ``{role, content, timestamp}``
+    dict the stores used to hold (``turn["content"]``, ``turn.get(...)``),
+    but costs one small object plus its text.  ``content`` is decompressed
+    on access once the turn is cold.  History compaction caches the turn's
+    token count in ``tokens``, and a cold answer keeps the summary the prompt
+    quotes in ``summary``, so a turn in the prompt is never decompressed.
+    """
+
+    __slots__ = ("role", "created", "tokens", "summary", "_text")
+
+    def __init__(self, role: str, content: str, created: float, tokens: int = -1):
+        self.role = sys.intern(role)
+        self.created = created                  # epoch seconds, UTC
+        self.tokens = tokens                    # -1 = not counted yet
+        self.summary: str | None = None
+        self._text: str | bytes = content
+
+    @classmethod
+    def of(cls, turn: Turn | dict) -> Turn:
+        """``turn`` itself, or a Turn built from a stored dict."""
+        if isinstance(turn, Turn):
+            return turn
+        created = epoch_seconds(turn.get("timestamp"))
+        return cls(turn["role"], turn["content"], created if created is not None else time.time())
+
+    @property
+    def content(self) -> str:
+        text = self._text
+        return zlib.decompress(text).decode() if isinstance(text, bytes) else text
+
+    @property
+    def timestamp(self) -> str:
+        """ISO-8601, naive UTC — the format the stores have always returned."""
+        return (_EPOCH + timedelta(seconds=self.created)).isoformat()
+
+    @property
+    def compressed(self) -> bool:
+        return isinstance(self._text, bytes)
+
+    def compress(self, level: int = 6) -> bool:
+        """Store the content zlib-compressed if that makes it smaller."""
+        if self.compressed or len(self._text) < COMPRESS_MIN_CHARS:
+            return False
+        packed = zlib.compress(self._text.encode(), level)
+        if len(packed) >= len(self._text):
+            return False
+        self._text = packed
+        return True
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this turn (the interned role is shared)."""
+        size = _FIXED_BYTES + sys.getsizeof(self._text)
+        return size + (sys.getsizeof(self.summary) if self.summary is not None else 0)
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content, "timestamp": self.timestamp}
+
+    # ── dict-style access for code written against turn dicts ────────────────
+    def __getitem__(self, key: str):
+        if key not in ("role", "content", "timestamp"):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __repr__(self) -> str:
+        return f"Turn({self.role!r}, {self.timestamp}, {'compressed' if self.compressed else 'plain'})"
+
+
+def epoch_seconds(timestamp: str | None) -> float | None:
+    """Epoch seconds of an ISO timestamp (naive means UTC); None if missing or malformed."""
+    try:
+        ts = datetime.fromisoformat(timestamp)
+    except (TypeError, ValueError):
+        return None
+    return ts.timestamp() if ts.tzinfo else (ts - _EPOCH).total_seconds()
+
+
+# a slotted Turn and its float timestamp are the same size for every turn
+_FIXED_BYTES = sys.getsizeof(Turn("", "", 0.0)) + sys.getsizeof(0.0)
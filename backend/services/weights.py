@@ -0,0 +1,179 @@
+"""
+Local model artefacts — export once to safetensors, then memory-map read-only on every start.
+
+The first load writes the model in its serving dtype, with config and
+tokenizer, under MODEL_CACHE_DIR together with a fingerprint (model id,
+dtype, library versions).  Later starts map the file instead of resolving
+the hub id and casting weights, and never touch the network, so a node can
+run air-gapped once the cache is populated.  A fingerprint mismatch
+re-exports.  The file is mapped copy-on-write, so every worker process
+reads the same physical pages from the OS page cache and RAM does not grow
+with the worker count.  Run ``python -m backend.services.weights`` to
+populate the cache ahead of time; otherwise the first worker exports under
+a file lock.
+"""
+from __future__ import annotations
+
+import fcntl
+import json
+import os
+import shutil
+import struct
+from pathlib import Path
+
+import torch
+from backend.core.logger import logger
+
+WEIGHTS_FILE = "model.safetensors"
+FINGERPRINT_FILE = "artefact.json"
+FORMAT_VERSION = 1
+
+_DTYPES = {
+    "F64": torch.float64, "F32": torch.float32, "F16": torch.float16,
+    "BF16": torch.bfloat16, "I64": torch.int64, "I32": torch.int32,
+    "I16": torch.int16, "I8": torch.int8, "U8": torch.uint8, "BOOL": torch.bool,
+}
+
+
+def read_header(path: str | Path) -> tuple[dict, int]:
+    """Parsed safetensors header and the byte offset where tensor data starts."""
+    with open(path, "rb") as f:
+        (n,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n))
+    header.pop("__metadata__", None)
+    return header, 8 + n
+
+
+def map_safetensors(path: str | Path) -> dict[str, torch.Tensor]:
+    """
+    Every tensor in a safetensors file as a zero-copy view of one private
+    mapping of the file.  Pages are shared with other processes mapping the
+    same file until written, which inference never does.
+    """
+    header, data_start = read_header(path)
+    storage = torch.UntypedStorage.from_file(str(path), shared=False,
+                                             nbytes=os.path.getsize(path))
+    raw = torch.empty(0, dtype=torch.uint8).set_(storage)
+    tensors = {}
+    for name, info in header.items():
+        dtype = _DTYPES[info["dtype"]]
+        start, end = (data_start + off for off in info["data_offsets"])
+        view = raw[start:end]
+        if start % dtype.itemsize:              # unaligned: cannot view in place
+            view = view.clone()
+        tensors[name] = view.view(dtype).view(info["shape"])
+    return tensors
+
+
+def fingerprint(model_id: str, dtype: torch.dtype) -> dict:
+    """What an exported artefact must have been built from to be reused."""
+    import transformers
+
+    expected = {
+        "format": FORMAT_VERSION,
+        "model_id": model_id,
+        "dtype": str(dtype).removeprefix("torch."),
+        "torch": str(torch.__version__),
+        "transformers": transformers.__version__,
+    }
+    source = Path(model_id)
+    if source.is_dir():                     # a local checkpoint can change in place
+        expected["source_mtime_ns"] = max(
+            (p.stat().st_mtime_ns for p in source.iterdir() if p.is_file()), default=0)
+    return expected
+
+
+def read_fingerprint(directory: str | Path) -> dict | None:
+    try:
+        return json.loads((Path(directory) / FINGERPRINT_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def export_weights(model, tokenizer, directory: str | Path, fingerprint: dict | None = None):
+    """Write ``model`` as one safetensors file plus its config and tokenizer, atomically."""
+    directory = Path(directory)
+    tmp = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    model.save_pretrained(tmp, safe_serialization=True, max_shard_size="1000GB")
+    tokenizer.save_pretrained(tmp)
+    if fingerprint is not None:
+        (tmp / FINGERPRINT_FILE).write_text(json.dumps(fingerprint, indent=2))
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp, directory)
+    size = (directory / WEIGHTS_FILE).stat().st_size
+    logger.info(f"Exported model artefact to {directory} ({size / 2 ** 20:.0f} MiB)")
+
+
+def ensure_exported(model_id: str, dtype: torch.dtype, root: str | Path) -> Path:
+    """
+    Directory under ``root`` holding ``model_id`` exported in ``dtype``,
+    exporting it first if it is missing or its fingerprint does not match.
+    If a re-export fails (e.g. offline after a library upgrade) the existing
+    export is used with a warning.  Concurrent callers serialise on a lock
+    file, so N workers starting at once export a single time.
+    """
+    name = f"{model_id.replace('/', '--')}-{str(dtype).removeprefix('torch.')}"
+    directory = Path(root) / name
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    expected = fingerprint(model_id, dtype)
+    with open(directory.with_name(directory.name + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        found = read_fingerprint(directory)
+        if found == expected:
+            return directory
+        if found is not None:
+            changed = sorted(k for k in expected.keys() | found.keys()
+                             if expected.get(k) != found.get(k))
+            logger.info(f"Model artefact {name} is stale ({', '.join(changed)} changed)")
+        try:
+            _export(model_id, dtype, directory, expected)
+        except Exception as e:
+            if found is None:
+                raise
+            logger.warning(f"Re-exporting {name} failed ({e}); using the existing export")
+    return directory
+
+
+def _export(model_id: str, dtype: torch.dtype, directory: Path, expected: dict):
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    logger.info(f"Exporting {model_id} ({expected['dtype']}) to the model cache...")
+    model = AutoModelForCausalLM.from_pretrained(model_id, torch_dtype=dtype)
+    export_weights(model, AutoTokenizer.from_pretrained(model_id), directory, expected)
+    del model
+
+
+def load_shared_model(directory: str | Path):
+    """
+    Build the model skeleton without allocating parameters, then assign the
+    memory-mapped tensors as its parameters.  Buffers (e.g. rotary tables)
+    are small and computed per process as usual.
+    """
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig, AutoModelForCausalLM, GenerationConfig
+
+    directory = Path(directory)
+    config = AutoConfig.from_pretrained(directory)
+    state = map_safetensors(directory / WEIGHTS_FILE)
+    dtype = next(iter(state.values())).dtype
+    with init_empty_weights(include_buffers=False):
+        model = AutoModelForCausalLM.from_config(config, torch_dtype=dtype)
+    missing, unexpected = model.load_state_dict(state, strict=False, assign=True)
+    model.tie_weights()
+    still_empty = [n for n, p in model.named_parameters() if p.is_meta]
+    if still_empty or unexpected:
+        raise RuntimeError(f"Shared weights do not match the model: missing {still_empty}, "
+                           f"unexpected {unexpected}")
+    if (directory / "generation_config.json").exists():
+        model.generation_config = GenerationConfig.from_pretrained(directory)
+    model.requires_grad_(False)
+    return model.eval()
+
+
+if __name__ == "__main__":
+    from backend.core.config import get_settings
+    from backend.services.inference import torch_dtype
+
+    cfg = get_settings()
+    ensure_exported(cfg.model_id, torch_dtype(cfg.torch_dtype), cfg.model_cache_dir)
@@ -0,0 +1,75 @@
+"""
+Continuous batching vs. the one-pipeline-call-per-request path.
+
+Runs N concurrent sessions against a tiny random Llama on CPU and reports wall
+time, requests/s and generated tokens/s for both paths.
+
+    python -m benchmarks.bench_batching --concurrency 8 16 32 --max-new-tokens 64
+"""
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.tiny_llama import CORPUS, build_tiny_llama
+from backend.core.config import get_settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--hidden-size", type=int, default=256)
+    parser.add_argument("--layers", type=int, default=4)
+    args = parser.parse_args()
+
+    cfg = get_settings()
+    cfg.model_id = build_tiny_llama(hidden_size=args.hidden_size, num_layers=args.layers)
+    cfg.device = "cpu"
+    cfg.torch_dtype = "float32"
+    cfg.model_cache_dir = tempfile.mkdtemp(prefix="nemesis_models_")
+    cfg.max_new_tokens = args.max_new_tokens
+    cfg.max_batch_size = max(args.concurrency)
+
+    from backend.services.inference import SYSTEM_PROMPT, inference_service
+    from backend.services.scheduler import GenerationParams
+    inference_service.load()
+    tok = inference_service.tokenizer
+    params = GenerationParams(max_new_tokens=args.max_new_tokens, do_sample=False)
+
+    def conversation(i: int) -> list[dict]:
+        return [{"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"Case {i}: {CORPUS[i % len(CORPUS)]}"}]
+
+    def one_call(i: int) -> int:
+        out = inference_service.pipe(conversation(i), max_new_tokens=params.max_new_tokens,
+                                     do_sample=False)
+        return len(tok(out[0]["generated_text"][-1]["content"])["input_ids"])
+
+    def batched(i: int) -> int:
+        prompt_ids = inference_service._prompt_ids(conversation(i))
+        return len(inference_service._decode(prompt_ids, params, "standard"))
+
+    batched(0)                                  # warm both paths
+    one_call(0)
+
+    print(f"{'path':<22}{'sessions':>9}{'wall s':>9}{'req/s':>9}{'tok/s':>10}")
+    for n in args.concurrency:
+        start = time.perf_counter()
+        tokens = sum(one_call(i) for i in range(n))
+        wall = time.perf_counter() - start
+        print(f"{'one call per request':<22}{n:>9}{wall:>9.2f}{n / wall:>9.2f}{tokens / wall:>10.1f}")
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=n) as pool:
+            tokens = sum(pool.map(batched, range(n)))
+        wall = time.perf_counter() - start
+        print(f"{'continuous batching':<22}{n:>9}{wall:>9.2f}{n / wall:>9.2f}{tokens / wall:>10.1f}")
+
+    inference_service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
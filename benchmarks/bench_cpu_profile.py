@@ -0,0 +1,76 @@
+"""
+CPU inference profile vs. the default load path.
+
+Loads the same tiny random Llama once per variant and times sequential greedy
+requests, reporting generated tokens/s and p50/p95 request latency.
+
+    python -m benchmarks.bench_cpu_profile --requests 20 --max-new-tokens 64 --compile
+"""
+from __future__ import annotations
+
+import argparse
+import statistics
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from benchmarks.tiny_llama import CORPUS, build_tiny_llama
+from backend.core.config import get_settings
+from backend.services.cpu_profile import apply_cpu_profile, configure_threads
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+
+def run(model, prompts: list[list[int]], max_new_tokens: int) -> tuple[float, list[float]]:
+    latencies, tokens = [], 0
+    start = time.perf_counter()
+    for ids in prompts:
+        t0 = time.perf_counter()
+        with torch.inference_mode():
+            out = model.generate(torch.tensor([ids]), max_new_tokens=max_new_tokens,
+                                 do_sample=False, eos_token_id=None, pad_token_id=0)
+        latencies.append(time.perf_counter() - t0)
+        tokens += out.shape[1] - len(ids)
+    return tokens / (time.perf_counter() - start), latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--threads", type=int, default=0)
+    parser.add_argument("--compile", action="store_true", help="also time int8 + torch.compile")
+    args = parser.parse_args()
+
+    path = build_tiny_llama(hidden_size=args.hidden_size, num_layers=args.layers)
+    tok = AutoTokenizer.from_pretrained(path)
+    prompts = [tok(CORPUS[i % len(CORPUS)])["input_ids"] for i in range(args.requests)]
+    configure_threads(args.threads)
+    cfg = get_settings().model_copy()
+
+    variants = [("default (bfloat16)", torch.bfloat16, None),
+                ("float32", torch.float32, None),
+                ("cpu profile: int8", torch.float32, {"cpu_int8": True, "cpu_compile": False})]
+    if args.compile:
+        variants.append(("cpu profile: int8+compile", torch.float32,
+                         {"cpu_int8": True, "cpu_compile": True}))
+
+    print(f"{'variant':<28}{'tok/s':>9}{'p50 s':>9}{'p95 s':>9}")
+    for name, dtype, profile in variants:
+        model = AutoModelForCausalLM.from_pretrained(path, torch_dtype=dtype).eval()
+        if profile is not None:
+            model = apply_cpu_profile(model, cfg.model_copy(update=profile))
+        run(model, prompts[:2], args.max_new_tokens)             # warm-up
+        tok_s, latencies = run(model, prompts, args.max_new_tokens)
+        print(f"{name:<28}{tok_s:>9.1f}{statistics.median(latencies):>9.3f}"
+              f"{percentile(latencies, 0.95):>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
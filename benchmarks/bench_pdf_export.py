@@ -0,0 +1,106 @@
+"""
+PDF export: markdown compiler with cached styles and turns vs. the per-line renderer it replaced.
+
+For sessions of 10/100/500 turns, times building the story (markdown →
+flowables) and the full export, each for the original renderer, a cold
+compile (empty turn cache) and the re-export of the same session after two
+more turns, where only the new turns compile.  ReportLab's layout
+(``doc.build``) is the same work in every variant and dominates the totals.
+
+    python -m benchmarks.bench_pdf_export --turns 10 100 500
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import time
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from benchmarks.bench_sections import TYPICAL
+from benchmarks.tiny_llama import CORPUS
+from backend.services.pdf_export import (
+    build_styles, compiled_turn, export_session_pdf, turn_flowables,
+)
+
+
+def legacy_story(history: list[dict]) -> list:
+    """The original renderer: styles per export, one Paragraph per line, substring checks."""
+    styles = build_styles()
+    story = []
+    for turn in history:
+        if turn["role"] == "user":
+            story.append(Paragraph("🧑 Patient / Clinician Query", styles["section_header"]))
+            story.append(Paragraph(turn["timestamp"], styles["disclaimer"]))
+            story.append(Paragraph(turn["content"].replace("\n", "<br/>"), styles["body"]))
+        else:
+            story.append(Paragraph("🤖 LlamaTron Analysis", styles["section_header"]))
+            for line in turn["content"].split("\n"):
+                line = line.strip()
+                if not line:
+                    story.append(Spacer(1, 0.15*cm))
+                elif line.startswith("## "):
+                    story.append(Paragraph(line[3:], styles["section_header"]))
+                elif "Red Flag" in line or "⚠️" in line:
+                    story.append(Paragraph(line, styles["red_flag"]))
+                else:
+                    story.append(Paragraph(line, styles["body"]))
+        story.append(Spacer(1, 0.2*cm))
+    return story
+
+
+def legacy_export(history: list[dict]) -> int:
+    story = legacy_story(history)
+    SimpleDocTemplate(io.BytesIO(), pagesize=A4).build(story)
+    return len(story)
+
+
+def session(turns: int) -> list[dict]:
+    history = []
+    for i in range(turns // 2):
+        history.append({"role": "user", "content": CORPUS[i % len(CORPUS)],
+                        "timestamp": f"2026-01-01T{i // 60 % 24:02d}:{i % 60:02d}:00"})
+        history.append({"role": "assistant", "content": f"Case {i}.\n\n{TYPICAL}",
+                        "timestamp": ""})
+    return history
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def story(history: list[dict]) -> list:
+    return [f for t in history for f in turn_flowables(t["role"], t["content"], t["timestamp"])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--turns", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+
+    print(f"{'':>6}{'── story build ms ──':>30}{'── full export s ──':>30}")
+    print(f"{'turns':>6}{'legacy':>10}{'cold':>10}{'+2 turns':>10}"
+          f"{'legacy':>10}{'cold':>10}{'+2 turns':>10}{'flowables old/new':>20}")
+    for turns in args.turns:
+        history = session(turns)
+        grown = history + session(turns + 2)[-2:]
+        story_ms = [timed(lambda: legacy_story(history)) * 1e3]
+        compiled_turn.cache_clear()
+        story_ms.append(timed(lambda: story(history)) * 1e3)
+        story_ms.append(timed(lambda: story(grown)) * 1e3)
+        export_s = [timed(lambda: legacy_export(history))]
+        compiled_turn.cache_clear()
+        export_s.append(timed(lambda: export_session_pdf(history)))
+        export_s.append(timed(lambda: export_session_pdf(grown)))
+        print(f"{turns:>6}" + "".join(f"{v:>10.1f}" for v in story_ms)
+              + "".join(f"{v:>10.3f}" for v in export_s)
+              + f"{len(legacy_story(history)):>13}/{len(story(history))}")
+    print(f"\nturn cache: {compiled_turn.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
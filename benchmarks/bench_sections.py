@@ -0,0 +1,75 @@
+"""
+Single-pass section parser vs. the five per-section regex scans it replaced.
+
+    python -m benchmarks.bench_sections
+"""
+from __future__ import annotations
+
+import re
+import timeit
+
+from backend.services.sections import SECTIONS, SectionParser, parse_sections
+
+
+def regex_extract(text: str, section: str) -> str:
+    """The original implementation: one DOTALL regex search per section."""
+    pattern = rf"##[^#]*{re.escape(section)}.*?\n(.*?)(?=\n##|$)"
+    m = re.search(pattern, text, re.DOTALL | re.IGNORECASE)
+    return m.group(1).strip() if m else ""
+
+
+def regex_all(text: str) -> dict[str, str]:
+    return {key: regex_extract(text, section) for section, key in SECTIONS.items()}
+
+
+def regex_stream(chunks: list[str]) -> None:
+    """Streaming with regexes means re-scanning the accumulated text per chunk."""
+    text = ""
+    for chunk in chunks:
+        text += chunk
+        regex_all(text)
+
+
+def parser_stream(chunks: list[str]) -> None:
+    parser = SectionParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    parser.close()
+
+
+TYPICAL = (
+    "## 🔍 Clinical Reasoning\n" + "Fever and productive cough suggest infection. " * 20 + "\n\n"
+    "## 📋 Differential Diagnosis\n"
+    + "".join(f"**{i}. Diagnosis {i}** — rationale for this option.\n" for i in range(1, 6)) + "\n"
+    "## 🩺 Recommended Workup\n" + "- FBC, CRP, chest X-ray\n" * 6 + "\n"
+    "## 💊 Treatment Plan\n" + "Amoxicillin and supportive care. " * 15 + "\n\n"
+    "## ⚠️ Red Flags / Escalation\n" + "Hypoxia, confusion, hypotension. " * 5 + "\n\n"
+    "*This output is AI-generated and is for educational/research purposes only.*"
+)
+CASES = {
+    "typical (~600 tok)": TYPICAL,
+    "long (20x typical)": TYPICAL * 20,
+    "no headers": "plain prose without structure " * 2000,
+    "many '##' lines, no match": "## heading\nbody line\n" * 3000,
+    "one giant line": "## 🔍 Clinical Reasoning " + "x" * 200_000,
+}
+
+
+def main():
+    print(f"{'case':<28}{'regex x5 µs':>14}{'parser µs':>12}{'speed-up':>10}")
+    for name, text in CASES.items():
+        assert parse_sections(text) == regex_all(text), name
+        n = max(3, 2000 // max(1, len(text) // 1000))
+        old = timeit.timeit(lambda: regex_all(text), number=n) / n * 1e6
+        new = timeit.timeit(lambda: parse_sections(text), number=n) / n * 1e6
+        print(f"{name:<28}{old:>14.1f}{new:>12.1f}{old / new:>9.1f}x")
+
+    chunks = [TYPICAL[i:i + 4] for i in range(0, len(TYPICAL), 4)]     # ~token-sized deltas
+    old = timeit.timeit(lambda: regex_stream(chunks), number=5) / 5 * 1e3
+    new = timeit.timeit(lambda: parser_stream(chunks), number=5) / 5 * 1e3
+    print(f"\nstreaming {len(chunks)} chunks:  regex re-scan {old:.1f} ms, "
+          f"incremental parser {new:.2f} ms ({old / new:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
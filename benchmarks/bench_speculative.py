@@ -0,0 +1,71 @@
+"""
+Speculative decoding (prompt lookup, draft model) vs. plain greedy decoding.
+
+Times sequential greedy requests with chat-formatted prompts on a tiny random
+Llama and reports tokens/s, acceptance rate and tokens per model forward.
+A random model repeats itself far more than a trained one, so acceptance here
+is an upper bound; use ``/health`` on real traffic for representative numbers.
+
+    python -m benchmarks.bench_speculative --requests 10 --max-new-tokens 64
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import torch
+from transformers import AutoModelForCausalLM, AutoTokenizer
+
+from benchmarks.tiny_llama import CORPUS, build_tiny_llama
+from backend.services.inference import SYSTEM_PROMPT
+from backend.services.speculative import SpeculativeDecoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--hidden-size", type=int, default=512)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--draft-tokens", type=int, default=8)
+    args = parser.parse_args()
+
+    path = build_tiny_llama(hidden_size=args.hidden_size, num_layers=args.layers)
+    draft_path = build_tiny_llama(hidden_size=128, num_layers=1, seed=1)
+    tok = AutoTokenizer.from_pretrained(path)
+    model = AutoModelForCausalLM.from_pretrained(path).eval()
+    draft = AutoModelForCausalLM.from_pretrained(draft_path).eval()
+    prompts = [tok.apply_chat_template(
+        [{"role": "system", "content": SYSTEM_PROMPT},
+         {"role": "user", "content": CORPUS[i % len(CORPUS)]}],
+        add_generation_prompt=True, tokenize=False) for i in range(args.requests)]
+    prompts = [tok(p, add_special_tokens=False)["input_ids"] for p in prompts]
+
+    def greedy(ids: list[int]) -> list[int]:
+        with torch.inference_mode():
+            input_ids = torch.tensor([ids])     # explicit mask: pad id 0 is also BOS here
+            out = model.generate(input_ids, attention_mask=torch.ones_like(input_ids),
+                                 max_new_tokens=args.max_new_tokens, do_sample=False,
+                                 eos_token_id=None, pad_token_id=0)
+        return out[0, len(ids):].tolist()
+
+    decoder = SpeculativeDecoder(model, eos_token_ids=set(),
+                                 num_draft_tokens=args.draft_tokens, draft_model=draft)
+    greedy(prompts[0])                          # warm-up
+    start = time.perf_counter()
+    reference = [greedy(ids) for ids in prompts]
+    base = sum(map(len, reference)) / (time.perf_counter() - start)
+
+    print(f"{'mode':<16}{'tok/s':>9}{'speedup':>9}{'accept':>9}{'tok/fwd':>9}{'identical':>11}")
+    print(f"{'greedy':<16}{base:>9.1f}{1:>9.2f}{'-':>9}{1:>9.2f}{'-':>11}")
+    for mode in ("prompt_lookup", "draft_model"):
+        start = time.perf_counter()
+        outputs = [decoder.generate(ids, args.max_new_tokens, mode) for ids in prompts]
+        rate = sum(map(len, outputs)) / (time.perf_counter() - start)
+        stats = decoder.stats()[mode]
+        print(f"{mode:<16}{rate:>9.1f}{rate / base:>9.2f}{stats['acceptance_rate']:>9.2f}"
+              f"{stats['tokens_per_forward']:>9.2f}{str(outputs == reference):>11}")
+
+
+if __name__ == "__main__":
+    main()
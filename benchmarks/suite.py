@@ -0,0 +1,240 @@
+"""
+Component benchmark suite with a stored baseline and a regression gate.
+
+Runs offline on CPU: ``InferenceService.analyze`` on a tiny random Llama
+built locally, section parsing, ``SessionService`` at scale on the memory and
+SQLite stores, and ``export_session_pdf``.  Every metric is seconds per
+operation (lower is better, the fastest of several repeats).  The run is
+compared with ``benchmarks/baseline.json``; the exit status is 1 if any
+metric is slower than its baseline by more than ``--threshold``.
+
+    python -m benchmarks.suite                      # compare with the baseline
+    python -m benchmarks.suite --update             # record a new baseline
+    python -m benchmarks.suite --only sessions pdf --threshold 0.5
+
+Baselines only mean something on the machine that recorded them; the
+environment is stored alongside and a mismatch is reported.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from benchmarks.bench_sections import TYPICAL
+from benchmarks.tiny_llama import CORPUS, build_tiny_llama
+
+BASELINE = Path(__file__).with_name("baseline.json")
+
+
+def measure(fn: Callable[[], object], repeat: int = 5, number: int = 1) -> float:
+    """
+    Fastest seconds per call over ``repeat`` timings of ``number`` calls,
+    after one warm-up.  Noise from other load only ever adds time, so the
+    minimum is the most repeatable estimate; the collector is paused while
+    timing (as ``timeit`` does) so a collection triggered by earlier setup
+    does not land in one metric.
+    """
+    fn()
+    timings = []
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                fn()
+            timings.append((time.perf_counter() - start) / number)
+    finally:
+        gc.enable()
+    return min(timings)
+
+
+# ── benchmarks ────────────────────────────────────────────────────────────────
+
+def bench_analyze() -> dict[str, float]:
+    """End-to-end greedy analysis (response cache bypassed) on each decode path."""
+    from backend.core.config import get_settings
+    cfg = get_settings()
+    cfg.model_id = build_tiny_llama(hidden_size=128, num_layers=2)
+    cfg.device, cfg.torch_dtype = "cpu", "float32"
+    cfg.model_cache_dir = tempfile.mkdtemp(prefix="nemesis_models_")
+    cfg.max_new_tokens, cfg.cpu_profile, cfg.workers = 32, False, 1
+
+    from backend.services.inference import inference_service
+    inference_service._loaded = False
+    inference_service.load()
+    inference_service.response_cache.get = lambda key: None
+    calls = iter(range(10 ** 6))
+
+    def analyze(mode: str) -> Callable[[], object]:
+        return lambda: inference_service.analyze(
+            CORPUS[next(calls) % len(CORPUS)], deterministic=True, generation_mode=mode)
+
+    results = {
+        "analyze.batched_s": measure(analyze("standard")),
+        "analyze.prompt_lookup_s": measure(analyze("prompt_lookup")),
+    }
+    scheduler, inference_service.scheduler = inference_service.scheduler, None
+    try:
+        results["analyze.unbatched_s"] = measure(analyze("standard"))
+    finally:
+        inference_service.scheduler = scheduler
+    inference_service.shutdown()
+    inference_service._loaded = False
+    return results
+
+
+def bench_sections() -> dict[str, float]:
+    """Section extraction on a typical and a 20x response."""
+    from backend.services.sections import parse_sections
+    return {
+        "sections.typical_s": measure(lambda: parse_sections(TYPICAL), number=200),
+        "sections.long_s": measure(lambda: parse_sections(TYPICAL * 20), number=20),
+    }
+
+
+def bench_sessions() -> dict[str, float]:
+    """SessionService per-operation cost with 2,000 sessions of 20 turns each."""
+    from backend.services.session import SessionService
+    from backend.services.session_stores import MemorySessionStore, SQLiteSessionStore
+    sessions, turns = 2000, 20
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        stores = {
+            "memory": MemorySessionStore(sessions, turns, 3600),
+            "sqlite": SQLiteSessionStore(os.path.join(tmp, "bench.db"), turns, 3600,
+                                         flush_interval=0.2),
+        }
+        for name, store in stores.items():
+            service = SessionService(store)
+            start = time.perf_counter()
+            for t in range(turns):
+                for s in range(sessions):
+                    service.add_turn(f"s{s}", "user" if t % 2 == 0 else "assistant", TYPICAL)
+            if hasattr(store, "flush"):
+                store.flush()
+            results[f"sessions.{name}.append_s"] = \
+                (time.perf_counter() - start) / (sessions * turns)
+            ids = iter(range(10 ** 9))
+            results[f"sessions.{name}.get_s"] = measure(
+                lambda: service.get_chat_pairs(f"s{next(ids) % sessions}"), number=200)
+            results[f"sessions.{name}.count_s"] = measure(service.active_sessions, number=5)
+            results[f"sessions.{name}.list_s"] = measure(service.list_sessions)
+            service.close()
+    return results
+
+
+def bench_pdf() -> dict[str, float]:
+    """PDF export of 10- and 100-turn sessions, cold (turn cache cleared) and cached."""
+    from benchmarks.bench_pdf_export import session
+    from backend.services.pdf_export import compiled_turn, export_session_pdf
+    results = {}
+    for turns in (10, 100):
+        history = session(turns)
+
+        def cold():
+            compiled_turn.cache_clear()
+            export_session_pdf(history)
+
+        results[f"pdf.{turns}_turns_cold_s"] = measure(cold, repeat=3)
+        results[f"pdf.{turns}_turns_cached_s"] = measure(lambda: export_session_pdf(history),
+                                                         repeat=3)
+    return results
+
+
+BENCHMARKS: dict[str, Callable[[], dict[str, float]]] = {
+    "analyze": bench_analyze,
+    "sections": bench_sections,
+    "sessions": bench_sessions,
+    "pdf": bench_pdf,
+}
+
+
+# ── baseline comparison ──────────────────────────────────────────────────────
+
+def environment() -> dict:
+    env = {"python": platform.python_version(), "machine": platform.machine(),
+           "cpus": os.cpu_count()}
+    try:
+        import torch
+        env["torch"] = torch.__version__
+        env["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return env
+
+
+def compare(results: dict[str, float], baseline: dict[str, float],
+            threshold: float) -> list[str]:
+    """Print a comparison table; return the metrics that regressed beyond ``threshold``."""
+    regressions = []
+    print(f"{'metric':<34}{'current':>12}{'baseline':>12}{'change':>9}")
+    for name, value in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<34}{_fmt(value):>12}{'-':>12}{'new':>9}")
+            continue
+        change = value / base - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<34}{_fmt(value):>12}{_fmt(base):>12}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def _fmt(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f} s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f} ms"
+    return f"{seconds * 1e6:.1f} µs"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--threshold", type=float,
+                        default=float(os.environ.get("BENCH_THRESHOLD", 0.25)),
+                        help="allowed slowdown as a fraction (default 0.25, or $BENCH_THRESHOLD)")
+    parser.add_argument("--update", action="store_true",
+                        help="write these results as the new baseline")
+    args = parser.parse_args()
+
+    results: dict[str, float] = {}
+    for name in args.only:
+        print(f"running {name} ...", file=sys.stderr)
+        results.update(BENCHMARKS[name]())
+
+    stored = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.update:
+        metrics = {**stored.get("metrics", {}), **results}
+        args.baseline.write_text(json.dumps(
+            {"environment": environment(), "metrics": metrics}, indent=2) + "\n")
+        compare(results, stored.get("metrics", {}), args.threshold)
+        print(f"\nbaseline written to {args.baseline}")
+        return 0
+
+    if stored.get("environment", environment()) != environment():
+        print(f"note: baseline recorded on {stored['environment']}, "
+              f"this run on {environment()}\n")
+    regressions = compare(results, stored.get("metrics", {}), args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} metric(s) more than {args.threshold:.0%} slower "
+              f"than the baseline: {', '.join(regressions)}")
+        return 1
+    print(f"\nno regressions beyond {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Builds a tiny, randomly initialised Llama-architecture checkpoint on disk.
+
+No download, no GPU: a byte-level BPE tokenizer is trained on the system prompt
+and a few clinical sentences, and paired with a Llama-3 style chat template so
+the checkpoint drops into ``InferenceService`` via ``MODEL_ID=<path>``.
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+
+CHAT_TEMPLATE = (
+    "{{ bos_token }}{% for m in messages %}"
+    "<|start_header_id|>{{ m['role'] }}<|end_header_id|>\n\n"
+    "{{ m['content'] | trim }}<|eot_id|>{% endfor %}"
+    "{% if add_generation_prompt %}<|start_header_id|>assistant<|end_header_id|>\n\n{% endif %}"
+)
+SPECIAL_TOKENS = ["<|begin_of_text|>", "<|end_of_text|>", "<|start_header_id|>",
+                  "<|end_header_id|>", "<|eot_id|>"]
+
+CORPUS = [
+    "45-year-old female, 3-day history of high fever, productive cough with "
+    "greenish sputum, right-sided pleuritic chest pain, mild dyspnoea on exertion.",
+    "Sudden onset severe headache, neck stiffness and photophobia since this morning.",
+    "Crushing central chest pain radiating to the left arm, sweating and nausea.",
+    "Community-acquired pneumonia, pulmonary embolism, acute coronary syndrome, "
+    "meningitis, subarachnoid haemorrhage, sepsis.",
+    "Full blood count, CRP, blood cultures, chest X-ray, ECG, troponin, CT head.",
+]
+
+
+def build_tiny_llama(
+    path: str | None = None,
+    hidden_size: int = 64,
+    num_layers: int = 2,
+    vocab_size: int = 512,
+    seed: int = 0,
+) -> str:
+    """Write the checkpoint to ``path`` (a temp dir by default) and return it."""
+    import torch
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import LlamaConfig, LlamaForCausalLM, PreTrainedTokenizerFast
+    from backend.services.inference import SYSTEM_PROMPT
+
+    path = path or tempfile.mkdtemp(prefix="tiny_llama_")
+    os.makedirs(path, exist_ok=True)
+
+    bpe = Tokenizer(models.BPE())
+    bpe.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    bpe.decoder = decoders.ByteLevel()
+    bpe.train_from_iterator([SYSTEM_PROMPT, *CORPUS], trainers.BpeTrainer(
+        vocab_size=vocab_size, special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    ))
+    tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=bpe,
+        bos_token="<|begin_of_text|>",
+        eos_token="<|eot_id|>",
+        pad_token="<|end_of_text|>",
+    )
+    tokenizer.chat_template = CHAT_TEMPLATE
+    tokenizer.save_pretrained(path)
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        intermediate_size=hidden_size * 2,
+        num_hidden_layers=num_layers,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=4096,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    LlamaForCausalLM(config).save_pretrained(path)
+    return path
@@ -2,17 +2,53 @@
 Gradio UI for LlamaTron RS1 Nemesis Clinical Decision Support Agent.
 Large, readable, professional medical interface.
 """
-import os, uuid, httpx, gradio as gr
+import asyncio, json, os, time, uuid, httpx, gradio as gr
 from backend.core.config import get_settings
 
 cfg = get_settings()
 API_BASE = f"http://127.0.0.1:{cfg.api_port}"
+# UI events handled at once; by default as many as the backend runs concurrently
+UI_CONCURRENCY = cfg.gradio_concurrency or cfg.inference_concurrency
+STREAM_REFRESH_S = 0.05     # coalesce tokens into at most ~20 UI updates per second
+
+# Singleton — one keep-alive connection pool shared by every UI session
+client = httpx.AsyncClient(
+    base_url=API_BASE,
+    timeout=httpx.Timeout(cfg.api_timeout_s, connect=5),
+    limits=httpx.Limits(max_connections=UI_CONCURRENCY + 4,
+                        max_keepalive_connections=UI_CONCURRENCY),
+)
 
 # ── helpers ──────────────────────────────────────────────────────────────────
 
-def analyze(symptoms: str, age: str, sex: str, session_id: str, history: list):
+async def _sse_events(response: httpx.Response):
+    """(event, data) pairs of a Server-Sent Events response."""
+    event, data = "message", []
+    async for line in response.aiter_lines():
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+
+
+def _api_error(r: httpx.Response) -> str:
+    try:
+        detail = r.json().get("detail", r.text)
+    except ValueError:
+        detail = r.text
+    retry = r.headers.get("Retry-After")
+    return f"{detail} — retry in {retry}s" if retry else str(detail)
+
+
+async def analyze(symptoms: str, age: str, sex: str, session_id: str, history: list):
+    """Streams the answer from /analyze/stream into the chat as it is generated."""
     if not symptoms.strip():
-        return history, session_id, "", "", "", ""
+        yield history, session_id, "", "", "", ""
+        return
 
     if not session_id:
         session_id = str(uuid.uuid4())[:8]
@@ -24,30 +60,42 @@ def analyze(symptoms: str, age: str, sex: str, session_id: str, history: list):
         "patient_sex": sex.lower() if sex else None,
     }
 
+    history = history + [{"role": "user", "content": symptoms},
+                         {"role": "assistant", "content": ""}]
+    reply = history[-1]
+    panels = {"reasoning": "", "differentials": "", "treatment": "", "red_flags": ""}
+
+    def update():
+        return (history, session_id, panels["reasoning"], panels["differentials"],
+                panels["treatment"], panels["red_flags"])
+
+    yield update()
     try:
-        r = httpx.post(f"{API_BASE}/analyze", json=payload, timeout=120)
-        r.raise_for_status()
-        data = r.json()
+        async with client.stream("POST", "/analyze/stream", json=payload) as r:
+            if r.status_code != 200:
+                await r.aread()
+                raise RuntimeError(_api_error(r))
+            last = 0.0
+            async for event, data in _sse_events(r):
+                if event == "token":
+                    reply["content"] += data["text"]
+                elif event == "section" and data["section"] in panels:
+                    panels[data["section"]] = data["content"]
+                elif event == "done":
+                    reply["content"] = data["full_response"]
+                    panels.update({k: data.get(k, "") for k in panels})
+                elif event == "error":
+                    raise RuntimeError(data["detail"])
+                if event != "token" or time.monotonic() - last >= STREAM_REFRESH_S:
+                    last = time.monotonic()
+                    yield update()
     except Exception as e:
-        error_msg = f"⚠️ API error: {e}"
-        history.append({"role": "user", "content": symptoms})
-        history.append({"role": "assistant", "content": error_msg})
-        return history, session_id, "", "", "", ""
-
-    history.append({"role": "user", "content": symptoms})
-    history.append({"role": "assistant", "content": data["full_response"]})
-
-    return (
-        history,
-        session_id,
-        data.get("reasoning", ""),
-        data.get("differentials", ""),
-        data.get("treatment", ""),
-        data.get("red_flags", ""),
-    )
+        reply["content"] = (reply["content"] + "\n\n" if reply["content"] else "") + \
+            f"⚠️ API error: {e}"
+    yield update()
 
 
-def export_pdf(session_id: str, age: str, sex: str):
+async def export_pdf(session_id: str, age: str, sex: str):
     if not session_id:
         return None
     payload = {
@@ -56,8 +104,18 @@ def export_pdf(session_id: str, age: str, sex: str):
         "patient_sex": sex.lower() if sex else None,
     }
     try:
-        r = httpx.post(f"{API_BASE}/export-pdf", json=payload, timeout=60)
+        r = await client.post("/export-pdf", json=payload)
         r.raise_for_status()
+        if r.status_code == 202:            # large session: poll the export job
+            job = r.json()
+            deadline = time.monotonic() + 300
+            while job["status"] == "pending" and time.monotonic() < deadline:
+                await asyncio.sleep(1)
+                job = (await client.get(job["status_url"])).json()
+            if job["status"] != "done":
+                raise RuntimeError(job.get("error") or "export timed out")
+            r = await client.get(job["download_url"])
+            r.raise_for_status()
     except Exception as e:
         gr.Warning(f"PDF export failed: {e}")
         return None
@@ -68,10 +126,10 @@ def export_pdf(session_id: str, age: str, sex: str):
     return path
 
 
-def clear_session(session_id: str):
+async def clear_session(session_id: str):
     if session_id:
         try:
-            httpx.delete(f"{API_BASE}/history/{session_id}", timeout=10)
+            await client.delete(f"/history/{session_id}")
         except Exception:
             pass
     return [], str(uuid.uuid4())[:8], "", "", "", ""
@@ -417,6 +475,9 @@ with gr.Blocks(css=CSS, title="LlamaTron RS1 Nemesis — CDS Agent") as demo:
     )
 
 
+demo.queue(default_concurrency_limit=UI_CONCURRENCY)
+
+
 if __name__ == "__main__":
     demo.launch(
         server_port=cfg.gradio_port,
@@ -2,6 +2,15 @@
 set -e
 echo "🚀 Starting LlamaTron CDS Agent Backend..."
 source .env 2>/dev/null || true
+if [ "${WORKERS:-1}" -gt 1 ]; then
+  # export the weights once; every worker then memory-maps the same file
+  python -m backend.services.weights
+  exec python -m uvicorn backend.main:app \
+    --host "${API_HOST:-0.0.0.0}" \
+    --port "${API_PORT:-8000}" \
+    --workers "$WORKERS" \
+    --log-level info
+fi
 python -m uvicorn backend.main:app \
   --host "${API_HOST:-0.0.0.0}" \
   --port "${API_PORT:-8000}" \
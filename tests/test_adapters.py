@@ -0,0 +1,143 @@
+"""
+LoRA adapters: per-row batched updates over one base model, LRU residency.
+"""
+import copy
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from safetensors.torch import load_file, save_file
+
+from benchmarks.tiny_llama import build_tiny_llama
+from backend.services.adapters import AdapterRegistry, adapter_rows
+from backend.services.lora import LoRALinear
+
+TARGETS = ("q_proj", "v_proj")
+
+
+def make_adapter(model, directory, seed: int, r: int = 4, alpha: int = 8):
+    """Write a random PEFT-format LoRA adapter for ``model``; returns {module: (A, B)}."""
+    gen = torch.Generator().manual_seed(seed)
+    tensors, pairs = {}, {}
+    for name, module in model.named_modules():
+        if name.rsplit(".", 1)[-1] in TARGETS:
+            module = module.base if isinstance(module, LoRALinear) else module
+            a = torch.randn(r, module.in_features, generator=gen) * 0.1
+            b = torch.randn(module.out_features, r, generator=gen) * 0.1
+            tensors[f"base_model.model.{name}.lora_A.weight"] = a
+            tensors[f"base_model.model.{name}.lora_B.weight"] = b
+            pairs[name] = (a, b)
+    directory.mkdir(parents=True)
+    save_file(tensors, str(directory / "adapter_model.safetensors"))
+    (directory / "adapter_config.json").write_text(json.dumps(
+        {"r": r, "lora_alpha": alpha, "target_modules": list(TARGETS), "peft_type": "LORA"}))
+    return pairs
+
+
+def merged(model, pairs, scale: float = 2.0):
+    """A copy of ``model`` with the adapter folded into its weights."""
+    merged = copy.deepcopy(model)
+    for name, (a, b) in pairs.items():
+        merged.get_submodule(name).weight.data += scale * (b @ a)
+    return merged
+
+
+@pytest.fixture(scope="module")
+def checkpoint(tmp_path_factory):
+    return build_tiny_llama(str(tmp_path_factory.mktemp("tiny_llama")))
+
+
+@pytest.fixture()
+def base(checkpoint):
+    return transformers.AutoModelForCausalLM.from_pretrained(checkpoint).eval()
+
+
+def test_mixed_batch_matches_merged_models(base, tmp_path):
+    pairs = {name: make_adapter(base, tmp_path / "adapters" / name, seed)
+             for seed, name in enumerate(["cardio", "neuro"])}
+    references = [merged(base, pairs["cardio"]), copy.deepcopy(base), merged(base, pairs["neuro"])]
+    registry = AdapterRegistry(str(tmp_path / "adapters"), 2 ** 20)
+    registry.attach(base)
+    ids = torch.tensor([[1, 5, 9, 42, 7]] * 3)
+    with registry.use("cardio"), registry.use("neuro"), torch.inference_mode():
+        with adapter_rows(("cardio", None, "neuro")):
+            logits = base(ids).logits
+        expected = torch.cat([ref(ids[:1]).logits for ref in references])
+    assert torch.allclose(logits, expected, atol=1e-5)
+    with torch.inference_mode():        # nothing selected: the base model, unchanged
+        assert torch.allclose(base(ids[:1]).logits, references[1](ids[:1]).logits)
+    assert sum(isinstance(m, LoRALinear) for m in base.modules()) == 2 * len(TARGETS)
+
+
+def test_idle_adapters_are_evicted_lru(base, tmp_path):
+    for seed, name in enumerate(["a", "b", "c"]):
+        make_adapter(base, tmp_path / "adapters" / name, seed)
+    registry = AdapterRegistry(str(tmp_path / "adapters"), 0)
+    registry.attach(base)
+    size = None
+    with registry.use("a"):
+        size = registry.stats()["bytes"]
+    registry.budget_bytes = 2 * size
+    for name in ("a", "b", "c"):
+        with registry.use(name):
+            pass
+    stats = registry.stats()
+    assert stats["available"] == ["a", "b", "c"]
+    assert stats["loaded"] == ["b", "c"] and stats["bytes"] == 2 * size
+    registry.budget_bytes = 0
+    with registry.use("b"):             # pinned while in use, even over budget
+        assert registry.stats()["loaded"] == ["b"]
+    assert registry.stats()["loaded"] == []
+    with pytest.raises(ValueError):
+        with registry.use("../a"):
+            pass
+
+
+def test_invalid_adapter_leaves_the_model_untouched(base, tmp_path):
+    make_adapter(base, tmp_path / "adapters" / "broken", 0)
+    weights = tmp_path / "adapters" / "broken" / "adapter_model.safetensors"
+    tensors = load_file(str(weights))
+    del tensors[sorted(k for k in tensors if "lora_B" in k)[-1]]
+    save_file(tensors, str(weights))
+    registry = AdapterRegistry(str(tmp_path / "adapters"), 2 ** 20)
+    registry.attach(base)
+    with pytest.raises(ValueError, match="lacks lora_A or lora_B"):
+        with registry.use("broken"):
+            pass
+    assert not any(isinstance(m, LoRALinear) for m in base.modules())
+    assert registry.stats()["loaded"] == []
+
+
+def test_adapter_loads_outside_the_registry_lock(base, tmp_path, monkeypatch):
+    from backend.services import lora
+
+    make_adapter(base, tmp_path / "adapters" / "slow", 0)
+    registry = AdapterRegistry(str(tmp_path / "adapters"), 2 ** 20)
+    registry.attach(base)
+    started, release = threading.Event(), threading.Event()
+    real_load = lora.load_adapter
+
+    def gated_load(*args):
+        started.set()
+        assert release.wait(10)
+        return real_load(*args)
+
+    monkeypatch.setattr(lora, "load_adapter", gated_load)
+
+    def run():
+        with registry.use("slow"):
+            pass
+
+    users = [threading.Thread(target=run) for _ in range(2)]
+    for user in users:
+        user.start()
+    assert started.wait(10)
+    with ThreadPoolExecutor(1) as pool:         # answered while the read is in progress
+        assert pool.submit(registry.stats).result(timeout=5)["loaded"] == []
+    release.set()
+    for user in users:
+        user.join(10)
+    assert registry.stats()["loaded"] == ["slow"] and registry.loads == 1
@@ -2,6 +2,10 @@
 Basic integration tests for the FastAPI backend.
 Run with: pytest tests/ -v
 """
+import json
+import subprocess
+import sys
+import time
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock
@@ -20,7 +24,10 @@ with patch("backend.services.inference.InferenceService.load"), \
      patch("backend.services.inference.InferenceService.analyze",
            return_value=mock_result):
     from backend.main import app
+    from backend.services.inference import inference_service
 
+# a bare TestClient skips the lifespan, so the background load never runs
+inference_service.state = "ready"
 client = TestClient(app)
 
 
@@ -62,3 +69,208 @@ def test_analyze_validation():
         "symptoms": "x",    # too short — min 5 chars
     })
     assert r.status_code == 422
+
+
+def test_not_ready_until_loaded():
+    assert client.get("/livez").status_code == 200
+    assert client.get("/readyz").json() == {"status": "ready"}
+    with patch.object(inference_service, "state", "loading"), \
+         patch("backend.services.inference.inference_service.analyze") as analyze:
+        r = client.post("/analyze", json={"session_id": "cold", "symptoms": "Fever and cough"})
+        ready = client.get("/readyz")
+        assert client.get("/livez").status_code == 200
+    assert r.status_code == 503 and r.headers["Retry-After"]
+    assert not analyze.called
+    assert ready.status_code == 503 and ready.json()["status"] == "loading"
+
+
+def test_app_import_leaves_torch_unloaded():
+    code = "import sys, backend.main; print(sorted({'torch', 'transformers'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_health_reports_queue_depth():
+    r = client.get("/health")
+    assert set(r.json()["inference_queue"]) >= {"in_flight", "queued"}
+
+
+def test_analyze_rejected_when_queue_full():
+    from backend.services.executor import QueueFullError
+    with patch("backend.services.executor.inference_executor.run",
+               side_effect=QueueFullError(retry_after=7)):
+        r = client.post("/analyze", json={
+            "session_id": "busy",
+            "symptoms": "Fever and cough for 3 days",
+        })
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "7"
+
+
+def test_executor_bounds_admission():
+    import asyncio, threading
+    from backend.services.executor import InferenceExecutor, QueueFullError
+
+    async def scenario():
+        executor = InferenceExecutor(max_concurrency=1, max_queue=1)
+        gate = threading.Event()
+        running = [asyncio.ensure_future(executor.run(gate.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert (executor.in_flight, executor.queued) == (1, 1)
+        with pytest.raises(QueueFullError):
+            await executor.run(gate.wait)
+        gate.set()
+        await asyncio.gather(*running)
+        executor.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_analyze_stream_emits_tokens_sections_and_done():
+    text = ("## 🔍 Clinical Reasoning\nViral picture.\n"
+            "## 📋 Differential Diagnosis\n**1. Influenza** — fever, cough\n")
+
+    def fake_analyze(on_text=None, **kwargs):
+        for i in range(0, len(text), 10):
+            on_text(text[i:i + 10])
+        return {**mock_result, "full_response": text}
+
+    client.delete("/history/stream1")
+    with patch("backend.services.inference.inference_service.analyze",
+               side_effect=fake_analyze):
+        r = client.post("/analyze/stream", json={
+            "session_id": "stream1",
+            "symptoms": "Fever and cough for 3 days",
+        })
+    assert r.status_code == 200
+    events = [block.split("\n", 1) for block in r.text.strip().split("\n\n")]
+    names = [e[0].removeprefix("event: ") for e in events]
+    assert names[0] == "token" and names[-1] == "done"
+    sections = [json.loads(e[1].removeprefix("data: ")) for e in events
+                if e[0] == "event: section"]
+    assert [s["section"] for s in sections] == ["reasoning", "differentials"]
+    assert sections[0]["content"] == "Viral picture."
+    assert len(client.get("/history/stream1").json()["turns"]) == 2
+
+
+def test_export_pdf_small_sync_large_job(tmp_path):
+    from backend.services.pdf_jobs import pdf_renderer
+    from backend.services.session import session_service
+    client.delete("/history/pdf1")
+    session_service.add_turn("pdf1", "user", "Fever and cough for 3 days")
+    session_service.add_turn("pdf1", "assistant", "## 🔍 Clinical Reasoning\nViral.")
+    with patch.object(pdf_renderer, "jobs_dir", tmp_path):
+        r = client.post("/export-pdf", json={"session_id": "pdf1"})
+        assert r.status_code == 200 and r.content.startswith(b"%PDF")
+
+        with patch("backend.routers.export.cfg.pdf_sync_max_turns", 1):
+            r = client.post("/export-pdf", json={"session_id": "pdf1"})
+        assert r.status_code == 202
+        job = r.json()
+        assert r.headers["Location"] == job["status_url"]
+        for _ in range(600):
+            if client.get(job["status_url"]).json()["status"] != "pending":
+                break
+            time.sleep(0.05)
+        r = client.get(job["download_url"])
+        assert r.status_code == 200 and r.content.startswith(b"%PDF")
+    assert client.get("/export-pdf/jobs/unknown").status_code == 404
+    client.delete("/history/pdf1")
+
+
+def test_bulk_export_streams_zip_with_manifest():
+    import io, zipfile
+    from backend.services.session import session_service
+    for sid in ("bulk1", "bulk/2"):
+        client.delete(f"/history/{sid}")
+        session_service.add_turn(sid, "user", "Fever and cough for 3 days")
+    r = client.post("/export-pdf/bulk", json={"session_ids": ["bulk1", "bulk/2", "nobody"]})
+    assert r.status_code == 200 and r.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(r.content))
+    assert sorted(archive.namelist()) == ["manifest.json", "nemesis_bulk1.pdf", "nemesis_bulk_2.pdf"]
+    assert archive.read("nemesis_bulk1.pdf").startswith(b"%PDF")
+    manifest = {m["session_id"]: m["status"] for m in json.loads(archive.read("manifest.json"))}
+    assert manifest == {"bulk1": "ok", "bulk/2": "ok", "nobody": "empty"}
+
+    # ids that sanitise to the same name get distinct entries
+    session_service.add_turn("bulk_2", "user", "Headache")
+    r = client.post("/export-pdf/bulk", json={"session_ids": ["bulk/2", "bulk_2"]})
+    archive = zipfile.ZipFile(io.BytesIO(r.content))
+    files = {m["session_id"]: m["file"] for m in json.loads(archive.read("manifest.json"))}
+    assert sorted(files.values()) == ["nemesis_bulk_2.pdf", "nemesis_bulk_2_2.pdf"]
+    assert sorted(archive.namelist()) == ["manifest.json", *sorted(files.values())]
+    session_service.clear("bulk_2")
+
+    r = client.post("/export-pdf/bulk", json={"since": "2000-01-01T00:00:00"})
+    names = zipfile.ZipFile(io.BytesIO(r.content)).namelist()
+    assert {"nemesis_bulk1.pdf", "nemesis_bulk_2.pdf"} <= set(names)
+    assert client.post("/export-pdf/bulk", json={}).status_code == 400
+    for sid in ("bulk1", "bulk/2"):
+        session_service.clear(sid)
+
+
+def test_metrics_endpoint():
+    client.get("/history/metrics1")
+    r = client.get("/metrics")
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/plain")
+    assert "# TYPE nemesis_stage_seconds histogram" in r.text
+    assert 'nemesis_session_store_seconds_count{op="get"}' in r.text
+    assert "nemesis_requests_in_flight 0" in r.text
+    assert "process_resident_memory_bytes " in r.text
+
+
+def test_metrics_scrape_reuses_recent_session_count(monkeypatch):
+    from backend.services.session import session_service
+    counts = []
+    monkeypatch.setattr(session_service, "_counted_at", float("-inf"))
+    monkeypatch.setattr(session_service.store, "count", lambda: counts.append(1) or 7)
+    for _ in range(3):
+        assert "nemesis_active_sessions 7" in client.get("/metrics").text
+    assert len(counts) == 1
+
+
+def test_profiled_request_is_retrievable(tmp_path):
+    from backend.services.profiling import request_profiler
+    with patch.object(request_profiler, "enabled", True), \
+         patch.object(request_profiler, "directory", tmp_path), \
+         patch.object(request_profiler, "torch_trace", False), \
+         patch("backend.services.inference.inference_service.analyze",
+               return_value=mock_result):
+        r = client.post("/analyze", headers={"X-Profile": "1"}, json={
+            "session_id": "prof1",
+            "symptoms": "Fever and cough for 3 days",
+        })
+        assert r.status_code == 200
+        profile_id = r.headers["X-Profile-Id"]
+        listing = client.get(f"/profiles/{profile_id}").json()
+        assert set(listing["artefacts"]) == {"pstats", "summary"}
+        summary = client.get(listing["artefacts"]["summary"])
+        assert summary.status_code == 200 and profile_id in summary.text
+        r = client.post("/analyze", json={"session_id": "prof1",
+                                          "symptoms": "Fever and cough for 3 days"})
+        assert "X-Profile-Id" not in r.headers
+    assert client.get("/profiles/unknown").status_code == 404
+    client.delete("/history/prof1")
+
+
+def test_profile_header_and_retrieval_need_a_real_profile(tmp_path, monkeypatch):
+    from backend.core.config import get_settings
+    from backend.services.profiling import request_profiler
+    (tmp_path / "abc123.txt").write_text("summary")
+    monkeypatch.setattr(request_profiler, "directory", tmp_path)
+    monkeypatch.setattr(request_profiler, "torch_trace", False)
+    assert client.get("/profiles/abc123/summary").status_code == 404    # profiling off
+    monkeypatch.setattr(request_profiler, "enabled", True)
+    monkeypatch.setattr(get_settings(), "profile_token", "s3cret")
+    assert client.get("/profiles/abc123").status_code == 403
+    r = client.get("/profiles/abc123/summary", headers={"X-Profile": "s3cret"})
+    assert r.status_code == 200 and r.text == "summary"
+    busy = request_profiler.claim("s3cret")         # another request holds the profilers
+    assert busy is not None
+    with patch("backend.services.inference.inference_service.analyze",
+               return_value=mock_result):
+        r = client.post("/analyze", headers={"X-Profile": "s3cret"},
+                        json={"session_id": "prof2", "symptoms": "Fever and cough for 3 days"})
+    request_profiler.release(busy)
+    assert r.status_code == 200 and "X-Profile-Id" not in r.headers
+    client.delete("/history/prof2")
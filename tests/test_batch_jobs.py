@@ -0,0 +1,126 @@
+"""
+Offline batch jobs: checkpointed runs, resume, and the /analyze/batch API.
+"""
+import io
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from backend.main import app
+from backend.services.batch_jobs import BatchJobManager, batch_jobs
+
+client = TestClient(app)
+
+
+def _wait(manager, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job.status not in ("queued", "running"):
+            return job
+        time.sleep(0.02)
+    raise TimeoutError(job_id)
+
+
+def _lines(manager, job_id):
+    return [json.loads(line) for line in manager.results_path(job_id).read_text().splitlines()]
+
+
+def test_job_runs_every_case_and_records_failures(tmp_path):
+    manager = BatchJobManager(str(tmp_path), concurrency=3)
+    cases = [json.dumps({"n": i}) for i in range(6)] + ["not json", ""]
+    job = manager.create(io.BytesIO("\n".join(cases).encode()))
+    assert job.total == 7
+    manager.start(job.job_id, lambda index, case: {"double": case["n"] * 2})
+    job = _wait(manager, job.job_id)
+    assert (job.status, job.completed, job.failed) == ("completed", 6, 1)
+    records = {r["index"]: r for r in _lines(manager, job.job_id)}
+    assert sorted(records) == list(range(7))
+    assert records[4]["result"] == {"double": 8} and "error" in records[6]
+
+
+def test_resume_skips_checkpointed_cases_and_torn_line(tmp_path):
+    manager = BatchJobManager(str(tmp_path), concurrency=2)
+    job = manager.create(io.BytesIO(b"\n".join(b'{"n": %d}' % i for i in range(5))))
+    with open(manager.results_path(job.job_id), "w") as f:
+        f.write('{"index": 0, "result": {}}\n{"index": 3, "result": {}}\n{"index": 1, "res')
+    seen = []
+    manager.start(job.job_id, lambda index, case: seen.append(index) or {})
+    job = _wait(manager, job.job_id)
+    assert sorted(seen) == [1, 2, 4]
+    assert job.completed == 5
+    assert sorted(r["index"] for r in _lines(manager, job.job_id)) == list(range(5))
+
+
+def test_cancel_reaches_a_job_run_by_another_worker(tmp_path):
+    runner, other = (BatchJobManager(str(tmp_path), concurrency=1) for _ in range(2))
+    job = runner.create(io.BytesIO(b"\n".join(b'{"n": %d}' % i for i in range(50))))
+    release = threading.Event()
+    runner.start(job.job_id, lambda index, case: release.wait(5) and {})
+    other.cancel(job.job_id)                    # lands on a process not running it
+    release.set()
+    job = _wait(runner, job.job_id)
+    assert job.status == "cancelled" and job.completed < 50
+    runner._runners[job.job_id].join(timeout=10)
+    runner.start(job.job_id, lambda index, case: {})     # resuming clears the request
+    runner._runners[job.job_id].join(timeout=10)
+    assert runner.get(job.job_id).status == "completed"
+
+
+def test_resume_reruns_failed_cases(tmp_path):
+    manager = BatchJobManager(str(tmp_path), concurrency=2)
+    job = manager.create(io.BytesIO(b"\n".join(b'{"n": %d}' % i for i in range(3))))
+    manager.start(job.job_id, lambda index, case: 1 / (index != 1) and {})
+    manager._runners[job.job_id].join(timeout=10)
+    assert (manager.get(job.job_id).completed, manager.get(job.job_id).failed) == (2, 1)
+    seen = []
+    manager.start(job.job_id, lambda index, case: seen.append(index) or {})
+    manager._runners[job.job_id].join(timeout=10)
+    job = manager.get(job.job_id)
+    assert seen == [1] and (job.status, job.completed, job.failed) == ("completed", 3, 0)
+    assert [r for r in _lines(manager, job.job_id) if r["index"] == 1][-1]["result"] == {}
+
+
+def test_job_waits_for_the_model_to_be_ready(tmp_path):
+    ready = threading.Event()
+    manager = BatchJobManager(str(tmp_path), concurrency=1, ready=ready.is_set)
+    job = manager.create(io.BytesIO(b'{"n": 0}\n{"n": 1}'))
+    seen = []
+    manager.start(job.job_id, lambda index, case: seen.append(index) or {})
+    time.sleep(0.2)
+    assert seen == [] and manager.get(job.job_id).status == "queued"
+    ready.set()
+    job = _wait(manager, job.job_id)
+    assert (job.status, job.completed, sorted(seen)) == ("completed", 2, [0, 1])
+
+
+def test_batch_api_streams_results_without_touching_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch_jobs, "root", tmp_path)
+    monkeypatch.setattr(batch_jobs, "ready", lambda: True)
+    result = {"full_response": "ok", "reasoning": "", "differentials": "Flu", "workup": "",
+              "treatment": "", "red_flags": "", "cache": "bypass"}
+    body = "\n".join(json.dumps({"symptoms": f"fever for {i} days"}) for i in range(4))
+    body += "\n" + json.dumps({"symptoms": "no"})            # fails AnalyzeRequest validation
+    with patch("backend.services.inference.inference_service.analyze", return_value=result):
+        r = client.post("/analyze/batch", files={"file": ("cases.jsonl", body)})
+        assert r.status_code == 202
+        job_id = r.json()["job_id"]
+        _wait(batch_jobs, job_id)
+        r = client.get(f"/analyze/batch/{job_id}/results")
+    records = [json.loads(line) for line in r.text.splitlines()]
+    assert len(records) == 5
+    ok = [rec for rec in records if "result" in rec]
+    assert len(ok) == 4 and {rec["result"]["session_id"] for rec in ok} == \
+        {f"case-{i}" for i in range(4)}
+    status = client.get(f"/analyze/batch/{job_id}").json()
+    assert (status["status"], status["completed"], status["failed"]) == ("completed", 4, 1)
+    assert client.get("/history/case-0").status_code == 404
+
+
+def test_batch_api_rejects_paths_outside_input_root():
+    r = client.post("/analyze/batch", data={"path": "/etc/passwd"})
+    assert r.status_code == 400
+    assert client.get("/analyze/batch/doesnotexist").status_code == 404
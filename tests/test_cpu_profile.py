@@ -0,0 +1,35 @@
+"""
+CPU inference profile: int8 quantisation keeps the model usable and the LM head in float.
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from benchmarks.tiny_llama import build_tiny_llama
+from backend.core.config import Settings
+from backend.services.cpu_profile import apply_cpu_profile
+
+
+@pytest.fixture(scope="module")
+def tiny_path(tmp_path_factory):
+    return build_tiny_llama(str(tmp_path_factory.mktemp("tiny_llama")))
+
+
+def test_int8_profile_quantises_decoder_linears(tiny_path):
+    reference = transformers.AutoModelForCausalLM.from_pretrained(tiny_path).eval()
+    model = transformers.AutoModelForCausalLM.from_pretrained(tiny_path).eval()
+    model = apply_cpu_profile(model, Settings(cpu_int8=True, cpu_compile=False))
+    linears = {name: type(m).__module__ for name, m in model.named_modules()
+               if type(m).__name__ == "Linear"}
+    assert "quantized" not in linears.pop("lm_head")
+    assert linears and all("quantized" in module for module in linears.values())
+
+    ids = torch.tensor([[1, 5, 9, 42, 7, 3]])
+    with torch.inference_mode():
+        ref, got = reference(ids).logits, model(ids).logits
+        out = model.generate(ids, max_new_tokens=4, do_sample=False,
+                             eos_token_id=None, pad_token_id=0)
+    assert got.shape == ref.shape
+    assert torch.allclose(got, ref, atol=0.05)
+    assert out.shape[1] == ids.shape[1] + 4
@@ -0,0 +1,141 @@
+"""
+Section-aware generation through InferenceService on a tiny random Llama.
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from benchmarks.tiny_llama import build_tiny_llama
+from backend.core.config import get_settings
+from backend.services.inference import inference_service
+
+
+@pytest.fixture(scope="module")
+def service(tmp_path_factory):
+    cfg = get_settings()
+    overrides = {
+        "model_id": build_tiny_llama(str(tmp_path_factory.mktemp("tiny_llama"))),
+        "model_cache_dir": str(tmp_path_factory.mktemp("models")),
+        "device": "cpu", "torch_dtype": "float32", "max_new_tokens": 40,
+        "cpu_profile": False, "workers": 1, "section_token_budgets": {},
+    }
+    saved = {name: getattr(cfg, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(cfg, name, value)
+    inference_service._loaded = False
+    inference_service.load_in_background().join()
+    assert inference_service.ready
+    yield inference_service
+    inference_service.shutdown()
+    inference_service._loaded = False
+    for name, value in saved.items():
+        setattr(cfg, name, value)
+
+
+def _analyze(service, monkeypatch, **kwargs):
+    monkeypatch.setattr(service.response_cache, "get", lambda key: None)
+    streamed = []
+    result = service.analyze("fever and cough for three days", deterministic=True,
+                             on_text=streamed.append, **kwargs)
+    return result, "".join(streamed)
+
+
+def test_subset_with_budgets_is_steered_identically_on_every_path(service, monkeypatch):
+    monkeypatch.setattr(get_settings(), "section_token_budgets",
+                        {"differentials": 6, "red_flags": 6})
+    results = []
+    result, streamed = _analyze(service, monkeypatch, sections=["differentials", "red_flags"])
+    results.append(result)
+    result_spec, _ = _analyze(service, monkeypatch, sections=["differentials", "red_flags"],
+                              generation_mode="prompt_lookup")
+    results.append(result_spec)
+    scheduler, service.scheduler = service.scheduler, None
+    try:
+        results.append(_analyze(service, monkeypatch, sections=["differentials", "red_flags"])[0])
+    finally:
+        service.scheduler = scheduler
+
+    text = result["full_response"]
+    assert text.startswith("## 📋 Differential Diagnosis\n")
+    assert "## ⚠️ Red Flags / Escalation\n" in text
+    assert result["differentials"] and result["red_flags"]
+    assert not (result["reasoning"] or result["workup"] or result["treatment"])
+    assert streamed.strip() == text
+    assert all(r["full_response"] == text for r in results)
+
+
+def test_unknown_section_is_rejected(service):
+    with pytest.raises(ValueError):
+        service.analyze("fever and cough", sections=["prognosis"])
+
+
+def test_generation_records_stage_metrics(service, monkeypatch):
+    from backend.services.metrics import GENERATED_TOKENS, STAGE_SECONDS
+    before = GENERATED_TOKENS.labels().value
+    decodes = STAGE_SECONDS.labels("decode").counts[:]
+    _analyze(service, monkeypatch)
+    assert GENERATED_TOKENS.labels().value > before
+    assert sum(STAGE_SECONDS.labels("decode").counts) == sum(decodes) + 1
+    for stage in ("template", "tokenize", "prefill", "sections"):
+        assert sum(STAGE_SECONDS.labels(stage).counts) > 0
+
+
+def test_profiled_analysis_decodes_on_its_own_thread(service, monkeypatch, tmp_path):
+    from backend.services.profiling import RequestProfiler
+    profiler = RequestProfiler(True, str(tmp_path))
+    monkeypatch.setattr(service.response_cache, "get", lambda key: None)
+    monkeypatch.setattr(service.scheduler, "generate", None)    # must not be used
+    profiler.run("tiny", service.analyze, "fever and cough for three days", deterministic=True)
+    assert "aten::linear" in profiler.artefacts("tiny")["summary"].read_text()
+
+
+def test_adapter_requests_batch_with_base_requests(service, monkeypatch, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from tests.test_adapters import make_adapter
+    make_adapter(service.model, tmp_path / "cardio", seed=1, alpha=64)
+    monkeypatch.setattr(service.adapters, "directory", tmp_path)
+    monkeypatch.setattr(service.response_cache, "get", lambda key: None)
+
+    def run(model):
+        return service.analyze("fever and cough for three days", deterministic=True,
+                               model=model)["full_response"]
+
+    with ThreadPoolExecutor(2) as pool:             # one continuous batch, mixed rows
+        batched = list(pool.map(run, [None, "cardio", None, "cardio"]))
+    scheduler, service.scheduler = service.scheduler, None
+    try:
+        alone = [run(None), run("cardio")]
+    finally:
+        service.scheduler = scheduler
+    assert batched == alone * 2
+    assert alone[0] != alone[1]
+    assert service.adapters.stats()["loaded"] == ["cardio"]
+    with pytest.raises(ValueError):
+        run("radiology")
+
+
+def test_misshaped_adapter_is_rejected_without_failing_the_batch(service, monkeypatch, tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+    from safetensors.torch import load_file, save_file
+    from tests.test_adapters import make_adapter
+    make_adapter(service.model, tmp_path / "wrong_rank", seed=2, r=4)
+    weights = str(tmp_path / "wrong_rank" / "adapter_model.safetensors")
+    tensors = load_file(weights)
+    key = sorted(k for k in tensors if "lora_B" in k)[-1]
+    tensors[key] = torch.zeros(tensors[key].shape[0], 7)     # rank 7 against lora_A's 4
+    save_file(tensors, weights)
+    monkeypatch.setattr(service.adapters, "directory", tmp_path)
+    monkeypatch.setattr(service.response_cache, "get", lambda key: None)
+
+    def run(model):
+        return service.analyze("fever and cough for three days", deterministic=True,
+                               model=model)["full_response"]
+
+    expected = run(None)
+    with ThreadPoolExecutor(2) as pool:
+        base, bad = pool.submit(run, None), pool.submit(run, "wrong_rank")
+        with pytest.raises(ValueError, match="lora_B has shape"):
+            bad.result()
+        assert base.result() == expected
+    assert "wrong_rank" not in service.adapters.stats()["loaded"]
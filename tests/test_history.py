@@ -0,0 +1,109 @@
+"""
+History compaction with a whitespace token counter.
+"""
+from backend.services.history import TURN_OVERHEAD, HistoryCompactor
+from backend.services.turns import Turn
+
+ANSWER = (
+    "## 🔍 Clinical Reasoning\n" + "long reasoning " * 50 + "\n"
+    "## 📋 Differential Diagnosis\n**1. Pneumonia** — fever, cough\n"
+    "## 💊 Treatment Plan\n" + "antibiotics " * 40 + "\n"
+    "## ⚠️ Red Flags / Escalation\nHypoxia\n"
+)
+
+
+def _session(n_pairs):
+    history = []
+    for i in range(n_pairs):
+        history.append({"role": "user", "content": f"turn {i} fever and cough"})
+        history.append({"role": "assistant", "content": ANSWER})
+    return history
+
+
+def _tokens(compactor, history):
+    return sum(compactor.count(t["content"]) + TURN_OVERHEAD for t in history)
+
+
+def test_old_answers_summarised_recent_kept_verbatim():
+    compactor = HistoryCompactor(lambda s: len(s.split()), budget=10_000, recent_pairs=1)
+    out = compactor.compact(_session(3))
+    assert len(out) == 6
+    assert out[-1]["content"] == ANSWER
+    assert "Pneumonia" in out[1]["content"] and "Hypoxia" in out[1]["content"]
+    assert "long reasoning" not in out[1]["content"]
+
+
+def test_prompt_tokens_stay_flat_as_session_grows():
+    calls = []
+    compactor = HistoryCompactor(lambda s: calls.append(s) or len(s.split()),
+                                 budget=400, recent_pairs=1)
+    sizes = [_tokens(compactor, compactor.compact(_session(n), reserved=50))
+             for n in (5, 20, 80)]
+    assert max(sizes) <= 350 and sizes[1] == sizes[2]
+    assert len(calls) == len(set(calls))          # every distinct turn tokenised once
+
+
+def test_window_never_splits_an_exchange():
+    compactor = HistoryCompactor(lambda s: len(s.split()), budget=60, recent_pairs=0)
+    out = compactor.compact(_session(10))
+    assert out and out[0]["role"] == "user" and len(out) % 2 == 0
+
+
+def test_consecutive_turns_share_a_prefix_until_overflow():
+    compactor = HistoryCompactor(lambda s: len(s.split()), budget=1000, recent_pairs=2)
+    history, previous, rebuilt = [], [], 0
+    for i in range(30):
+        prompt = compactor.compact(history, reserved=50, key="s1")
+        assert _tokens(compactor, prompt) <= 950
+        # all but the recent window of the previous prompt is reused verbatim —
+        # from its oldest answer, which has just been summarised, onwards
+        reused = max(len(previous) - 3, 0)
+        if prompt[:reused] != previous[:reused]:
+            rebuilt += 1
+            assert _tokens(compactor, previous) + 2 * (len(ANSWER.split()) + 10) > 950
+        previous = prompt
+        history += _session(1)
+    assert rebuilt <= 3
+
+def test_stored_turns_keep_their_token_count():
+    calls = []
+    compactor = HistoryCompactor(lambda s: calls.append(s) or len(s.split()),
+                                 budget=10_000, recent_pairs=5)
+    turns = [Turn(t["role"], t["content"], 0.0) for t in _session(3)]
+    for t in turns:
+        t.compress()
+    out = compactor.compact(turns)
+    assert out == [{"role": t["role"], "content": t["content"]} for t in _session(3)]
+    assert turns[1].tokens == len(ANSWER.split())
+    compactor._counts.clear()
+    compactor.compact(turns)
+    assert len(calls) == 6                              # the second pass tokenised nothing
+
+
+def test_cold_turns_are_never_decompressed_for_the_prompt(monkeypatch):
+    compactor = HistoryCompactor(lambda s: len(s.split()), budget=1000, recent_pairs=2)
+    turns = [Turn(t["role"], t["content"], 0.0) for t in _session(30)]
+    prompt = compactor.compact(turns, reserved=50, key="s1")
+    cold = compactor.cold(turns, "s1")
+    start = (len(turns) - len(prompt)) // 2             # pairs dropped
+    assert start > 0
+    assert {id(t) for t, _ in cold} == {id(t) for t in turns[:2 * start]} | \
+        {id(t) for t in turns[2 * start:-4] if t.role == "assistant"}
+    for turn, summary in cold:
+        turn.summary = summary
+        turn.compress()
+    monkeypatch.setattr("backend.services.turns.zlib.decompress", None)
+    assert compactor.compact(turns, reserved=50, key="s1") == prompt
+
+
+def test_window_survives_the_store_trimming_old_turns():
+    compactor = HistoryCompactor(lambda s: len(s.split()), budget=1000, recent_pairs=2)
+    turns = [Turn(t["role"], t["content"], float(i)) for i, t in enumerate(_session(30))]
+    prompt = compactor.compact(turns, reserved=50, key="s1")
+    dropped = (len(turns) - len(prompt)) // 2
+    assert dropped > 2
+    cold = {id(t) for t, _ in compactor.cold(turns, "s1")}
+    trimmed = turns[4:]                                 # max_turns dropped the two oldest pairs
+    assert compactor.compact(trimmed, reserved=50, key="s1") == prompt
+    assert {id(t) for t, _ in compactor.cold(trimmed, "s1")} == \
+        cold - {id(t) for t in turns[:4]}
@@ -0,0 +1,33 @@
+"""
+Metric types and their Prometheus text rendering.
+"""
+from backend.services.metrics import Registry, process_rss_bytes
+
+
+def test_render_counters_gauges_and_histograms():
+    registry = Registry()
+    requests = registry.counter("app_requests_total", "Requests", ("path",))
+    depth = registry.gauge("app_depth", "Depth")
+    broken = registry.gauge("app_broken", "Raises at scrape time")
+    latency = registry.histogram("app_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    requests.labels('/a"b').inc()
+    requests.labels('/a"b').inc(2)
+    depth.set_function(lambda: 3)
+    broken.set_function(lambda: 1 / 0)
+    for value in (0.05, 0.1, 0.5, 5.0):
+        latency.labels("decode").observe(value)
+
+    text = registry.render()
+    assert 'app_requests_total{path="/a\\"b"} 3' in text
+    assert "app_depth 3" in text
+    assert "# TYPE app_broken gauge" in text and "\napp_broken " not in text
+    assert 'app_seconds_bucket{stage="decode",le="0.1"} 2' in text
+    assert 'app_seconds_bucket{stage="decode",le="1"} 3' in text
+    assert 'app_seconds_bucket{stage="decode",le="+Inf"} 4' in text
+    assert 'app_seconds_count{stage="decode"} 4' in text
+    assert 'app_seconds_sum{stage="decode"} 5.65' in text
+    assert text.endswith("\n")
+
+
+def test_process_rss_is_positive():
+    assert process_rss_bytes() > 0
@@ -0,0 +1,51 @@
+"""
+PDF rendering in the process pool and the export job flow.
+"""
+import asyncio
+import time
+
+from backend.services.pdf_jobs import PdfRenderer
+
+HISTORY = [
+    {"role": "user", "content": "Fever and cough for 3 days", "timestamp": "2024-01-01T10:00"},
+    {"role": "assistant", "content": "## 🔍 Clinical Reasoning\nViral picture.\n"
+                                     "## 🚨 Red Flags\n⚠️ Hypoxia"},
+]
+
+
+def _wait(renderer: PdfRenderer, job_id: str, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    status = renderer.status(job_id)
+    while status["status"] == "pending" and time.monotonic() < deadline:
+        time.sleep(0.05)
+        status = renderer.status(job_id)
+    return status
+
+
+def test_render_and_job_produce_pdfs(tmp_path):
+    renderer = PdfRenderer(workers=1, jobs_dir=str(tmp_path), ttl_s=3600)
+    try:
+        pdf = asyncio.run(renderer.render(HISTORY, {"age": 30, "sex": "male"}))
+        assert pdf.startswith(b"%PDF")
+
+        job = renderer.submit(HISTORY * 20, session_id="big")
+        status = _wait(renderer, job["job_id"])
+        assert status["status"] == "done" and status["turns"] == 40
+        assert renderer.pdf_path(job["job_id"]).read_bytes()[:4] == b"%PDF"
+        assert status["bytes"] == renderer.pdf_path(job["job_id"]).stat().st_size
+    finally:
+        renderer.shutdown()
+
+
+def test_prune_removes_expired_jobs(tmp_path):
+    renderer = PdfRenderer(workers=1, jobs_dir=str(tmp_path), ttl_s=0)
+    try:
+        job = renderer.submit(HISTORY)
+        assert _wait(renderer, job["job_id"])["status"] == "done"
+        time.sleep(0.01)
+        renderer.prune()
+        assert renderer.status(job["job_id"]) is None
+        assert not renderer.pdf_path(job["job_id"]).exists()
+        assert renderer.status("../etc") is None
+    finally:
+        renderer.shutdown()
@@ -0,0 +1,54 @@
+"""
+Markdown → flowables compiler and the per-turn cache in the PDF export.
+"""
+from datetime import datetime
+
+from reportlab import rl_config
+from reportlab.platypus import HRFlowable, Paragraph
+
+from backend.services import pdf_export
+from backend.services.pdf_export import STYLES, compiled_turn, export_session_pdf
+from backend.services.pdf_markdown import MarkdownCompiler, inline
+
+RESPONSE = (
+    "## 🔍 Clinical Reasoning\n"
+    "SpO2 < 92% & fever.\n"
+    "Likely **pneumonia**, *not* viral.\n"
+    "\n"
+    "## 🩺 Recommended Workup\n"
+    "- Chest X-ray\n"
+    "2. `CRP`\n"
+    "---\n"
+    "## ⚠️ Red Flags / Escalation\n"
+    "Confusion or hypotension.\n"
+)
+
+
+def test_inline_escapes_and_marks_up():
+    assert inline("a < b & **c**") == "a &lt; b &amp; <b>c</b>"
+    assert inline("*x* and 2*3*4") == "<i>x</i> and 2*3*4"
+    assert inline("`CRP`") == '<font face="Courier">CRP</font>'
+
+
+def test_compile_merges_lines_and_styles_sections():
+    story = [f for f in MarkdownCompiler(STYLES).compile(RESPONSE)
+             if isinstance(f, (Paragraph, HRFlowable))]
+    kinds = [f.style.name if isinstance(f, Paragraph) else "rule" for f in story]
+    assert kinds == ["section_header", "body", "section_header", "bullet", "bullet",
+                     "rule", "section_header", "red_flag"]
+    assert story[1].text == "SpO2 &lt; 92% &amp; fever.<br/>Likely <b>pneumonia</b>, <i>not</i> viral."
+    assert [story[3].bulletText, story[4].bulletText] == ["•", "2."]
+
+
+def test_reexport_reuses_cached_turns_with_identical_output(monkeypatch):
+    monkeypatch.setattr(rl_config, "invariant", 1)
+    monkeypatch.setattr(pdf_export, "datetime",
+                        type("Frozen", (), {"utcnow": staticmethod(lambda: datetime(2026, 1, 1))}))
+    history = [{"role": "user", "content": "Cough & fever", "timestamp": "2026-01-01T10:00"},
+               {"role": "assistant", "content": RESPONSE * 30}]
+    compiled_turn.cache_clear()
+    first = export_session_pdf(history)
+    second = export_session_pdf(history)        # every turn from the cache
+    assert compiled_turn.cache_info().hits == 2
+    monkeypatch.setattr(pdf_export, "compiled_turn", compiled_turn.__wrapped__)
+    assert first == second == export_session_pdf(history)
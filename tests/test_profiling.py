@@ -0,0 +1,51 @@
+"""
+Opt-in request profiler: selection, artefacts and retention.
+"""
+import json
+import pstats
+
+import pytest
+
+from backend.core.config import get_settings
+from backend.services.profiling import RequestProfiler, profiling_active
+
+
+def test_wants_only_when_enabled(monkeypatch):
+    monkeypatch.setattr(get_settings(), "profile_token", "")
+    assert not RequestProfiler(False, "unused", sample_rate=1.0).wants("1")
+    profiler = RequestProfiler(True, "unused")
+    assert profiler.wants("1") and not profiler.wants(None)
+    assert RequestProfiler(True, "unused", sample_rate=1.0).wants(None)
+    monkeypatch.setattr(get_settings(), "profile_token", "s3cret")
+    assert not profiler.wants("1") and profiler.wants("s3cret")
+
+
+def test_claim_holds_the_profilers_until_released(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "profile_token", "")
+    profiler = RequestProfiler(True, str(tmp_path), torch_trace=False)
+    first = profiler.claim("1")
+    assert first is not None and profiler.claim("1") is None
+    assert profiler.run("other", profiling_active) is False      # runs unprofiled
+    assert profiler.run(first, profiling_active) is True
+    assert profiler.artefacts(first) and not profiler.artefacts("other")
+    assert profiler.claim("1") is not None                       # run released it
+
+def test_run_writes_artefacts_and_prunes(tmp_path):
+    torch = pytest.importorskip("torch")
+    profiler = RequestProfiler(True, str(tmp_path), keep=1)
+
+    def work(n):
+        assert profiling_active()
+        return torch.ones(n, n).matmul(torch.ones(n, n)).sum().item()
+
+    assert profiler.run("first", work, 8) == 512.0
+    assert not profiling_active()
+    found = profiler.artefacts("first")
+    assert set(found) == {"pstats", "summary", "trace"}
+    assert pstats.Stats(str(found["pstats"])).total_calls > 0
+    assert "aten::matmul" in found["summary"].read_text()
+    assert json.loads(found["trace"].read_text())["traceEvents"]
+
+    profiler.run("second", work, 2)
+    assert profiler.artefacts("first") == {} and profiler.artefacts("second")
+    assert profiler.artefacts("../x") == {}
@@ -0,0 +1,31 @@
+"""
+Response cache: key normalisation, LRU/TTL eviction and the SQLite tier.
+"""
+from backend.services.response_cache import ResponseCache, make_key
+
+MESSAGES = [{"role": "system", "content": "sys"},
+            {"role": "user", "content": "Fever and  cough\n"}]
+
+
+def test_key_normalises_whitespace_but_not_model_or_params():
+    same = [{"role": "system", "content": "sys"}, {"role": "user", "content": " Fever and cough"}]
+    assert make_key(MESSAGES, "m", {"n": 1}) == make_key(same, "m", {"n": 1})
+    assert make_key(MESSAGES, "m", {"n": 1}) != make_key(MESSAGES, "m2", {"n": 1})
+    assert make_key(MESSAGES, "m", {"n": 1}) != make_key(MESSAGES, "m", {"n": 2})
+
+
+def test_lru_and_ttl_eviction():
+    cache = ResponseCache(max_entries=2, ttl_seconds=60)
+    for key in "abc":
+        cache.put(key, {"full_response": key})
+    assert cache.get("a") is None and cache.get("c") == {"full_response": "c"}
+    cache.ttl_seconds = -1
+    assert cache.get("c") is None
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    ResponseCache(max_entries=8, ttl_seconds=60, path=path).put("k", {"full_response": "x"})
+    fresh = ResponseCache(max_entries=8, ttl_seconds=60, path=path)
+    assert fresh.get("k") == {"full_response": "x"}
+    assert fresh.stats()["hits"] == 1
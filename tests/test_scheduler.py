@@ -0,0 +1,157 @@
+"""
+Continuous batching scheduler against a tiny random Llama on CPU.
+"""
+import threading
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from benchmarks.tiny_llama import build_tiny_llama
+from backend.services.kv_cache import KVPrefix, PrefixCache, SessionKVCache, cache_layers
+from backend.services.scheduler import BatchScheduler, GenerationParams
+
+
+@pytest.fixture(scope="module")
+def tiny(tmp_path_factory):
+    path = build_tiny_llama(str(tmp_path_factory.mktemp("tiny_llama")))
+    model = transformers.AutoModelForCausalLM.from_pretrained(path).eval()
+    tokenizer = transformers.AutoTokenizer.from_pretrained(path)
+    return model, tokenizer
+
+
+def _greedy_reference(model, prompt_ids, max_new_tokens):
+    with torch.inference_mode():
+        out = model.generate(torch.tensor([prompt_ids]), max_new_tokens=max_new_tokens,
+                             do_sample=False, eos_token_id=None, pad_token_id=0)
+    return out[0, len(prompt_ids):].tolist()
+
+
+def test_batched_greedy_matches_sequential(tiny):
+    model, tokenizer = tiny
+    prompts = [tokenizer(f"case {i} " + "fever and cough " * (i + 1))["input_ids"]
+               for i in range(6)]
+    lengths = [5, 12, 3, 9, 12, 7]        # staggered finishes force mid-flight eviction
+    scheduler = BatchScheduler(model, eos_token_ids=set(), max_batch_size=4)
+    scheduler.start()
+    try:
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(
+                lambda a: scheduler.generate(a[0], GenerationParams(a[1], do_sample=False)),
+                zip(prompts, lengths)))
+    finally:
+        scheduler.stop()
+    for prompt, n, got in zip(prompts, lengths, results):
+        assert got == _greedy_reference(model, prompt, n)
+    assert scheduler.stats()["kv_reserved_bytes"] == 0
+
+
+def test_request_over_kv_budget_is_rejected(tiny):
+    model, _ = tiny
+    scheduler = BatchScheduler(model, eos_token_ids=set(), kv_cache_budget_bytes=1024)
+    with pytest.raises(ValueError):
+        scheduler.generate([1, 2, 3], GenerationParams(max_new_tokens=600))
+
+
+def test_on_token_streams_every_generated_token(tiny):
+    model, tokenizer = tiny
+    seen = []
+    scheduler = BatchScheduler(model, eos_token_ids=set())
+    scheduler.start()
+    try:
+        out = scheduler.generate(tokenizer("chest pain")["input_ids"],
+                                 GenerationParams(8, do_sample=False), on_token=seen.append)
+    finally:
+        scheduler.stop()
+    assert seen == out and len(out) == 8
+
+
+def test_failed_prefill_fails_only_its_own_request(tiny):
+    model, tokenizer = tiny
+    prompt = tokenizer("fever and cough")["input_ids"]
+    decoding = threading.Event()
+    scheduler = BatchScheduler(model, eos_token_ids=set())
+    scheduler.start()
+    try:
+        running = scheduler.submit(prompt, GenerationParams(20, do_sample=False),
+                                   on_token=lambda token: decoding.set())
+        assert decoding.wait(10)
+        bad = scheduler.submit([1, 10 ** 6], GenerationParams(4, do_sample=False))
+        with pytest.raises(IndexError):
+            bad.result(timeout=10)
+        assert running.result(timeout=30) == _greedy_reference(model, prompt, 20)
+    finally:
+        scheduler.stop()
+    assert scheduler.stats()["kv_reserved_bytes"] == 0
+
+def test_prefix_reuse_matches_full_prefill(tiny):
+    model, tokenizer = tiny
+    system = tokenizer("You are a clinical decision support AI. " * 3)["input_ids"]
+    with torch.inference_mode():
+        out = model(torch.tensor([system]), use_cache=True)
+    prefix = KVPrefix(system, cache_layers(out.past_key_values))
+    before = [k.clone() for k, _ in prefix.layers]
+
+    scheduler = BatchScheduler(model, eos_token_ids=set())
+    scheduler.start()
+    try:
+        prompts = [system + tokenizer(f" case {i}: fever")["input_ids"] for i in range(3)]
+        params = GenerationParams(6, do_sample=False)
+        for prompt in prompts:
+            assert scheduler.generate(prompt, params, prefix=prefix) == \
+                scheduler.generate(prompt, params)
+    finally:
+        scheduler.stop()
+    assert all(torch.equal(a, k) for a, (k, _) in zip(before, prefix.layers))
+
+
+def test_prefix_cache_matches_longest_proper_prefix():
+    cache = PrefixCache(max_entries=2)
+    cache.reset("model-a")
+    short, long = KVPrefix([1, 2], []), KVPrefix([1, 2, 3], [])
+    cache.put("model-a", short)
+    cache.put("model-a", long)
+    assert cache.match("model-a", [1, 2, 3, 4]) is long
+    assert cache.match("model-a", [1, 2, 3]) is short      # must leave a token to prefill
+    assert cache.match("model-b", [1, 2, 3, 4]) is None
+    cache.reset("model-b")
+    assert cache.match("model-b", [1, 2, 3, 4]) is None
+
+
+def test_retained_session_kv_resumes_next_turn(tiny):
+    model, tokenizer = tiny
+    kept = []
+    scheduler = BatchScheduler(model, eos_token_ids=set())
+    scheduler.start()
+    try:
+        turn1 = tokenizer("patient reports fever")["input_ids"]
+        params = GenerationParams(5, do_sample=False)
+        reply = scheduler.generate(turn1, params, on_cache=kept.append)
+        assert kept[0].token_ids == (turn1 + reply)[:len(kept[0])]
+
+        cache = SessionKVCache(budget_bytes=2 ** 30, ttl_seconds=60)
+        cache.put("s1", "m", kept[0])
+        turn2 = turn1 + reply + tokenizer(" and now cough")["input_ids"]
+        prefix = cache.get("s1", "m", turn2)
+        assert len(prefix) == len(kept[0])
+        assert scheduler.generate(turn2, params, prefix=prefix) == \
+            scheduler.generate(turn2, params)
+    finally:
+        scheduler.stop()
+
+
+def test_session_kv_cache_evicts_lru_over_budget_and_idle():
+    layer = (torch.zeros(1, 1, 4, 8), torch.zeros(1, 1, 4, 8))    # 256 bytes
+    entry = KVPrefix([1, 2, 3, 4], [layer])
+    cache = SessionKVCache(budget_bytes=2 * entry.nbytes(), ttl_seconds=60)
+    cache.put("a", "m", entry)
+    cache.put("b", "m", entry)
+    assert cache.get("a", "m", [1, 2, 9]).token_ids == [1, 2]      # truncated to common prefix
+    cache.put("c", "m", entry)                                     # evicts "b", the LRU
+    assert cache.get("b", "m", [1, 2, 3, 4, 5]) is None
+    assert cache.get("a", "other-model", [1, 2, 3]) is None
+    cache.ttl_seconds = 0
+    assert cache.get("c", "m", [1, 2, 3, 4, 5]) is None
+    assert cache.stats()["sessions"] == 0
@@ -0,0 +1,98 @@
+"""
+Single-pass and incremental section parsing.
+"""
+import pytest
+from backend.services.sections import SectionController, SectionParser, parse_sections
+
+FULL = (
+    "## 🔍 Clinical Reasoning\nOnset 3 days.\nHigh fever.\n\n"
+    "## 📋 Differential Diagnosis\n**1. Pneumonia** — consolidation\n"
+    "## 🩺 Recommended Workup\nChest X-ray\n"
+    "## 💊 Treatment Plan\nAmoxicillin\n"
+    "## ⚠️ Red Flags / Escalation\nHypoxia\n\n*This output is AI-generated*"
+)
+
+
+def test_parse_all_sections():
+    assert parse_sections(FULL) == {
+        "reasoning": "Onset 3 days.\nHigh fever.",
+        "differentials": "**1. Pneumonia** — consolidation",
+        "workup": "Chest X-ray",
+        "treatment": "Amoxicillin",
+        "red_flags": "Hypoxia\n\n*This output is AI-generated*",
+    }
+
+
+def test_missing_reordered_and_repeated_headers():
+    text = ("preamble\n## 💊 treatment plan\nRest\n## Notes\nignored\n"
+            "## 🔍 Clinical Reasoning\nfirst\n## 🔍 Clinical Reasoning\nsecond")
+    out = parse_sections(text)
+    assert out["treatment"] == "Rest" and out["reasoning"] == "first"
+    assert out["differentials"] == out["workup"] == out["red_flags"] == ""
+
+
+@pytest.mark.parametrize("size", [1, 3, 17])
+def test_incremental_matches_one_shot(size):
+    parser, got = SectionParser(), {}
+    for i in range(0, len(FULL), size):
+        got.update(parser.feed(FULL[i:i + size]))
+    got.update(parser.close())
+    assert got == parse_sections(FULL)
+
+
+def test_section_reported_when_next_header_starts():
+    parser = SectionParser()
+    assert parser.feed("## 🔍 Clinical Reasoning\nthinking\n") == []
+    assert parser.feed("##") == [("reasoning", "thinking")]
+
+
+def _drive(control, pieces):
+    """Feed pieces until the controller intervenes; return emitted text and the decision."""
+    emitted = ""
+    for piece in pieces:
+        steer = control.step(piece)
+        emitted += steer.emit
+        if steer.stop or steer.inject:
+            return emitted, steer
+    return emitted, None
+
+
+def test_stops_once_disclaimer_line_is_complete():
+    text = FULL + ".\nNot a substitute for professional medical judgement.*\nMore rambling\n"
+    pieces = [text[i:i + 3] for i in range(0, len(text), 3)]
+    emitted, steer = _drive(SectionController(), pieces)
+    assert steer.stop and not steer.rewind
+    assert "medical judgement.*\n" in emitted
+    assert "More rambling" not in emitted
+
+
+def test_disclaimer_phrase_inside_a_section_does_not_stop():
+    early = FULL.replace("Amoxicillin\n", "Amoxicillin\nDose adjustments are left to medical "
+                         "judgement of the team. Not a substitute for professional medical "
+                         "judgement.\n")
+    text = early + ".\nNot a substitute for professional medical judgement.*\nMore rambling\n"
+    pieces = [text[i:i + 3] for i in range(0, len(text), 3)]
+    emitted, steer = _drive(SectionController(), pieces)
+    assert steer.stop
+    assert "## ⚠️ Red Flags / Escalation\nHypoxia" in emitted
+    assert "More rambling" not in emitted
+
+
+def test_subset_opens_on_wanted_header_and_skips_others():
+    control = SectionController(wanted=["red_flags", "differentials"])
+    assert control.opening() == "## 📋 Differential Diagnosis\n"
+    emitted, steer = _drive(control, ["Pneu", "monia\n", "## 🩺", " Recommended", " Workup\n"])
+    # the unwanted header is rewound without ever being emitted
+    assert steer.rewind == 3 and steer.inject == "\n## ⚠️ Red Flags / Escalation\n"
+    assert emitted == "Pneumonia\n" + steer.inject
+    emitted, steer = _drive(control, ["Sepsis\n", "\n##", " 💊 Treatment Plan\n"])
+    assert emitted == "Sepsis\n"
+    assert steer.stop and steer.rewind == 2
+
+
+def test_section_over_budget_injects_next_header():
+    control = SectionController(budgets={"reasoning": 3})
+    emitted, steer = _drive(control, ["## 🔍 Clinical Reasoning\n", "a", " b", " c", " d", " e"])
+    assert not steer.rewind
+    assert steer.inject == "\n\n## 📋 Differential Diagnosis\n"
+    assert emitted == "## 🔍 Clinical Reasoning\na b c d" + steer.inject
@@ -0,0 +1,178 @@
+"""
+Session store backends: caps, TTL, durability and the Redis command sequence.
+"""
+import fnmatch
+import json
+import sys
+import threading
+import time
+from backend.services.session_stores import (
+    MemorySessionStore, RedisSessionStore, SQLiteSessionStore,
+)
+from backend.services.turns import Turn
+
+
+def _turn(i):
+    return {"role": "user", "content": f"turn {i}", "timestamp": "2026-01-01T00:00:00"}
+
+
+class FakeRedis:
+    """Just the list/key commands RedisSessionStore issues, including pipelines."""
+
+    def __init__(self):
+        self.lists, self.ttls = {}, {}
+
+    def pipeline(self):
+        return _FakePipeline(self)
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value.encode())
+
+    def ltrim(self, key, start, end):
+        items = self.lists.get(key, [])
+        self.lists[key] = items[start:] if end == -1 else items[start:end + 1]
+
+    def lrange(self, key, start, end):
+        return list(self.lists.get(key, []))
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def delete(self, key):
+        self.lists.pop(key, None)
+
+    def scan_iter(self, match):
+        return (k for k in self.lists if fnmatch.fnmatch(k, match))
+
+    def close(self):
+        pass
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self.client, self.calls = client, []
+
+    def __getattr__(self, name):
+        return lambda *a: self.calls.append((name, a))
+
+    def execute(self):
+        return [getattr(self.client, name)(*a) for name, a in self.calls]
+
+
+def test_memory_store_caps_and_ttl():
+    store = MemorySessionStore(max_sessions=2, max_turns=3, ttl_seconds=60)
+    for i in range(5):
+        store.append("a", _turn(i))
+    assert [t["content"] for t in store.get("a")] == ["turn 2", "turn 3", "turn 4"]
+    store.append("b", _turn(0))
+    store.append("c", _turn(0))                 # evicts "a", the least recently used
+    assert store.get("a") == [] and store.count() == 2
+    store.ttl_seconds = 0
+    time.sleep(0.01)
+    assert store.get("b") == [] and store.count() == 0
+
+
+def test_memory_store_compresses_cold_turns_and_accounts_memory():
+    store = MemorySessionStore(max_sessions=2, max_turns=6, ttl_seconds=60)
+    long = {"role": "assistant", "content": "## Differential Diagnosis\n" + "fever, cough " * 100,
+            "timestamp": "2026-01-01T00:00:00"}
+    for _ in range(8):
+        store.append("a", long)
+    turns = store.turns("a")
+    store.compress("a", [(t, "summary") for t in turns[:4]])
+    store.compress("a", [(turns[0], "summary"), (Turn.of(long), None)])   # no double counting
+    assert [t.compressed for t in turns] == [True] * 4 + [False] * 2
+    assert turns[0].summary == "summary" and turns[-1].summary is None
+    assert store.get("a")[0] == long                    # round-trips, timestamp included
+    stats = store.memory()
+    assert stats["turns"] == 6 and stats["compressed_turns"] == 4
+    assert stats["bytes"] == sum(t.nbytes() for t in turns)
+    assert turns[0].nbytes() * 5 < turns[-1].nbytes()
+    store.append("b", _turn(0))
+    store.append("c", _turn(0))                         # evicts "a"
+    assert store.memory() == {"sessions": 2, "turns": 2, "compressed_turns": 0,
+                              "bytes": sum(t.nbytes() for s in "bc" for t in store.turns(s))}
+
+
+def test_turn_reads_like_a_turn_dict():
+    turn = Turn.of(_turn(3))
+    assert turn["role"] is sys.intern("user") and turn.get("content") == "turn 3"
+    assert turn.to_dict() == _turn(3) and turn.get("missing") is None
+    assert not turn.compress()                          # too short to be worth it
+
+
+def test_sqlite_store_survives_restart_and_reads_own_writes(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    store = SQLiteSessionStore(path, max_turns=3, ttl_seconds=60, flush_interval=60)
+    for i in range(4):
+        store.append("s1", _turn(i))
+    assert len(store.get("s1")) == 3            # unflushed writes are visible
+    store.close()
+
+    reopened = SQLiteSessionStore(path, max_turns=3, ttl_seconds=60)
+    assert [t["content"] for t in reopened.get("s1")] == ["turn 1", "turn 2", "turn 3"]
+    assert reopened.count() == 1
+    reopened.clear("s1")
+    assert reopened.get("s1") == []
+    reopened.close()
+
+
+def test_sqlite_clear_drops_other_workers_queued_turns(tmp_path):
+    path = str(tmp_path / "sessions.db")
+    a = SQLiteSessionStore(path, max_turns=10, ttl_seconds=60, flush_interval=60)
+    b = SQLiteSessionStore(path, max_turns=10, ttl_seconds=60, flush_interval=60)
+    a.append("s1", _turn(0))                    # queued on worker a, not yet flushed
+    time.sleep(0.01)
+    b.clear("s1")
+    assert a.get("s1") == []
+    a.flush()
+    assert a.get("s1") == b.get("s1") == []
+    a.append("s1", _turn(1))                    # turns after the clear are kept
+    a.flush()
+    assert [t["content"] for t in b.get("s1")] == ["turn 1"]
+    a.close()
+    b.close()
+
+
+def test_sqlite_reads_do_not_wait_for_a_purge(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "s.db"), max_turns=10, ttl_seconds=60)
+    store.append("s1", _turn(0))
+    store.flush()
+    with store._write_lock:                     # as held by a long flush or purge
+        got = []
+        reader = threading.Thread(target=lambda: got.append(store.get("s1")))
+        reader.start()
+        reader.join(timeout=2)
+        assert got and got[0][0]["content"] == "turn 0"
+    store.close()
+
+def test_redis_store_against_fake():
+    fake = FakeRedis()
+    store = RedisSessionStore(client=fake, max_turns=2, ttl_seconds=30)
+    for i in range(3):
+        store.append("s1", _turn(i))
+    assert [t["content"] for t in store.get("s1")] == ["turn 1", "turn 2"]
+    assert fake.ttls["nemesis:session:s1"] == 30
+    assert json.loads(fake.lists["nemesis:session:s1"][0])["role"] == "user"
+    assert store.count() == 1
+    store.clear("s1")
+    assert store.get("s1") == []
+
+
+def test_list_sessions_by_time_range(tmp_path):
+    def at(ts):
+        return {"role": "user", "content": "x", "timestamp": ts}
+
+    sqlite = SQLiteSessionStore(str(tmp_path / "s.db"), max_turns=10, ttl_seconds=60)
+    for store in (MemorySessionStore(10, 10, 60), RedisSessionStore(client=FakeRedis())):
+        store.append("jan", at("2026-01-15T12:00:00"))
+        store.append("feb", at("2026-02-15T12:00:00"))
+        assert sorted(store.list_sessions()) == ["feb", "jan"]
+        assert store.list_sessions(since=1767225600, until=1769904000) == ["jan"]   # January
+        assert store.list_sessions(since=1769904000) == ["feb"]
+    # SQLite ranges on insert time
+    start = time.time()
+    sqlite.append("now", at("2026-01-15T12:00:00"))
+    assert sqlite.list_sessions(since=start - 1) == ["now"]
+    assert sqlite.list_sessions(until=start - 1) == []
+    sqlite.close()
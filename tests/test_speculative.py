@@ -0,0 +1,68 @@
+"""
+Speculative decoding must reproduce plain greedy decoding token for token.
+"""
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from benchmarks.tiny_llama import CORPUS, build_tiny_llama
+from backend.services.kv_cache import KVPrefix, cache_layers
+from backend.services.speculative import PromptLookupDrafter, SpeculativeDecoder
+
+
+@pytest.fixture(scope="module")
+def tiny(tmp_path_factory):
+    path = build_tiny_llama(str(tmp_path_factory.mktemp("tiny_llama")))
+    draft_path = build_tiny_llama(str(tmp_path_factory.mktemp("draft")), num_layers=1, seed=1)
+    model = transformers.AutoModelForCausalLM.from_pretrained(path).eval()
+    draft = transformers.AutoModelForCausalLM.from_pretrained(draft_path).eval()
+    tokenizer = transformers.AutoTokenizer.from_pretrained(path)
+    return model, draft, tokenizer
+
+
+def _greedy_reference(model, prompt_ids, max_new_tokens):
+    with torch.inference_mode():
+        input_ids = torch.tensor([prompt_ids])     # explicit mask: pad id 0 is also BOS
+        out = model.generate(input_ids, attention_mask=torch.ones_like(input_ids),
+                             max_new_tokens=max_new_tokens, do_sample=False,
+                             eos_token_id=None, pad_token_id=0)
+    return out[0, len(prompt_ids):].tolist()
+
+
+def test_prompt_lookup_drafts_continuation_of_latest_match():
+    drafter = PromptLookupDrafter(max_ngram=2)
+    assert drafter.draft([1, 2, 3, 9, 1, 2, 4, 5, 1, 2], 3) == [4, 5, 1]
+    assert drafter.draft([1, 2, 3, 9, 1, 2, 4, 5, 1, 2, 4], 2) == [5, 1]
+    assert drafter.draft([7, 8], 3) == []
+
+
+@pytest.mark.parametrize("mode", ["prompt_lookup", "draft_model"])
+def test_speculative_matches_greedy(tiny, mode):
+    model, draft, tokenizer = tiny
+    decoder = SpeculativeDecoder(model, eos_token_ids=set(), num_draft_tokens=4,
+                                 draft_model=draft)
+    for text in CORPUS[:3]:
+        prompt = tokenizer(text)["input_ids"]
+        assert decoder.generate(prompt, 24, mode) == _greedy_reference(model, prompt, 24)
+    stats = decoder.stats()[mode]
+    assert stats["requests"] == 3
+    assert 0 <= stats["acceptance_rate"] <= 1
+    assert stats["tokens_per_forward"] >= 1
+
+
+def test_speculative_with_prefix_streams_and_returns_cache(tiny):
+    model, _, tokenizer = tiny
+    prompt = tokenizer(CORPUS[0] + " " + CORPUS[1])["input_ids"]
+    with torch.inference_mode():
+        out = model(input_ids=torch.tensor([prompt[:10]]), use_cache=True)
+    prefix = KVPrefix(prompt[:10], cache_layers(out.past_key_values))
+    streamed, cached = [], []
+    decoder = SpeculativeDecoder(model, eos_token_ids=set())
+    got = decoder.generate(prompt, 16, on_token=streamed.append, prefix=prefix,
+                           on_cache=cached.append)
+    assert got == streamed == _greedy_reference(model, prompt, 16)
+    assert len(prefix) == 10 and prefix.layers[0][0].shape[2] == 10     # not mutated
+    (kv,) = cached
+    assert kv.token_ids == (prompt + got)[:len(kv)]
+    assert kv.layers[0][0].shape[2] == len(kv)
@@ -0,0 +1,69 @@
+"""
+Model artefact cache: export once, load as zero-copy views of the file, re-export when stale.
+"""
+import os
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+
+from benchmarks.tiny_llama import build_tiny_llama
+from backend.services import weights
+from backend.services.weights import (
+    WEIGHTS_FILE, ensure_exported, load_shared_model, map_safetensors, read_fingerprint,
+    read_header,
+)
+
+
+@pytest.fixture(scope="module")
+def exported(tmp_path_factory):
+    path = build_tiny_llama(str(tmp_path_factory.mktemp("tiny_llama")))
+    root = tmp_path_factory.mktemp("shared")
+    return path, ensure_exported(path, torch.float32, root)
+
+
+def test_mapped_tensors_match_header(exported):
+    _, directory = exported
+    header, _ = read_header(directory / WEIGHTS_FILE)
+    tensors = map_safetensors(directory / WEIGHTS_FILE)
+    assert set(tensors) == set(header)
+    for name, t in tensors.items():
+        assert list(t.shape) == header[name]["shape"]
+
+
+def test_shared_model_is_mapped_and_equivalent(exported):
+    path, directory = exported
+    reference = transformers.AutoModelForCausalLM.from_pretrained(path).eval()
+    shared = load_shared_model(directory)
+    file_size = os.path.getsize(directory / WEIGHTS_FILE)
+    # every parameter is a view of the single file mapping, not a private copy
+    assert all(p.untyped_storage().nbytes() == file_size for p in shared.parameters())
+    ids = torch.tensor([[1, 5, 9, 42, 7]])
+    with torch.inference_mode():
+        assert torch.equal(reference(ids).logits, shared(ids).logits)
+
+
+def test_export_is_reused(exported):
+    path, directory = exported
+    mtime = (directory / WEIGHTS_FILE).stat().st_mtime_ns
+    assert ensure_exported(path, torch.float32, directory.parent) == directory
+    assert (directory / WEIGHTS_FILE).stat().st_mtime_ns == mtime
+
+
+def test_stale_fingerprint_reexports(exported, monkeypatch):
+    path, directory = exported
+    mtime = (directory / WEIGHTS_FILE).stat().st_mtime_ns
+    upgraded = {**weights.fingerprint(path, torch.float32), "transformers": "99.0"}
+    monkeypatch.setattr(weights, "fingerprint", lambda *args: upgraded)
+    assert ensure_exported(path, torch.float32, directory.parent) == directory
+    assert read_fingerprint(directory) == upgraded
+    assert (directory / WEIGHTS_FILE).stat().st_mtime_ns != mtime
+
+
+def test_failed_reexport_keeps_existing_artefact(exported, monkeypatch):
+    path, directory = exported
+    found = read_fingerprint(directory)
+    monkeypatch.setattr(weights, "fingerprint", lambda *args: {**found, "torch": "99.0"})
+    monkeypatch.setattr(weights, "_export", lambda *args: (_ for _ in ()).throw(OSError("offline")))
+    assert ensure_exported(path, torch.float32, directory.parent) == directory
+    assert read_fingerprint(directory) == found